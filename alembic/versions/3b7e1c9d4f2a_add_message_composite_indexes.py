@@ -0,0 +1,59 @@
+"""add message composite indexes
+
+Revision ID: 3b7e1c9d4f2a
+Revises: 9e791cda742d
+Create Date: 2026-10-17 09:12:41.518230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e1c9d4f2a'
+down_revision: Union[str, None] = '9e791cda742d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Conversation context: conversation_id filter ordered by wen_posted
+    op.create_index(
+        'idx_message_conversation_wen_posted',
+        'message',
+        ['conversation_id', 'wen_posted', 'id']
+    )
+    # Own replies / previous messages: platform + author ordered by wen_posted
+    op.create_index(
+        'idx_message_platform_author_wen_posted',
+        'message',
+        ['platform', 'author', 'wen_posted']
+    )
+    # Latest post: platform + author + message_type ordered by wen_posted
+    op.create_index(
+        'idx_message_platform_author_type_wen_posted',
+        'message',
+        ['platform', 'author', 'message_type', 'wen_posted']
+    )
+    # Unfiltered "latest N" and keyset pagination
+    op.create_index(
+        'idx_message_wen_posted_id',
+        'message',
+        ['wen_posted', 'id']
+    )
+    # Character filter subquery, covering message_id
+    op.create_index(
+        'idx_message_character_name_message',
+        'message_character',
+        ['character_name', 'message_id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_message_character_name_message', table_name='message_character')
+    op.drop_index('idx_message_wen_posted_id', table_name='message')
+    op.drop_index('idx_message_platform_author_type_wen_posted', table_name='message')
+    op.drop_index('idx_message_platform_author_wen_posted', table_name='message')
+    op.drop_index('idx_message_conversation_wen_posted', table_name='message')
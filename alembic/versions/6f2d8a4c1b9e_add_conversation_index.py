@@ -0,0 +1,40 @@
+"""add conversation index
+
+Revision ID: 6f2d8a4c1b9e
+Revises: 3b7e1c9d4f2a
+Create Date: 2026-10-17 11:03:27.904152
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6f2d8a4c1b9e'
+down_revision: Union[str, None] = '3b7e1c9d4f2a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Rows are filled in by SiaMemory as messages are added; existing
+    #   conversations are indexed on first access (or all at once with
+    #   SiaMemory.rebuild_conversations())
+    op.create_table(
+        'conversation',
+        sa.Column('character_name', sa.String(), nullable=False),
+        sa.Column('conversation_id', sa.String(), nullable=False),
+        sa.Column('platform', sa.String(), nullable=True),
+        sa.Column('root_message_id', sa.String(), nullable=True),
+        sa.Column('message_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('own_message_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_activity_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('recent_messages', sa.JSON(), nullable=True),
+        sa.PrimaryKeyConstraint('character_name', 'conversation_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('conversation')
@@ -0,0 +1,37 @@
+"""add message content search index
+
+Revision ID: 8c4e2f7a9d31
+Revises: 6f2d8a4c1b9e
+Create Date: 2026-10-17 12:26:50.117384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2f7a9d31'
+down_revision: Union[str, None] = '6f2d8a4c1b9e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Full-text search over message content (SiaMemory.search_messages).
+    #   On SQLite the FTS5 table and its triggers are set up by SiaMemory.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.create_index(
+        'idx_message_content_fts',
+        'message',
+        [sa.text("to_tsvector('english'::regconfig, content)")],
+        postgresql_using='gin'
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('idx_message_content_fts', table_name='message')
@@ -0,0 +1,184 @@
+"""add social memory turn
+
+Revision ID: a2c4e6f8b0d1
+Revises: f1a3c5e7b9d2
+Create Date: 2026-10-17 19:26:14.803512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2c4e6f8b0d1'
+down_revision: Union[str, None] = 'f1a3c5e7b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 500
+HISTORY_TURNS = 20
+
+message = sa.table(
+    'message',
+    sa.column('id', sa.String()),
+    sa.column('content', sa.String()),
+)
+social_memory = sa.table(
+    'social_memory',
+    sa.column('id', sa.String()),
+    sa.column('interaction_count', sa.Integer()),
+    sa.column('conversation_history', sa.JSON()),
+    sa.column('last_processed_message_id', sa.String()),
+    sa.column('unprocessed_turns', sa.Integer()),
+)
+social_memory_turn = sa.table(
+    'social_memory_turn',
+    sa.column('social_memory_id', sa.String()),
+    sa.column('seq', sa.Integer()),
+    sa.column('message_id', sa.String()),
+    sa.column('role', sa.String()),
+    sa.column('content', sa.String()),
+)
+
+
+def social_memory_batches(*columns):
+    """Rows of social_memory in keyset-paginated batches."""
+    bind = op.get_bind()
+    last_id = ''
+    while True:
+        rows = bind.execute(
+            sa.select(social_memory.c.id, *columns)
+            .where(social_memory.c.id > last_id)
+            .order_by(social_memory.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        yield rows
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    # Conversation history of each social memory, one row per turn
+    op.create_table(
+        'social_memory_turn',
+        sa.Column('social_memory_id', sa.String(), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('message_id', sa.String(), nullable=True),
+        sa.Column('role', sa.String(), nullable=False),
+        sa.Column('content', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['social_memory_id'], ['social_memory.id']),
+        sa.PrimaryKeyConstraint('social_memory_id', 'seq')
+    )
+    op.create_index(
+        'idx_social_memory_turn_message',
+        'social_memory_turn',
+        ['social_memory_id', 'message_id']
+    )
+    op.add_column(
+        'social_memory',
+        sa.Column('unprocessed_turns', sa.Integer(), nullable=False, server_default='0')
+    )
+
+    bind = op.get_bind()
+    for rows in social_memory_batches(
+        social_memory.c.interaction_count,
+        social_memory.c.conversation_history,
+        social_memory.c.last_processed_message_id,
+    ):
+        message_ids = [
+            turn.get('message_id')
+            for _, _, history, _ in rows
+            for turn in history or []
+            if turn.get('message_id')
+        ]
+        stored_ids = set()
+        for i in range(0, len(message_ids), BATCH_SIZE):
+            stored_ids.update(
+                bind.execute(
+                    sa.select(message.c.id).where(message.c.id.in_(message_ids[i:i + BATCH_SIZE]))
+                ).scalars()
+            )
+
+        turns, counters = [], []
+        for id, interaction_count, history, last_processed_message_id in rows:
+            history = history or []
+            # the kept history is the tail of interaction_count turns
+            first_seq = max((interaction_count or 0) - len(history), 0) + 1
+            for seq, turn in enumerate(history, start=first_seq):
+                turns.append({
+                    'social_memory_id': id,
+                    'seq': seq,
+                    'message_id': turn.get('message_id'),
+                    'role': turn.get('role') or 'user',
+                    'content': None if turn.get('message_id') in stored_ids else turn.get('content'),
+                })
+
+            processed = [
+                i for i, turn in enumerate(history)
+                if turn.get('message_id') == last_processed_message_id
+            ]
+            counters.append({
+                'memory_id': id,
+                'unprocessed_turns': len(history) - processed[0] - 1 if processed else 0,
+                'interaction_count': max(interaction_count or 0, first_seq + len(history) - 1),
+            })
+
+        if turns:
+            bind.execute(social_memory_turn.insert(), turns)
+        bind.execute(
+            social_memory.update()
+            .where(social_memory.c.id == sa.bindparam('memory_id'))
+            .values(
+                unprocessed_turns=sa.bindparam('unprocessed_turns'),
+                interaction_count=sa.bindparam('interaction_count'),
+            ),
+            counters
+        )
+
+    with op.batch_alter_table('social_memory') as batch_op:
+        batch_op.drop_column('conversation_history')
+
+
+def downgrade() -> None:
+    op.add_column('social_memory', sa.Column('conversation_history', sa.JSON(), nullable=True))
+
+    bind = op.get_bind()
+    for rows in social_memory_batches():
+        histories = []
+        for (id,) in rows:
+            latest = bind.execute(
+                sa.select(
+                    social_memory_turn.c.message_id,
+                    social_memory_turn.c.role,
+                    sa.func.coalesce(message.c.content, social_memory_turn.c.content),
+                )
+                .select_from(
+                    social_memory_turn.outerjoin(message, message.c.id == social_memory_turn.c.message_id)
+                )
+                .where(social_memory_turn.c.social_memory_id == id)
+                .order_by(social_memory_turn.c.seq.desc())
+                .limit(HISTORY_TURNS)
+            ).all()
+            histories.append({
+                'memory_id': id,
+                'conversation_history': [
+                    {'message_id': message_id, 'role': role, 'content': content}
+                    for message_id, role, content in reversed(latest)
+                    if content is not None
+                ],
+            })
+        bind.execute(
+            social_memory.update()
+            .where(social_memory.c.id == sa.bindparam('memory_id'))
+            .values(conversation_history=sa.bindparam('conversation_history')),
+            histories
+        )
+
+    with op.batch_alter_table('social_memory') as batch_op:
+        batch_op.drop_column('unprocessed_turns')
+    op.drop_index('idx_social_memory_turn_message', table_name='social_memory_turn')
+    op.drop_table('social_memory_turn')
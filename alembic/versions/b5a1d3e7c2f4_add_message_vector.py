@@ -0,0 +1,48 @@
+"""add message vector
+
+Revision ID: b5a1d3e7c2f4
+Revises: 8c4e2f7a9d31
+Create Date: 2026-10-17 13:48:12.660517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5a1d3e7c2f4'
+down_revision: Union[str, None] = '8c4e2f7a9d31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Row of each message in the vector matrix file (SiaVectorMemory).
+    #   Existing messages are embedded with SiaMemory.backfill_vectors()
+    op.create_table(
+        'message_vector',
+        sa.Column('message_id', sa.String(), nullable=False),
+        sa.Column('row_index', sa.Integer(), nullable=False),
+        sa.Column('platform', sa.String(), nullable=True),
+        sa.Column('author', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('message_id'),
+        sa.UniqueConstraint('row_index')
+    )
+    op.create_index(
+        'idx_message_vector_author_row',
+        'message_vector',
+        ['author', 'row_index']
+    )
+    op.create_index(
+        'idx_message_vector_platform_row',
+        'message_vector',
+        ['platform', 'row_index']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_message_vector_platform_row', table_name='message_vector')
+    op.drop_index('idx_message_vector_author_row', table_name='message_vector')
+    op.drop_table('message_vector')
@@ -0,0 +1,29 @@
+"""add social memory opinion seq
+
+Revision ID: c3e5a7b9d1f2
+Revises: a2c4e6f8b0d1
+Create Date: 2026-10-17 20:11:38.164027
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e5a7b9d1f2'
+down_revision: Union[str, None] = 'a2c4e6f8b0d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Latest turn covered by the opinion; unknown for existing opinions, so
+    #   the first opinion rebuild regenerates them
+    op.add_column('social_memory', sa.Column('opinion_seq', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('social_memory') as batch_op:
+        batch_op.drop_column('opinion_seq')
@@ -0,0 +1,43 @@
+"""add settings version
+
+Revision ID: d4f6b8c0e2a3
+Revises: c3e5a7b9d1f2
+Create Date: 2026-10-17 21:04:37.215806
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f6b8c0e2a3'
+down_revision: Union[str, None] = 'c3e5a7b9d1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Created outside of migrations (create_all / ensure_tables_exist), so they
+#   may not exist yet
+TABLES = ('character_settings', 'knowledge_module_settings')
+
+
+def existing_tables():
+    inspector = sa.inspect(op.get_bind())
+    return [table for table in TABLES if inspector.has_table(table)]
+
+
+def upgrade() -> None:
+    # Bumped on every write, lets cached settings notice changes
+    for table in existing_tables():
+        op.add_column(
+            table,
+            sa.Column('version', sa.Integer(), nullable=False, server_default='1')
+        )
+
+
+def downgrade() -> None:
+    for table in existing_tables():
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('version')
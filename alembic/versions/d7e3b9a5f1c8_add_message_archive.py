@@ -0,0 +1,52 @@
+"""add message archive
+
+Revision ID: d7e3b9a5f1c8
+Revises: b5a1d3e7c2f4
+Create Date: 2026-10-17 15:21:05.338921
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7e3b9a5f1c8'
+down_revision: Union[str, None] = 'b5a1d3e7c2f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Segment files written by SiaMemory.archive_messages()
+    op.create_table(
+        'message_archive_segment',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('file_name', sa.String(), nullable=False),
+        sa.Column('message_count', sa.Integer(), nullable=False),
+        sa.Column('first_wen_posted', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_wen_posted', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'idx_message_archive_segment_wen_posted',
+        'message_archive_segment',
+        ['first_wen_posted', 'last_wen_posted']
+    )
+
+    # Segment of each archived message, for lookups by id
+    op.create_table(
+        'archived_message',
+        sa.Column('message_id', sa.String(), nullable=False),
+        sa.Column('segment_id', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['segment_id'], ['message_archive_segment.id']),
+        sa.PrimaryKeyConstraint('message_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('archived_message')
+    op.drop_index('idx_message_archive_segment_wen_posted', table_name='message_archive_segment')
+    op.drop_table('message_archive_segment')
@@ -0,0 +1,71 @@
+"""compress message original_data
+
+Revision ID: e4c8a2f6b0d9
+Revises: d7e3b9a5f1c8
+Create Date: 2026-10-17 16:40:33.271946
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from sia.memory.types import decode_json, encode_json
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4c8a2f6b0d9'
+down_revision: Union[str, None] = 'd7e3b9a5f1c8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 1000
+
+
+def copy_column(source_column, source_type, target_column, target_type, convert):
+    """Copy message.<source_column> into message.<target_column> through
+    `convert`, in keyset-paginated batches."""
+    bind = op.get_bind()
+    message = sa.table(
+        'message',
+        sa.column('id', sa.String()),
+        sa.column(source_column, source_type),
+        sa.column(target_column, target_type),
+    )
+    source = message.c[source_column]
+
+    last_id = ''
+    while True:
+        rows = bind.execute(
+            sa.select(message.c.id, source)
+            .where(message.c.id > last_id, source.isnot(None))
+            .order_by(message.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            message.update()
+            .where(message.c.id == sa.bindparam('message_id'))
+            .values({target_column: sa.bindparam('value')}),
+            [{'message_id': id, 'value': convert(value)} for id, value in rows]
+        )
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    # original_data becomes zlib/zstd compressed JSON (CompressedJSON)
+    op.add_column('message', sa.Column('original_data_compressed', sa.LargeBinary(), nullable=True))
+    copy_column('original_data', sa.JSON(), 'original_data_compressed', sa.LargeBinary(), encode_json)
+    with op.batch_alter_table('message') as batch_op:
+        batch_op.drop_column('original_data')
+        batch_op.alter_column('original_data_compressed', new_column_name='original_data')
+
+
+def downgrade() -> None:
+    op.add_column('message', sa.Column('original_data_json', sa.JSON(), nullable=True))
+    copy_column('original_data', sa.LargeBinary(), 'original_data_json', sa.JSON(), decode_json)
+    with op.batch_alter_table('message') as batch_op:
+        batch_op.drop_column('original_data')
+        batch_op.alter_column('original_data_json', new_column_name='original_data')
@@ -0,0 +1,68 @@
+"""message character composite key
+
+Revision ID: e5a7c9d1f3b4
+Revises: d4f6b8c0e2a3
+Create Date: 2026-10-17 22:12:50.408163
+
+"""
+import warnings
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c9d1f3b4'
+down_revision: Union[str, None] = 'd4f6b8c0e2a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Postgres' default name
+PRIMARY_KEY = 'message_character_pkey'
+
+message_character = sa.table(
+    'message_character',
+    sa.column('message_id', sa.String()),
+    sa.column('character_name', sa.String()),
+    sa.column('created_at', sa.DateTime()),
+)
+
+
+def set_primary_key(columns):
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    # SQLite can't alter a primary key, the table is recreated. SQLAlchemy
+    #   warns that the recreated table's primary key differs from the
+    #   reflected one, which is the point.
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', message='.*primary_key=True, not matching', category=sa.exc.SAWarning)
+        with op.batch_alter_table('message_character', recreate='always' if sqlite else 'auto') as batch_op:
+            if not sqlite:
+                batch_op.drop_constraint(PRIMARY_KEY, type_='primary')
+            batch_op.create_primary_key(PRIMARY_KEY, columns)
+
+
+def upgrade() -> None:
+    # A message can be linked to several characters sharing the database
+    set_primary_key(['message_id', 'character_name'])
+
+
+def downgrade() -> None:
+    # Keep the oldest link of each message
+    other = message_character.alias('other')
+    op.execute(
+        message_character.delete().where(
+            sa.exists().where(
+                other.c.message_id == message_character.c.message_id,
+                sa.or_(
+                    other.c.created_at < message_character.c.created_at,
+                    sa.and_(
+                        other.c.created_at == message_character.c.created_at,
+                        other.c.character_name < message_character.c.character_name,
+                    ),
+                ),
+            )
+        )
+    )
+    set_primary_key(['message_id'])
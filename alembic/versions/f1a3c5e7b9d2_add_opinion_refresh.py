@@ -0,0 +1,36 @@
+"""add opinion refresh
+
+Revision ID: f1a3c5e7b9d2
+Revises: e4c8a2f6b0d9
+Create Date: 2026-10-17 18:02:47.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a3c5e7b9d2'
+down_revision: Union[str, None] = 'e4c8a2f6b0d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Pending social memory opinion refreshes, run by SiaOpinionWorker
+    op.create_table(
+        'opinion_refresh',
+        sa.Column('character_name', sa.String(), nullable=False),
+        sa.Column('platform', sa.String(), nullable=False),
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('requested_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('character_name', 'platform', 'user_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('opinion_refresh')
@@ -0,0 +1,32 @@
+"""add social memory turn message id index
+
+Revision ID: f6b8d0e2a4c5
+Revises: e5a7c9d1f3b4
+Create Date: 2026-10-17 23:12:48.530172
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6b8d0e2a4c5'
+down_revision: Union[str, None] = 'e5a7c9d1f3b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Finds the turns of a message about to be deleted, whose content is
+    #   copied into them (SiaMemory._keep_turn_contents)
+    op.create_index(
+        'idx_social_memory_turn_message_id',
+        'social_memory_turn',
+        ['message_id'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_social_memory_turn_message_id', table_name='social_memory_turn')
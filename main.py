@@ -34,6 +34,11 @@ async def main():
         character_json_filepath=f"characters/{character_name_id}.json",
         **client_creds,
         memory_db_path=os.getenv("DB_PATH"),
+        memory_storage_profile=os.getenv("DB_STORAGE_PROFILE") or "default",
+        memory_replica_db_path=os.getenv("DB_REPLICA_PATH") or None,
+        vector_memory_path=os.getenv("VECTOR_MEMORY_PATH") or None,
+        vector_memory_embedder=os.getenv("VECTOR_MEMORY_EMBEDDER") or None,
+        archive_after_days=float(os.getenv("ARCHIVE_AFTER_DAYS") or 0) or None,
         # knowledge_module_classes=[GoogleNewsModule],
         logging_enabled=logging_enabled,
     )
@@ -164,13 +164,13 @@ class SiaTelegram(SiaClientInterface):
         message_id = f"{chat_id}-{str(message.message_id)}"
         
         # Check if the message already exists in the database
-        existing_message = self.sia.memory.get_messages(id=message_id)
+        existing_message = await self.sia.async_memory.get_message(message_id)
         if existing_message:
             log_message(self.logger, "info", self, f"Message already exists in database: {existing_message}")
-            stored_message = existing_message[0]
+            stored_message = existing_message
         else:
             # Save message to database
-            stored_message = self.sia.memory.add_message(
+            stored_message = await self.sia.async_memory.add_message(
                 message_id=message_id,
                 message=sia_message,
                 character=self.sia.character.name
@@ -184,7 +184,7 @@ class SiaTelegram(SiaClientInterface):
                     response,
                     in_reply_to_message_id=str(message.message_id)
                 )
-                self.sia.memory.add_message(
+                await self.sia.async_memory.add_message(
                     message_id=f"{chat_id}-{message_id}",
                     message=response,
                     message_type="reply",
@@ -202,18 +202,19 @@ class SiaTelegram(SiaClientInterface):
         message_id = f"{chat_id}-{str(message.message_id)}"
         
         # Check if the message already exists in the database
-        existing_message = self.sia.memory.get_messages(id=message_id)
+        existing_message = await self.sia.async_memory.get_message(message_id)
         if existing_message:
             log_message(self.logger, "info", self, f"Message already exists in database: {existing_message}")
-            stored_message = existing_message[0]
+            stored_message = existing_message
         else:
-            # Save message to database
-            stored_message = self.sia.memory.add_message(
+            # Most group messages are never responded to,
+            #   so they are written to the database in the background
+            stored_message = self.sia.async_memory.buffer_message(
                 message_id=message_id,
                 message=sia_message,
                 character=self.sia.character.name
             )
-            log_message(self.logger, "info", self, f"Stored new message: {stored_message}")
+            log_message(self.logger, "info", self, f"Buffered new message: {stored_message}")
 
         should_respond = False
 
@@ -233,7 +234,7 @@ class SiaTelegram(SiaClientInterface):
                     response,
                     in_reply_to_message_id=str(message.message_id)
                 )
-                self.sia.memory.add_message(
+                await self.sia.async_memory.add_message(
                     message_id=f"{chat_id}-{message_id}",
                     message=response,
                     message_type="reply",
@@ -337,7 +338,7 @@ class SiaTelegram(SiaClientInterface):
                 )
                 message_id = await self.publish_message(message=post, media=media)
                 if message_id:
-                    self.sia.memory.add_message(
+                    await self.sia.async_memory.add_message(
                         message_id=f"{chat_id}-{message_id}", 
                         message=post, 
                         message_type="post",
@@ -353,17 +354,14 @@ class SiaTelegram(SiaClientInterface):
             .get("post", {})
             .get("frequency", 1)
         )
-        latest_post = self.sia.memory.get_messages(
+        latest_post = await self.sia.async_memory.latest_message(
             platform="telegram",
             character=self.sia.character.name,
             author=self.sia.character.platform_settings.get("telegram", {}).get("username", ""),
             is_post=True,
             conversation_id=chat_id,
-            sort_by="wen_posted",
-            sort_order="desc"
         )
 
-        latest_post = latest_post[0] if latest_post else None
         next_post_time = latest_post.wen_posted + timedelta(hours=24/post_frequency) if latest_post else datetime.now(timezone.utc)-timedelta(seconds=10)
         log_message(self.logger, "info", self, f"Post frequency: {post_frequency} (every {24/post_frequency} hours)")
         log_message(self.logger, "info", self, f"Latest post: {latest_post}")
@@ -382,7 +380,7 @@ class SiaTelegram(SiaClientInterface):
                     log_message(self.logger, "info", self, f"Trying to publish message: {post} with media: {media}")
                     message_id = await self.publish_message(message=post, media=media)
                     if message_id:
-                        self.sia.memory.add_message(
+                        await self.sia.async_memory.add_message(
                             message_id=f"{chat_id}-{message_id}", 
                             message=post, 
                             message_type="post",
@@ -485,6 +483,14 @@ class SiaTelegram(SiaClientInterface):
             return False
         finally:
             # Cleanup
+            try:
+                self.sia.memory.flush_messages()
+            except Exception as e:
+                log_message(self.logger, "error", self, f"Error flushing buffered messages: {e}")
+            try:
+                await self.sia.async_memory.close()
+            except Exception as e:
+                log_message(self.logger, "error", self, f"Error closing async memory: {e}")
             try:
                 await self.bot.session.close()
                 log_message(self.logger, "info", self, "Bot session closed")
@@ -1,3 +1,4 @@
+import asyncio
 import random
 import textwrap
 import time
@@ -16,7 +17,7 @@ from tweepy import Tweet
 from tweepy import User as TwpUser
 
 from sia.character import SiaCharacter
-from sia.memory.memory import SiaMemory
+from sia.memory.memory import CONVERSATION_RECENT_MESSAGES, SiaMemory
 from sia.memory.schemas import SiaMessageGeneratedSchema, SiaMessageSchema
 from utils.logging_utils import enable_logging, log_message, setup_logging
 
@@ -140,18 +141,38 @@ class SiaTwitterOfficial(SiaClientInterface):
             self,
             f"Getting last retrieved reply id for {self.character.twitter_username} (character: {self.character.name})",
         )
-        replies = self.memory.get_messages(
+        max_reply_id = self.memory.max_message_id(
             platform="twitter",
             not_author=self.character.twitter_username,
             character=self.character.name,
         )
-        if replies:
-            max_reply = max(replies, key=lambda reply: reply.id)
+        if max_reply_id:
+            max_reply = self.memory.get_message_rows(
+                columns=("wen_posted",), id=max_reply_id, flagged=2
+            )[0]
             if max_reply.wen_posted < datetime.now(timezone.utc) - timedelta(weeks=1):
                 return None
-            return None if max_reply.id == "None" else max_reply.id
+            return None if max_reply_id == "None" else max_reply_id
 
-    def get_conversation(self, conversation_id: str) -> list[SiaMessageSchema]:
+    def get_conversation(self, conversation_id: str, limit: int = None) -> list[SiaMessageSchema]:
+        """Messages of the conversation in chronological order.
+
+        With `limit` set only the latest `limit` messages are read.
+        """
+        if limit and limit <= CONVERSATION_RECENT_MESSAGES:
+            # served by the conversation index
+            return self.memory.get_conversation_messages(
+                conversation_id, limit=limit, include_root=False
+            )
+        if limit:
+            messages = self.memory.get_messages(
+                conversation_id=conversation_id,
+                sort_by="wen_posted",
+                sort_order="desc",
+                flagged=False,
+                limit=limit,
+            )
+            return messages[::-1]
         messages = self.memory.get_messages(
             conversation_id=conversation_id,
             sort_by="wen_posted",
@@ -210,9 +231,7 @@ class SiaTwitterOfficial(SiaClientInterface):
     def save_tweet_to_db(self, tweet: Tweet, author: TwpUser, message_type: str = "reply") -> SiaMessageSchema:
 
         # check if the tweet is already in the database
-        get_message_in_db = self.memory.get_messages(
-            id=str(tweet.id), flagged=2  # getting both flagged and unflagged messages
-        )
+        get_message_in_db = self.memory.get_message(str(tweet.id))
 
         try:
 
@@ -226,20 +245,14 @@ class SiaTwitterOfficial(SiaClientInterface):
                     f"Message with id {
                         tweet.id} already exists in the database, returning it without adding to the database",
                 )
-                return get_message_in_db[0]
+                return get_message_in_db
 
             # if the tweet is not in the database
             else:
                 # convert tweet object
                 #   to message object
-                message_to_add = self.tweet_to_message(tweet=tweet, author=author)
-                if self.testing:
-                    message_to_add.flagged = 1
-                    message_to_add.message_metadata = {"flagged": "test_data"}
                 message_in_db = self.memory.add_message(
-                    message_id=str(tweet.id),
-                    message=message_to_add,
-                    message_type=message_type
+                    **self.tweet_to_db_entry(tweet=tweet, author=author, message_type=message_type)
                 )
                 return message_in_db
 
@@ -248,15 +261,27 @@ class SiaTwitterOfficial(SiaClientInterface):
                 self.logger, "error", self, f"Error saving tweet to database: {e}"
             )
 
+    def tweet_to_db_entry(self, tweet: Tweet, author: TwpUser, message_type: str = "reply") -> dict:
+        """Convert a tweet to an entry for SiaMemory.add_messages."""
+        message_to_add = self.tweet_to_message(tweet=tweet, author=author)
+        if self.testing:
+            message_to_add.flagged = 1
+            message_to_add.message_metadata = {"flagged": "test_data"}
+        return {
+            "message_id": str(tweet.id),
+            "message": message_to_add,
+            "message_type": message_type,
+        }
+
     def save_tweets_to_db(
         self, tweets: TwpResponse, exclude_own=True, exclude_responded_to=False
     ) -> list[SiaMessageSchema]:
-        messages = []
 
         if not tweets.data:
             log_message(self.logger, "info", self, f"No tweets to add")
             return []
 
+        page = []
         for tweet in tweets.data:
             author = self.get_user_by_id_from_twp_response(tweets, tweet.author_id)
 
@@ -292,18 +317,52 @@ class SiaTwitterOfficial(SiaClientInterface):
                 log_message(self.logger, "error", self, f"Error moderating tweet: {e}")
                 flagged = False
 
-            tweet_message = self.save_tweet_to_db(tweet=tweet, author=author)
+            # also add all referenced tweets
+            referenced = []
+            if tweet.referenced_tweets and "tweets" in tweets.includes:
+                for ref_tweet in tweet.referenced_tweets:
+                    for included_tweet in tweets.includes["tweets"]:
+                        if included_tweet.id == ref_tweet.id:
+                            referenced.append((
+                                included_tweet,
+                                self.get_user_by_id_from_twp_response(
+                                    tweets, included_tweet.author_id
+                                ),
+                            ))
+
+            page.append((tweet, author, referenced))
+
+        # if we need to exclude from the return list
+        #    the tweets that have already
+        #    been responded to by the character,
+        responded_to_ids = set()
+        if exclude_responded_to:
+            page_ids = []
+            for tweet, _, referenced in page:
+                page_ids.append(str(tweet.id))
+                page_ids.extend(str(included_tweet.id) for included_tweet, _ in referenced)
+            responded_to_ids = self.memory.get_responded_to_ids(
+                page_ids, author=self.character.twitter_username
+            )
 
-            # if we need to exclude from the return list
-            #    the tweets that have already
-            #    been responded to by the character,
-            if exclude_responded_to:
-                message_responses_in_db = self.memory.get_messages(
-                    response_to=str(tweet.id),
-                    author=self.character.twitter_username,
-                    flagged=2,
-                )
-                if message_responses_in_db:
+        def db_entry(tweet, author, error_message):
+            """The tweet's entry for add_messages, or None if it can't be
+            built: a bad tweet is skipped, not the whole page."""
+            try:
+                if author is None:
+                    raise ValueError(f"author {tweet.author_id} of tweet {tweet.id} not in the response")
+                return self.tweet_to_db_entry(tweet=tweet, author=author)
+            except Exception as e:
+                log_message(self.logger, "error", self, f"{error_message}: {e}")
+                return None
+
+        entries = []
+        ids_to_return = []
+        for tweet, author, referenced in page:
+            entry = db_entry(tweet, author, "Error saving tweet to database")
+            if entry:
+                entries.append(entry)
+                if str(tweet.id) in responded_to_ids:
                     log_message(
                         self.logger,
                         "info",
@@ -312,53 +371,38 @@ class SiaTwitterOfficial(SiaClientInterface):
                             tweet.id} has already been responded to",
                     )
                     continue
-                else:
-                    if tweet_message:
-                        messages.append(tweet_message)
-            else:
-                if tweet_message:
-                    messages.append(tweet_message)
+                ids_to_return.append(str(tweet.id))
 
-            # also add all referenced tweets
-            if tweet.referenced_tweets:
-                for ref_tweet in tweet.referenced_tweets:
-                    # Get referenced tweet details
-                    ref_tweet_id = ref_tweet.id
+            for included_tweet, included_author in referenced:
+                entry = db_entry(included_tweet, included_author, "Error adding referenced tweet")
+                if not entry:
+                    continue
+                entries.append(entry)
+                if str(included_tweet.id) in responded_to_ids:
+                    log_message(self.logger, "info", self, f"Message with id {tweet.id} has already been responded to")
+                    continue
+                ids_to_return.append(str(included_tweet.id))
 
-                    if "tweets" in tweets.includes:
-                        for included_tweet in tweets.includes["tweets"]:
-                            if included_tweet.id == ref_tweet_id:
-                                try:
-                                    author = self.get_user_by_id_from_twp_response(
-                                        tweets, included_tweet.author_id
-                                    )
-                                    tweet_message = self.save_tweet_to_db(
-                                        tweet=included_tweet, author=author
-                                    )
-                                    
-                                    if exclude_responded_to:
-                                        message_responses_in_db = self.memory.get_messages(
-                                            response_to=str(included_tweet.id),
-                                            author=self.character.twitter_username,
-                                            flagged=2,
-                                        )
-                                        if message_responses_in_db:
-                                            log_message(self.logger, "info", self, f"Message with id {tweet.id} has already been responded to")
-                                            continue
-                                    messages.append(tweet_message)
-
-                                except Exception as e:
-                                    log_message(
-                                        self.logger,
-                                        "error",
-                                        self,
-                                        f"Error adding referenced tweet: {e}",
-                                    )
-
-        # if exclude_responded_to:
-        #     messages = [message for message in messages if message.response_to is None]
+        # store the whole page
+        #   in one transaction
+        try:
+            stored = self.memory.add_messages(entries)
+        except Exception as e:
+            log_message(
+                self.logger, "error", self, f"Error saving tweets to database: {e}"
+            )
+            # one at a time, so that only the failing tweets are lost
+            stored = []
+            for entry in entries:
+                try:
+                    stored.extend(self.memory.add_messages([entry]))
+                except Exception as e:
+                    log_message(
+                        self.logger, "error", self, f"Error saving tweet {entry['message_id']} to database: {e}"
+                    )
+        stored_messages = {message.id: message for message in stored}
 
-        return messages
+        return [stored_messages[id] for id in ids_to_return if id in stored_messages]
 
     @classmethod
     def printable_tweet(
@@ -544,15 +588,12 @@ class SiaTwitterOfficial(SiaClientInterface):
         ):
             post_frequency = self.character.platform_settings.get("twitter", {}).get("post", {}).get("frequency", 1)
             next_post_time = datetime.now(timezone.utc) + timedelta(hours=24/post_frequency)
-            latest_post = self.sia.memory.get_messages(
+            latest_post = self.sia.memory.latest_message(
                 platform="twitter",
                 character=self.character.name,
                 author=self.character.platform_settings.get("twitter", {}).get("username", ""),
                 is_post=True,
-                sort_by="wen_posted",
-                sort_order="desc"
             )
-            latest_post = latest_post[0] if latest_post else None
             next_post_time = latest_post.wen_posted + timedelta(hours=24/post_frequency) if latest_post else datetime.now(timezone.utc)-timedelta(seconds=10)
             log_message(self.logger, "info", self, f"Post frequency: {post_frequency} (every {24/post_frequency} hours)")
             log_message(self.logger, "info", self, f"Latest post: {latest_post}")
@@ -603,20 +644,12 @@ class SiaTwitterOfficial(SiaClientInterface):
             replies = self.search_tweets(**replies_search_inputs)
             replies_messages = self.save_tweets_to_db(tweets=replies, exclude_own=True)
 
-            responses_sent = self.memory.get_messages(
+            responses_sent_this_hour = self.memory.count_messages(
                 platform="twitter",
                 character=self.character.name,
                 response_to="NOT NULL",
                 author=self.character.twitter_username,
-                sort_by="wen_posted",
-                sort_order="desc",
-            )
-            responses_sent_this_hour = len(
-                [
-                    r
-                    for r in responses_sent
-                    if r.wen_posted > datetime.now(timezone.utc) - timedelta(hours=1)
-                ]
+                from_datetime=datetime.now(timezone.utc) - timedelta(hours=1),
             )
             max_responses_an_hour = self.character.responding.get(
                 "responses_an_hour", 3
@@ -657,18 +690,8 @@ class SiaTwitterOfficial(SiaClientInterface):
                     # temporary:
                     #   skipping conversations where
                     #   we've already sent 3+ replies
-                    conversation = self.get_conversation(r.conversation_id)
-                    conversation_first_message = self.memory.get_messages(
-                        id=r.conversation_id,
-                        platform="twitter",
-                        not_author=self.character.twitter_username
-                    )
-                    conversation = conversation_first_message + conversation[-20:]
-                    own_messages_count = sum(
-                        1
-                        for msg in conversation
-                        if msg.author == self.character.twitter_username
-                    )
+                    conversation = self.memory.get_conversation_summary(r.conversation_id)
+                    own_messages_count = conversation.own_message_count if conversation else 0
                     if own_messages_count >= 3:
                         log_message(
                             self.logger,
@@ -733,16 +756,13 @@ class SiaTwitterOfficial(SiaClientInterface):
         # check when we last engaged
         #   and if it's time to engage again
 
-        messages_to_engage_in_db = self.memory.get_messages(
+        latest_message = self.memory.latest_message(
             platform="twitter",
             character=self.character.name,
             response_to="NOT NULL",
             exclude_own_conversations=True,
-            sort_by="wen_posted",
-            sort_order="desc",
         )
-        if messages_to_engage_in_db:
-            latest_message = messages_to_engage_in_db[0]
+        if latest_message:
             next_time_to_engage = latest_message.wen_posted + timedelta(
                 hours=search_frequency
             )
@@ -828,13 +848,15 @@ class SiaTwitterOfficial(SiaClientInterface):
 
             # respond
             previous_messages = self.memory.printable_messages_list(
-                self.memory.get_messages(
+                self.memory.get_message_rows(
+                    columns=("id", "author", "wen_posted", "content"),
                     platform="twitter",
                     author=self.character.twitter_username,
                     sort_by="wen_posted",
-                    sort_order="asc",
+                    sort_order="desc",
                     flagged=2,
-                )[-20:]
+                    limit=20,
+                )[::-1]
             )
             if self.testing:
                 log_message(
@@ -909,6 +931,9 @@ class SiaTwitterOfficial(SiaClientInterface):
             )
 
     async def run(self):
+        # The posting / replying / engaging steps use the blocking tweepy
+        #   client and sync memory, so they run in a worker thread
+        #   to keep this event loop free
 
         if not self.character.platform_settings.get("twitter", {}).get("enabled", True):
             return
@@ -918,7 +943,7 @@ class SiaTwitterOfficial(SiaClientInterface):
             # posting
             #   new tweet
             try:
-                self.post()
+                await asyncio.to_thread(self.post)
             except Exception as e:
                 log_message(self.logger, "error", self, f"Error posting tweet: {e}")
 
@@ -926,7 +951,7 @@ class SiaTwitterOfficial(SiaClientInterface):
             # replying
             #   to mentions
             try:
-                self.reply()
+                await asyncio.to_thread(self.reply)
             except Exception as e:
                 log_message(self.logger, "error", self, f"Error replying to mentions: {e}")
 
@@ -934,9 +959,9 @@ class SiaTwitterOfficial(SiaClientInterface):
             # searching for and replying
             #   to tweets from other users
             try:
-                self.engage()
+                await asyncio.to_thread(self.engage)
             except Exception as e:
                 log_message(self.logger, "error", self, f"Error engaging with tweets: {e}")
 
 
-            time.sleep(random.randint(70, 90))
+            await asyncio.sleep(random.randint(70, 90))
@@ -0,0 +1,131 @@
+import gzip
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional
+from uuid import uuid4
+
+from sqlalchemy import select
+
+from .models_db import SiaArchivedMessageModel, SiaArchiveSegmentModel
+from .schemas import SiaMessageSchema
+
+
+class SiaMessageArchive:
+    """Cold storage for old messages.
+
+    Messages moved out of the `message` table are written to gzip-compressed
+    JSONL segment files in `archive_dir`, one SiaMessageSchema (with
+    original_data and characters) per line. The `message_archive_segment`
+    table records the time range of each segment and `archived_message` the
+    segment of each message id, so reads only open the segments they need.
+    """
+
+    def __init__(self, session_scope: Callable, archive_dir: str = "memory/archive", cached_segments: int = 4):
+        self.session_scope = session_scope
+        self.archive_dir = archive_dir
+        self.cached_segments = cached_segments
+        self._segments = OrderedDict()  # file_name -> {message_id: message}
+        self._lock = threading.Lock()
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(self.archive_dir, file_name)
+
+    def write_segment(self, session, messages: List[SiaMessageSchema]) -> str:
+        """Write messages to a new segment file and record it in the session.
+        Returns the file name; delete it with `discard` if the session is
+        rolled back."""
+        for message in messages:
+            # SQLite returns naive datetimes, all stored times are UTC
+            if message.wen_posted.tzinfo is None:
+                message.wen_posted = message.wen_posted.replace(tzinfo=timezone.utc)
+        first = min(message.wen_posted for message in messages)
+        last = max(message.wen_posted for message in messages)
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        file_name = f"messages-{first:%Y%m%d}-{last:%Y%m%d}-{uuid4().hex[:8]}.jsonl.gz"
+        tmp_path = self._path(file_name + ".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            for message in messages:
+                f.write(message.model_dump_json() + "\n")
+        os.replace(tmp_path, self._path(file_name))
+
+        segment = SiaArchiveSegmentModel(
+            file_name=file_name,
+            message_count=len(messages),
+            first_wen_posted=first,
+            last_wen_posted=last,
+        )
+        session.add(segment)
+        session.flush()
+
+        ids = [message.id for message in messages]
+        # a message archived again (after being stored anew) is read from its latest segment
+        for i in range(0, len(ids), 500):
+            session.query(SiaArchivedMessageModel).filter(
+                SiaArchivedMessageModel.message_id.in_(ids[i:i + 500])
+            ).delete(synchronize_session=False)
+        session.add_all([
+            SiaArchivedMessageModel(message_id=message_id, segment_id=segment.id)
+            for message_id in ids
+        ])
+        return file_name
+
+    def discard(self, file_name: str):
+        """Delete a segment file whose transaction failed."""
+        if os.path.exists(self._path(file_name)):
+            os.remove(self._path(file_name))
+
+    def read_segment(self, file_name: str) -> Iterator[SiaMessageSchema]:
+        with gzip.open(self._path(file_name), "rt", encoding="utf-8") as f:
+            for line in f:
+                yield SiaMessageSchema.model_validate_json(line)
+
+    def _load_segment(self, file_name: str) -> Dict[str, SiaMessageSchema]:
+        """Messages of a segment by id, keeping the last few segments read."""
+        with self._lock:
+            if file_name in self._segments:
+                self._segments.move_to_end(file_name)
+                return self._segments[file_name]
+        messages = {message.id: message for message in self.read_segment(file_name)}
+        with self._lock:
+            self._segments[file_name] = messages
+            while len(self._segments) > self.cached_segments:
+                self._segments.popitem(last=False)
+        return messages
+
+    def get_messages_by_ids(self, message_ids: List[str]) -> Dict[str, SiaMessageSchema]:
+        """Archived messages among `message_ids`, by id."""
+        segments = {}
+        with self.session_scope() as session:
+            for i in range(0, len(message_ids), 500):
+                for message_id, file_name in session.execute(
+                    select(SiaArchivedMessageModel.message_id, SiaArchiveSegmentModel.file_name)
+                    .join(SiaArchiveSegmentModel, SiaArchiveSegmentModel.id == SiaArchivedMessageModel.segment_id)
+                    .where(SiaArchivedMessageModel.message_id.in_(message_ids[i:i + 500]))
+                ):
+                    segments.setdefault(file_name, []).append(message_id)
+
+        messages = {}
+        for file_name, ids in segments.items():
+            segment = self._load_segment(file_name)
+            messages.update({id: segment[id] for id in ids if id in segment})
+        return messages
+
+    def get_message(self, message_id: str) -> Optional[SiaMessageSchema]:
+        return self.get_messages_by_ids([message_id]).get(message_id)
+
+    def iter_messages(self, from_datetime: datetime = None, to_datetime: datetime = None) -> Iterator[SiaMessageSchema]:
+        """Stream archived messages from the segments overlapping the time
+        range, oldest segment first. Messages are not filtered by time."""
+        query = select(SiaArchiveSegmentModel.file_name).order_by(SiaArchiveSegmentModel.first_wen_posted)
+        if from_datetime:
+            query = query.where(SiaArchiveSegmentModel.last_wen_posted >= from_datetime)
+        if to_datetime:
+            query = query.where(SiaArchiveSegmentModel.first_wen_posted < to_datetime)
+
+        with self.session_scope() as session:
+            file_names = session.execute(query).scalars().all()
+        for file_name in file_names:
+            yield from self.read_segment(file_name)
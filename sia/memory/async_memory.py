@@ -0,0 +1,269 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from utils.logging_utils import log_message
+
+from .memory import SiaMemory
+from .models_db import SiaMessageModel, SiaSocialMemoryModel
+from .storage import apply_storage_profile, engine_options, track_committed_writes
+from .schemas import (
+    SiaMessageGeneratedSchema,
+    SiaMessageSchema,
+    SiaSocialMemorySchema,
+)
+
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def async_db_url(db_path: str) -> str:
+    """Translate a sync database URL into its asyncio driver equivalent,
+    e.g. sqlite:///sia.db -> sqlite+aiosqlite:///sia.db."""
+    url = make_url(db_path)
+    backend = url.drivername.split("+")[0]
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver configured for {backend}")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+class AsyncSiaMemory:
+    """asyncio counterpart of SiaMemory running on SQLAlchemy's asyncio engine
+    (aiosqlite / asyncpg), for use from async clients.
+
+    Shares the message cache, the write buffer and the query building of the
+    given SiaMemory, so both views of memory stay consistent. Like SiaMemory,
+    reads go to the read replica if there is one (see
+    SiaMemory.read_session_scope) and fall back to the message archive. The
+    engine's connections belong to the event loop that first uses them: use
+    one AsyncSiaMemory per event loop.
+    """
+
+    def __init__(self, memory: SiaMemory):
+        self.memory = memory
+        self.character = memory.character
+        self.engine = create_async_engine(
+            async_db_url(memory.db_path),
+            **engine_options(memory.db_path, memory.storage_profile),
+        )
+        apply_storage_profile(self.engine.sync_engine, memory.storage_profile)
+        if memory.replica_engine is not None:
+            # keeps the sync reads after these writes on the primary
+            track_committed_writes(self.engine.sync_engine, memory._wrote)
+        self.Session = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+
+        # asyncio engine of SiaMemory's read replica, see read_session_scope()
+        self.replica_engine = None
+        self.ReplicaSession = None
+        if memory.replica_engine is not None:
+            replica_db_path = memory.replica_engine.url.render_as_string(hide_password=False)
+            self.replica_engine = create_async_engine(
+                async_db_url(replica_db_path),
+                **engine_options(replica_db_path, memory.storage_profile),
+            )
+            apply_storage_profile(self.replica_engine.sync_engine, memory.storage_profile)
+            self.ReplicaSession = async_sessionmaker(bind=self.replica_engine, expire_on_commit=False)
+
+        self.logger = memory.logger
+
+    @asynccontextmanager
+    async def session_scope(self):
+        """Provide a transactional scope around a series of operations."""
+        session = self.Session()
+        try:
+            yield session
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            raise e
+        finally:
+            await session.close()
+
+    @asynccontextmanager
+    async def read_session_scope(self):
+        """Provide a session for read-only operations, on the read replica
+        unless a write was committed recently; same routing as
+        SiaMemory.read_session_scope."""
+        if self.ReplicaSession is None or self.memory._wrote_recently():
+            async with self.session_scope() as session:
+                yield session
+            return
+
+        session = self.ReplicaSession()
+        try:
+            yield session
+        finally:
+            await session.close()
+
+    async def _read_your_writes(self):
+        """Store buffered messages before a query so that it sees them."""
+        if len(self.memory.write_buffer):
+            await asyncio.to_thread(self.memory.write_buffer.flush)
+
+    async def get_message(
+        self,
+        message_id: str,
+        load_payloads: bool = False,
+        load_characters: str = "none",
+    ) -> Optional[SiaMessageSchema]:
+        """Same as SiaMemory.get_message."""
+        message_id = str(message_id)
+        message = self.memory.write_buffer.get(message_id) or (
+            None if load_payloads else self.memory.message_cache.get(message_id)
+        )
+        if SiaMemory._has_characters(message, load_characters):
+            return message
+
+        options = list(SiaMemory._load_characters(load_characters))
+        if load_payloads:
+            options.extend(SiaMemory._undefer_payloads())
+        async with self.read_session_scope() as session:
+            message_model = await session.get(SiaMessageModel, message_id, options=options)
+            message = SiaMessageSchema.from_orm(message_model) if message_model else None
+        # archived messages are read from files, as in SiaMemory.get_message
+        message = message or await asyncio.to_thread(self.memory.archive.get_message, message_id)
+        if message:
+            self.memory.message_cache.put(message)
+        return message
+
+    async def get_messages(
+        self,
+        id=None,
+        limit: int = None,
+        include_archive: bool = False,
+        load_payloads: bool = False,
+        load_characters: str = "none",
+        **filters,
+    ) -> List[SiaMessageSchema]:
+        """Same filters, ordering and options as SiaMemory.get_messages."""
+        if id:
+            if filters.get("character") and load_characters == "none":
+                load_characters = "selectin"
+            message = await self.get_message(id, load_payloads=load_payloads, load_characters=load_characters)
+            matches = message is not None and SiaMemory._message_matches(message, **filters)
+            return [message] if matches else []
+
+        def query_messages(session):
+            query = SiaMemory._messages_query(
+                session, load_payloads=load_payloads, load_characters=load_characters, **filters
+            )
+            if limit:
+                query = query.limit(limit)
+            return [SiaMessageSchema.from_orm(message) for message in query.all()]
+
+        await self._read_your_writes()
+        async with self.read_session_scope() as session:
+            messages = await session.run_sync(query_messages)
+
+        if include_archive:
+            # the archive segments are files
+            messages = await asyncio.to_thread(
+                self.memory._merge_archived_messages, messages, limit=limit, **filters
+            )
+        return messages
+
+    async def latest_message(self, **filters) -> Optional[SiaMessageSchema]:
+        """Get the most recently posted message matching the filters, or None."""
+        messages = await self.get_messages(
+            **filters, sort_by="wen_posted", sort_order="desc", limit=1
+        )
+        return messages[0] if messages else None
+
+    async def add_message(
+        self,
+        message_id: str,
+        message: SiaMessageGeneratedSchema,
+        message_type: str = None,
+        original_data: dict = None,
+        character: str = None,
+    ) -> SiaMessageSchema:
+        return (await self.add_messages([{
+            "message_id": message_id,
+            "message": message,
+            "message_type": message_type,
+            "original_data": original_data,
+            "character": character,
+        }]))[0]
+
+    async def add_messages(self, messages: List[Dict], character: str = None) -> List[SiaMessageSchema]:
+        """Same as SiaMemory.add_messages."""
+        if not messages:
+            return []
+
+        async with self.session_scope() as session:
+            stored = await session.run_sync(
+                self.memory._add_messages_in_session,
+                messages,
+                character or self.character.name,
+            )
+
+        self.memory.message_cache.invalidate([message.id for message in stored])
+        self.memory._embed_messages(stored)
+        return stored
+
+    def buffer_message(self, *args, **kwargs) -> SiaMessageSchema:
+        """Same as SiaMemory.buffer_message; it never waits for the database."""
+        return self.memory.buffer_message(*args, **kwargs)
+
+    async def get_social_memory(self, user_id: str, platform: str) -> Optional[SiaSocialMemorySchema]:
+        """Get social memory for a specific user on a specific platform"""
+        cached = self.memory.social_memory_cache.get((platform, user_id))
+        if cached:
+            return cached
+
+        try:
+            async with self.read_session_scope() as session:
+                memory = (await session.execute(
+                    select(SiaSocialMemoryModel).filter_by(
+                        character_name=self.character.name,
+                        user_id=user_id,
+                        platform=platform
+                    )
+                )).scalars().first()
+
+                if memory:
+                    log_message(self.logger, "info", self, f"Found social memory for user {user_id} on {platform}")
+                    stored = await session.run_sync(self.memory._social_memory_schema, memory)
+                    self.memory.social_memory_cache.put((platform, user_id), stored)
+                    return stored
+                else:
+                    log_message(self.logger, "info", self, f"No social memory found for user {user_id} on {platform}")
+                    return None
+
+        except Exception as e:
+            log_message(self.logger, "error", self, f"Error getting social memory: {e}")
+            return None
+
+    async def update_social_memory(
+        self,
+        user_id: str,
+        platform: str,
+        message_id: str,
+        content: str,
+        role: str = "user"
+    ) -> SiaSocialMemorySchema:
+        return await self.update_social_memory_turns(
+            user_id, platform, [{"message_id": message_id, "content": content, "role": role}]
+        )
+
+    async def update_social_memory_turns(self, user_id: str, platform: str, turns: List[Dict]) -> SiaSocialMemorySchema:
+        """Same as SiaMemory.update_social_memory_turns."""
+        await self._read_your_writes()
+        async with self.session_scope() as session:
+            return await session.run_sync(
+                self.memory._update_social_memory_in_session,
+                user_id, platform, turns
+            )
+
+    async def close(self):
+        await self.engine.dispose()
+        if self.replica_engine is not None:
+            await self.replica_engine.dispose()
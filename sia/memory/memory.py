@@ -1,35 +1,152 @@
 import textwrap
-from datetime import datetime, timezone
-from typing import List, Dict, Optional
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Dict, Optional, Tuple
 
-from sqlalchemy import asc, create_engine, desc
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import and_, asc, delete, desc, exists, func, literal, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased, joinedload, selectinload, sessionmaker, undefer
 from contextlib import contextmanager
 from langchain.prompts import ChatPromptTemplate
 from langchain_anthropic import ChatAnthropic
 
 from sia.character import SiaCharacter
+from sia.modules.knowledge.models_db import KnowledgeModuleSettingsModel
 from utils.logging_utils import enable_logging, log_message, setup_logging
 
-from .models_db import Base, SiaCharacterSettingsModel, SiaMessageModel, MessageCharacterModel, SiaSocialMemoryModel
+from .models_db import (
+    Base,
+    MessageCharacterModel,
+    SiaConversationModel,
+    SiaMessageModel,
+    SiaMessageVectorModel,
+    SiaOpinionRefreshModel,
+    SiaSocialMemoryModel,
+    SiaSocialMemoryTurnModel,
+)
 from .schemas import (
+    MessageCharacterSchema,
     SiaCharacterSettingsSchema,
+    SiaConversationSchema,
     SiaMessageGeneratedSchema,
     SiaMessageSchema,
     SiaSocialMemorySchema,
+    message_row_type,
 )
+from .archive import SiaMessageArchive
+from .cache import SiaMessageCache, SiaTTLCache
+from .opinion_worker import SiaOpinionWorker
+from .settings_cache import SiaSettingsCache
+from .search import apply_search, ensure_search_index, search_terms
+from .storage import create_memory_engine, track_committed_writes
+from .vector_memory import SiaEmbedder, SiaEmbeddingQueue, SiaVectorMemory
+from .write_buffer import SiaMessageWriteBuffer
+
+
+# Number of latest message ids kept per conversation, see get_conversation_messages()
+CONVERSATION_RECENT_MESSAGES = 20
+
+# Number of latest turns in SiaSocialMemorySchema.conversation_history
+SOCIAL_MEMORY_HISTORY_TURNS = 20
 
 
 class SiaMemory:
 
-    def __init__(self, db_path: str, character: SiaCharacter):
+    def __init__(
+        self,
+        db_path: str,
+        character: SiaCharacter,
+        write_buffer_size: int = 100,
+        write_buffer_delay: float = 5.0,
+        message_cache_size: int = 1024,
+        message_cache_ttl: float = 300.0,
+        storage_profile: str = "default",
+        vector_memory_path: str = None,
+        embedder: SiaEmbedder = None,
+        archive_dir: str = "memory/archive",
+        opinion_refresh_concurrency: int = 2,
+        social_memory_cache_size: int = 1024,
+        settings_check_interval: float = 30.0,
+        replica_db_path: str = None,
+        replica_sticky_seconds: float = 5.0,
+    ):
         self.db_path = db_path
         self.character = character
-        self.engine = create_engine(self.db_path)
+        # "production" enables WAL / pragmas on SQLite and pooling on Postgres,
+        #   see storage.py
+        self.storage_profile = storage_profile
+        self.engine = create_memory_engine(self.db_path, self.storage_profile)
         Base.metadata.create_all(self.engine)
+        # read together with the character settings, see SiaSettingsCache
+        KnowledgeModuleSettingsModel.__table__.create(self.engine, checkfirst=True)
+        self.search_enabled = ensure_search_index(self.engine)
         self.Session = sessionmaker(bind=self.engine)
         self.logging_enabled = self.character.logging_enabled
 
+        # Optional read replica of the database, see read_session_scope().
+        #   Its schema is the primary's: it is never created or migrated here.
+        self.replica_engine = (
+            create_memory_engine(replica_db_path, self.storage_profile)
+            if replica_db_path
+            else None
+        )
+        self.ReplicaSession = (
+            sessionmaker(bind=self.replica_engine) if self.replica_engine else None
+        )
+        # how long reads stay on the primary after a write, should exceed the
+        #   replication lag
+        self.replica_sticky_seconds = replica_sticky_seconds
+        # process-wide, not per thread: writes are also made by the write
+        #   buffer's flush thread and by AsyncSiaMemory's engine on behalf of
+        #   the thread that reads next
+        self._last_write_at = None
+        if self.replica_engine is not None:
+            track_committed_writes(self.engine, self._wrote)
+
+        # Message embeddings for get_relevant_messages(), off unless a matrix
+        #   file is given
+        self.vector_memory = (
+            SiaVectorMemory(self.session_scope, vector_memory_path, embedder)
+            if vector_memory_path
+            else None
+        )
+        # new messages are embedded off the write path
+        self.embedding_queue = (
+            SiaEmbeddingQueue(self.vector_memory) if self.vector_memory is not None else None
+        )
+
+        # Cold storage for messages moved out by archive_messages()
+        self.archive = SiaMessageArchive(self.read_session_scope, archive_dir)
+
+        # Message lookups by id, see get_message()
+        self.message_cache = SiaMessageCache(
+            maxsize=message_cache_size, ttl=message_cache_ttl
+        )
+        # Social memories by (platform, user_id), read on every response and
+        #   written through by update_social_memory_turns()
+        self.social_memory_cache = SiaTTLCache(
+            maxsize=social_memory_cache_size, ttl=message_cache_ttl
+        )
+
+        # Character and knowledge module settings, read on every post and
+        #   reloaded when another process changes them
+        self.settings = SiaSettingsCache(
+            self.session_scope, self.character.name_id, check_interval=settings_check_interval
+        )
+
+        # Write-behind buffer for inbound messages, see buffer_message()
+        self.write_buffer = SiaMessageWriteBuffer(
+            self.add_messages,
+            max_size=write_buffer_size,
+            max_delay=write_buffer_delay,
+        )
+
+        # Social memory opinions are generated off the reply path, see
+        #   update_social_memory(); started by Sia.run()
+        self.opinion_worker = SiaOpinionWorker(self, max_concurrency=opinion_refresh_concurrency)
+
         self.logger = setup_logging()
         enable_logging(self.logging_enabled)
 
@@ -46,6 +163,226 @@ class SiaMemory:
         finally:
             session.close()
             
+    @contextmanager
+    def read_session_scope(self):
+        """Provide a session for read-only operations.
+
+        It is bound to the read replica if there is one, unless a write was
+        committed in this process (from any thread, or the asyncio engine of
+        AsyncSiaMemory) during the last `replica_sticky_seconds`: the replica
+        may not have it yet, so reads stay on the primary meanwhile. A miss on
+        the replica must not lead to a write; check the primary first.
+        """
+        if self.ReplicaSession is None or self._wrote_recently():
+            with self.session_scope() as session:
+                yield session
+            return
+
+        session = self.ReplicaSession()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def _wrote(self):
+        self._last_write_at = time.monotonic()
+
+    def _wrote_recently(self) -> bool:
+        last_write_at = self._last_write_at
+        return last_write_at is not None and time.monotonic() - last_write_at < self.replica_sticky_seconds
+
+    def _read_your_writes(self):
+        """Store buffered messages before a query so that it sees them."""
+        if len(self.write_buffer):
+            self.write_buffer.flush()
+
+    @staticmethod
+    def _message_matches(
+        message: SiaMessageSchema,
+        id=None,
+        platform: str = None,
+        author: str = None,
+        not_author: str = None,
+        character: str = None,
+        conversation_id: str = None,
+        response_to: str = None,
+        flagged: int = 0,
+        is_post: bool = None,
+        from_datetime=None,
+        to_datetime=None,
+        **kwargs,
+    ) -> bool:
+        """Check an in-memory message against the `get_messages` filters."""
+        if id and message.id != id:
+            return False
+        if platform and message.platform != platform:
+            return False
+        if author and message.author != author:
+            return False
+        if not_author and message.author == not_author:
+            return False
+        if character and character not in [c.character_name for c in message.characters or []]:
+            return False
+        if conversation_id and message.conversation_id != conversation_id:
+            return False
+        if response_to:
+            if response_to == "NOT NULL":
+                if message.response_to is None:
+                    return False
+            elif message.response_to != response_to:
+                return False
+        if from_datetime and message.wen_posted < from_datetime:
+            return False
+        if to_datetime and message.wen_posted >= to_datetime:
+            return False
+        if is_post and message.message_type != "post":
+            return False
+        if flagged != 2 and bool(message.flagged) != bool(flagged):
+            return False
+        return True
+
+    @staticmethod
+    def _undefer_payloads():
+        """Query options loading the deferred payload columns."""
+        return (
+            undefer(SiaMessageModel.original_data),
+            undefer(SiaMessageModel.message_metadata),
+        )
+
+    @staticmethod
+    def _load_characters(load_characters: str):
+        """Query options loading the characters relationship: "none" leaves
+        it unloaded, "selectin" loads it with one extra IN query, "joined"
+        with a LEFT JOIN returning each message once per linked character."""
+        if load_characters == "none":
+            return ()
+        if load_characters == "selectin":
+            return (selectinload(SiaMessageModel.characters),)
+        if load_characters == "joined":
+            return (joinedload(SiaMessageModel.characters),)
+        raise ValueError(f"Unknown load_characters strategy: {load_characters}")
+
+    @staticmethod
+    def _has_characters(message: Optional[SiaMessageSchema], load_characters: str) -> bool:
+        """Whether a cached message holds the characters a caller asked for."""
+        return message is not None and (load_characters == "none" or message.characters is not None)
+
+    @staticmethod
+    def _messages_query(
+        session,
+        id=None,
+        platform: str = None,
+        author: str = None,
+        not_author: str = None,
+        character: str = None,
+        conversation_id: str = None,
+        response_to: str = None,
+        flagged: int = 0,
+        sort_by: str = None,
+        sort_order: str = "asc",
+        is_post: bool = None,
+        from_datetime=None,
+        to_datetime=None,
+        exclude_own_conversations: bool = False,
+        after_wen_posted=None,
+        after_id: str = None,
+        columns: Tuple[str, ...] = None,
+        load_payloads: bool = False,
+        load_characters: str = "none",
+    ):
+        """Build the filtered and ordered message query shared by all readers.
+
+        `after_wen_posted`/`after_id` form a keyset cursor: only messages that
+        come strictly after the cursor in the requested sort order are matched.
+        With `columns` set only those columns are selected instead of full
+        SiaMessageModel objects. `original_data` and `message_metadata` are
+        only loaded with `load_payloads`, the characters relationship as set
+        by `load_characters` (see `_load_characters`).
+        """
+        if columns:
+            query = session.query(*[getattr(SiaMessageModel, c) for c in columns])
+        else:
+            query = session.query(SiaMessageModel).options(
+                *SiaMemory._load_characters(load_characters)
+            )
+            if load_payloads:
+                query = query.options(*SiaMemory._undefer_payloads())
+
+        if character:
+            # Use subquery for character filtering
+            character_messages = (
+                session.query(MessageCharacterModel.message_id)
+                .filter(MessageCharacterModel.character_name == character)
+                .subquery()
+            )
+            query = query.filter(SiaMessageModel.id.in_(character_messages.select()))
+
+        # Apply other filters
+        if id:
+            query = query.filter(SiaMessageModel.id == id)
+        if platform:
+            query = query.filter(SiaMessageModel.platform == platform)
+        if author:
+            query = query.filter(SiaMessageModel.author == author)
+        if not_author:
+            query = query.filter(SiaMessageModel.author != not_author)
+        if conversation_id:
+            query = query.filter(SiaMessageModel.conversation_id == conversation_id)
+        if response_to:
+            if response_to == "NOT NULL":
+                query = query.filter(SiaMessageModel.response_to != None)
+            else:
+                query = query.filter(SiaMessageModel.response_to == response_to)
+        if from_datetime:
+            query = query.filter(SiaMessageModel.wen_posted >= from_datetime)
+        if to_datetime:
+            query = query.filter(SiaMessageModel.wen_posted < to_datetime)
+        if is_post:
+            query = query.filter(SiaMessageModel.message_type == "post")
+        if flagged != 2:
+            query = query.filter(SiaMessageModel.flagged == bool(flagged))
+
+        # Handle sorting
+        if not sort_by:
+            sort_by = "wen_posted"
+            sort_order = "desc"
+
+        order_func = asc if sort_order == "asc" else desc
+
+        # Keyset pagination only makes sense on the (wen_posted, id) ordering
+        if after_wen_posted is not None or after_id is not None:
+            if after_wen_posted is None or after_id is None:
+                raise ValueError("Keyset cursor needs both after_wen_posted and after_id")
+            if sort_by != "wen_posted":
+                raise ValueError("Keyset cursor requires sorting by wen_posted")
+            if sort_order == "asc":
+                query = query.filter(
+                    or_(
+                        SiaMessageModel.wen_posted > after_wen_posted,
+                        and_(
+                            SiaMessageModel.wen_posted == after_wen_posted,
+                            SiaMessageModel.id > after_id,
+                        ),
+                    )
+                )
+            else:
+                query = query.filter(
+                    or_(
+                        SiaMessageModel.wen_posted < after_wen_posted,
+                        and_(
+                            SiaMessageModel.wen_posted == after_wen_posted,
+                            SiaMessageModel.id < after_id,
+                        ),
+                    )
+                )
+
+        query = query.order_by(order_func(getattr(SiaMessageModel, sort_by)))
+        if sort_by != "id":
+            # Tie-breaker keeps the order stable for keyset pagination
+            query = query.order_by(order_func(SiaMessageModel.id))
+
+        return query
+
     def get_messages(
         self,
         id=None,
@@ -60,55 +397,359 @@ class SiaMemory:
         sort_order: str = "asc",
         is_post: bool = None,
         from_datetime=None,
+        to_datetime=None,
         exclude_own_conversations: bool = False,
+        limit: int = None,
+        after_wen_posted=None,
+        after_id: str = None,
+        include_archive: bool = False,
+        load_payloads: bool = False,
+        load_characters: str = "none",
     ):
-        with self.session_scope() as session:
-            # Start with a query that eagerly loads characters
-            query = session.query(SiaMessageModel)
-            
-            if character:
-                # Use subquery for character filtering
-                character_messages = (
-                    session.query(MessageCharacterModel.message_id)
-                    .filter(MessageCharacterModel.character_name == character)
-                    .subquery()
-                )
-                query = query.filter(SiaMessageModel.id.in_(character_messages.select()))
-            
-            # Apply other filters
-            if id:
-                query = query.filter_by(id=id)
-            if platform:
-                query = query.filter_by(platform=platform)
-            if author:
-                query = query.filter_by(author=author)
-            if not_author:
-                query = query.filter(SiaMessageModel.author != not_author)
-            if conversation_id:
-                query = query.filter_by(conversation_id=conversation_id)
-            if response_to:
-                if response_to == "NOT NULL":
-                    query = query.filter(SiaMessageModel.response_to != None)
-                else:
-                    query = query.filter_by(response_to=response_to)
-            if from_datetime:
-                query = query.filter(SiaMessageModel.wen_posted >= from_datetime)
-            if is_post:
-                query = query.filter(SiaMessageModel.message_type == "post")
-            if flagged != 2:
-                query = query.filter_by(flagged=bool(flagged))
-
-            # Handle sorting
-            if not sort_by:
-                sort_by = "wen_posted"
-                sort_order = "desc"
-
-            order_func = asc if sort_order == "asc" else desc
-            query = query.order_by(order_func(sort_by))
+        """Get messages matching the filters.
+
+        Only the hot `message` table is queried unless `include_archive` is
+        set, which also scans the archive segments (see archive_messages())
+        overlapping the time range; slow, meant for rare lookups of old
+        history. `exclude_own_conversations` does not apply to archived
+        messages. Lookups by `id` always fall back to the archive.
+
+        `original_data` and `message_metadata` (raw platform payloads) are
+        left empty unless `load_payloads` is set. `characters` is None unless
+        `load_characters` is "selectin" (one extra IN query, best for most
+        reads) or "joined" (a LEFT JOIN repeating each message row per linked
+        character); filtering by `character` does not need it.
+        """
+        if id:
+            message = self.get_message(
+                str(id),
+                load_payloads=load_payloads,
+                # the character filter is checked on the message itself
+                load_characters="selectin" if character and load_characters == "none" else load_characters,
+            )
+            matches = message is not None and self._message_matches(
+                message,
+                platform=platform,
+                author=author,
+                not_author=not_author,
+                character=character,
+                conversation_id=conversation_id,
+                response_to=response_to,
+                flagged=flagged,
+                is_post=is_post,
+                from_datetime=from_datetime,
+                to_datetime=to_datetime,
+            )
+            return [message] if matches else []
+
+        self._read_your_writes()
+        with self.read_session_scope() as session:
+            query = self._messages_query(
+                session,
+                id=id,
+                platform=platform,
+                author=author,
+                not_author=not_author,
+                character=character,
+                conversation_id=conversation_id,
+                response_to=response_to,
+                flagged=flagged,
+                sort_by=sort_by,
+                sort_order=sort_order,
+                is_post=is_post,
+                from_datetime=from_datetime,
+                to_datetime=to_datetime,
+                exclude_own_conversations=exclude_own_conversations,
+                after_wen_posted=after_wen_posted,
+                after_id=after_id,
+                load_payloads=load_payloads,
+                load_characters=load_characters,
+            )
+            if limit:
+                query = query.limit(limit)
 
             # Execute query and convert to schema
             messages = query.all()
-            return [SiaMessageSchema.from_orm(message) for message in messages]
+            messages = [SiaMessageSchema.from_orm(message) for message in messages]
+
+        if include_archive:
+            messages = self._merge_archived_messages(
+                messages,
+                limit=limit,
+                sort_by=sort_by,
+                sort_order=sort_order,
+                after_wen_posted=after_wen_posted,
+                after_id=after_id,
+                platform=platform,
+                author=author,
+                not_author=not_author,
+                character=character,
+                conversation_id=conversation_id,
+                response_to=response_to,
+                flagged=flagged,
+                is_post=is_post,
+                from_datetime=from_datetime,
+                to_datetime=to_datetime,
+            )
+        return messages
+
+    def _merge_archived_messages(
+        self,
+        messages: List[SiaMessageSchema],
+        limit: int = None,
+        sort_by: str = None,
+        sort_order: str = "asc",
+        after_wen_posted=None,
+        after_id: str = None,
+        **filters,
+    ) -> List[SiaMessageSchema]:
+        """Add the archived messages matching the filters to `messages` from
+        the hot table, keeping the `get_messages` ordering and limit."""
+        if not sort_by:
+            sort_by, sort_order = "wen_posted", "desc"
+        descending = sort_order == "desc"
+
+        def utc(value):
+            # SQLite returns naive datetimes, all stored times are UTC
+            if isinstance(value, datetime) and value.tzinfo is None:
+                return value.replace(tzinfo=timezone.utc)
+            return value
+
+        def key(message):
+            return (utc(getattr(message, sort_by)), message.id)
+
+        cursor = None
+        if after_wen_posted is not None and after_id is not None and sort_by == "wen_posted":
+            cursor = (utc(after_wen_posted), after_id)
+
+        merged = {message.id: message for message in messages}
+        hot_ids = set(merged)
+        # segments are read oldest first: a message archived twice keeps its latest copy
+        for message in self.archive.iter_messages(
+            from_datetime=filters.get("from_datetime"), to_datetime=filters.get("to_datetime")
+        ):
+            if message.id in hot_ids or not self._message_matches(message, **filters):
+                continue
+            if cursor and (key(message) >= cursor if descending else key(message) <= cursor):
+                continue
+            merged[message.id] = message
+
+        merged = sorted(merged.values(), key=key, reverse=descending)
+        return merged[:limit] if limit else merged
+
+    def get_message(
+        self,
+        message_id: str,
+        load_payloads: bool = False,
+        load_characters: str = "none",
+    ) -> Optional[SiaMessageSchema]:
+        """Get a message by id, flagged or not, or None.
+
+        Served from the write buffer or the message cache when possible,
+        except with `load_payloads`, which always reads the stored payloads,
+        or when the cached copy lacks the requested characters.
+        """
+        message_id = str(message_id)
+        message = self.write_buffer.get(message_id) or (
+            None if load_payloads else self.message_cache.get(message_id)
+        )
+        if self._has_characters(message, load_characters):
+            return message
+
+        with self.read_session_scope() as session:
+            query = (
+                session.query(SiaMessageModel)
+                .options(*self._load_characters(load_characters))
+                .filter_by(id=message_id)
+            )
+            if load_payloads:
+                query = query.options(*self._undefer_payloads())
+            message_model = query.first()
+            message = SiaMessageSchema.from_orm(message_model) if message_model else None
+        message = message or self.archive.get_message(message_id)
+        if message:
+            self.message_cache.put(message)
+        return message
+
+    def cache_stats(self) -> Dict:
+        """Hit/miss statistics of the message cache."""
+        return self.message_cache.stats()
+
+    def get_message_rows(
+        self,
+        columns: Tuple[str, ...] = ("id", "wen_posted", "content"),
+        limit: int = None,
+        **filters,
+    ):
+        """Get lightweight rows holding only `columns` of each message.
+
+        Accepts the same filters as `get_messages`. The message id is always
+        included so that rows can later be upgraded to full schemas with
+        `upgrade_rows`.
+        """
+        columns = tuple(columns)
+        if "id" not in columns:
+            columns = ("id",) + columns
+        row_type = message_row_type(columns)
+
+        self._read_your_writes()
+        with self.read_session_scope() as session:
+            query = self._messages_query(session, columns=columns, **filters)
+            if limit:
+                query = query.limit(limit)
+            return [row_type(*row) for row in query]
+
+    def upgrade_rows(self, rows) -> List[SiaMessageSchema]:
+        """Load full SiaMessageSchema objects for rows from `get_message_rows`,
+        preserving their order."""
+        return self.get_messages_by_ids([row.id for row in rows])
+
+    def get_messages_by_ids(
+        self,
+        message_ids: List[str],
+        load_payloads: bool = False,
+        load_characters: str = "none",
+    ) -> List[SiaMessageSchema]:
+        """Get messages by id, flagged or not, preserving the order of
+        `message_ids`. Ids that are not stored are skipped."""
+        messages = {}
+        missing = []
+        for id in message_ids:
+            message = self.write_buffer.get(id) or (
+                None if load_payloads else self.message_cache.get(id)
+            )
+            if self._has_characters(message, load_characters):
+                messages[id] = message
+            else:
+                missing.append(id)
+
+        if missing:
+            with self.read_session_scope() as session:
+                query = session.query(SiaMessageModel).options(
+                    *self._load_characters(load_characters)
+                )
+                if load_payloads:
+                    query = query.options(*self._undefer_payloads())
+                # Chunked to stay below the database's bound parameters limit
+                for i in range(0, len(missing), 500):
+                    for message in query.filter(SiaMessageModel.id.in_(missing[i:i + 500])):
+                        messages[message.id] = SiaMessageSchema.from_orm(message)
+                        self.message_cache.put(messages[message.id])
+
+            missing = [id for id in missing if id not in messages]
+            if missing:
+                messages.update(self.archive.get_messages_by_ids(missing))
+        return [messages[id] for id in message_ids if id in messages]
+
+    def count_messages(self, **filters) -> int:
+        """Count messages matching the `get_messages` filters in SQL.
+
+        Use `from_datetime`/`to_datetime` for time-window counts, e.g. the
+        number of replies sent during the last hour.
+        """
+        self._read_your_writes()
+        with self.read_session_scope() as session:
+            query = self._messages_query(session, columns=("id",), **filters)
+            return (
+                query.order_by(None)
+                .with_entities(func.count(SiaMessageModel.id))
+                .scalar()
+            )
+
+    def latest_message(self, **filters) -> Optional[SiaMessageSchema]:
+        """Get the most recently posted message matching the `get_messages`
+        filters, or None."""
+        messages = self.get_messages(
+            **filters, sort_by="wen_posted", sort_order="desc", limit=1
+        )
+        return messages[0] if messages else None
+
+    def max_message_id(self, **filters) -> Optional[str]:
+        """Get the greatest message id matching the `get_messages` filters,
+        or None."""
+        self._read_your_writes()
+        with self.read_session_scope() as session:
+            query = self._messages_query(session, columns=("id",), **filters)
+            return (
+                query.order_by(None)
+                .with_entities(func.max(SiaMessageModel.id))
+                .scalar()
+            )
+
+    def iter_messages(self, chunk_size: int = 500, limit: int = None, **filters):
+        """Yield messages one by one, reading them from the database in
+        keyset-paginated chunks of `chunk_size` rows.
+
+        Accepts the same filters as `get_messages`. Each chunk is read in its
+        own short session, so iterating over a large history neither holds a
+        transaction open nor loads the whole table into memory.
+        """
+        if filters.get("sort_by") not in (None, "wen_posted"):
+            raise ValueError("iter_messages only supports sorting by wen_posted")
+        if not filters.get("sort_by"):
+            filters["sort_by"] = "wen_posted"
+            filters["sort_order"] = "desc"
+
+        after_wen_posted = filters.pop("after_wen_posted", None)
+        after_id = filters.pop("after_id", None)
+        yielded = 0
+        while True:
+            page_size = chunk_size if limit is None else min(chunk_size, limit - yielded)
+            if page_size <= 0:
+                return
+            page = self.get_messages(
+                **filters,
+                limit=page_size,
+                after_wen_posted=after_wen_posted,
+                after_id=after_id,
+            )
+            for message in page:
+                yield message
+            yielded += len(page)
+            if len(page) < page_size:
+                return
+            after_wen_posted, after_id = page[-1].wen_posted, page[-1].id
+
+    def search_messages(
+        self,
+        query: str,
+        limit: int = 10,
+        platform: str = None,
+        author: str = None,
+        character: str = None,
+        flagged: int = 0,
+        match_all: bool = True,
+    ) -> List[SiaMessageSchema]:
+        """Full-text search over message content, best matches first.
+
+        Words of `query` are matched stemmed and case-insensitively, all of
+        them (`match_all`) or any. Served by the FTS5 table on SQLite and the
+        GIN index on Postgres; other databases fall back to an unranked
+        substring match.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return []
+
+        self._read_your_writes()
+        with self.read_session_scope() as session:
+            messages_query = apply_search(
+                self._messages_query(
+                    session,
+                    platform=platform,
+                    author=author,
+                    character=character,
+                    flagged=flagged,
+                ),
+                session.get_bind().dialect.name,
+                terms,
+                match_all=match_all,
+                indexed=self.search_enabled,
+            )
+            return [
+                SiaMessageSchema.from_orm(message)
+                for message in messages_query.limit(limit)
+            ]
 
     def add_message(
         self,
@@ -118,33 +759,31 @@ class SiaMemory:
         original_data: dict = None,
         character: str = None,
     ) -> SiaMessageSchema:
-        with self.session_scope() as session:
-            try:
-                # First check if message exists
-                existing_message = session.query(SiaMessageModel).filter_by(id=str(message_id)).first()
-                if existing_message:
-                    # Check if character association exists
-                    character_name = character or self.character.name
-                    existing_link = session.query(MessageCharacterModel).filter_by(
-                        message_id=str(message_id),
-                        character_name=character_name
-                    ).first()
-                    
-                    if existing_link:
-                        # Both message and link exist, return existing message
-                        return SiaMessageSchema.from_orm(existing_message)
-                    
-                    # Message exists but link doesn't - create new link
-                    character_model = MessageCharacterModel(
-                        message_id=str(message_id),
-                        character_name=character_name,
-                        created_at=existing_message.wen_posted
-                    )
-                    session.add(character_model)
-                    session.commit()
-                    return SiaMessageSchema.from_orm(existing_message)
+        """Store a message and link it to `character` (default: this
+        character); see `add_messages`. Storing an already stored message or
+        link again is a no-op returning the stored message."""
+        return self.add_messages([{
+            "message_id": message_id,
+            "message": message,
+            "message_type": message_type,
+            "original_data": original_data,
+            "character": character,
+        }])[0]
 
-                # Message doesn't exist - create new message and link
+    def _add_message(
+        self,
+        message_id: str,
+        message: SiaMessageGeneratedSchema,
+        message_type: str = None,
+        original_data: dict = None,
+        character: str = None,
+        wen_posted: datetime = None,
+    ) -> SiaMessageSchema:
+        """`add_message` for databases without INSERT ... ON CONFLICT."""
+        character_name = character or self.character.name
+        with self.session_scope() as session:
+            message_model = session.get(SiaMessageModel, str(message_id))
+            if message_model is None:
                 message_model = SiaMessageModel(
                     id=str(message_id),
                     platform=message.platform,
@@ -155,70 +794,712 @@ class SiaMemory:
                     flagged=message.flagged,
                     message_metadata=message.message_metadata,
                     original_data=original_data,
-                    message_type=message_type
+                    message_type=message_type,
+                    wen_posted=wen_posted or datetime.now(timezone.utc),
                 )
                 session.add(message_model)
-                session.flush()  # Ensure message is created before creating link
-                
-                # Create character association
-                character_model = MessageCharacterModel(
+                session.flush()
+
+            stored = SiaMessageSchema.from_orm(message_model)
+            if session.get(MessageCharacterModel, (str(message_id), character_name)) is None:
+                session.add(MessageCharacterModel(
                     message_id=str(message_id),
-                    character_name=character or self.character.name,
-                    created_at=message_model.wen_posted
+                    character_name=character_name,
+                    created_at=message_model.wen_posted,
+                ))
+                session.flush()
+                self._update_conversations_in_session(session, character_name, [stored])
+            return stored
+
+    @staticmethod
+    def _insert(model, dialect_name: str):
+        """Dialect specific INSERT construct supporting ON CONFLICT DO NOTHING,
+        or None if the database does not support it."""
+        if dialect_name == "postgresql":
+            return postgresql_insert(model)
+        if dialect_name == "sqlite":
+            return sqlite_insert(model)
+        return None
+
+    def add_messages(self, messages: List[Dict], character: str = None) -> List[SiaMessageSchema]:
+        """Store a batch of messages in a single transaction.
+
+        Each item holds the `add_message` arguments: `message_id`, `message`
+        and optionally `message_type`, `original_data`, `character` and
+        `wen_posted`.
+        Messages and their character links are written with
+        INSERT ... ON CONFLICT DO NOTHING, so already stored messages are left
+        untouched. Returns the stored messages in input order.
+        """
+        if not messages:
+            return []
+
+        if self._insert(SiaMessageModel, self.engine.dialect.name) is None:
+            stored = [
+                self._add_message(**{**entry, "character": entry.get("character") or character})
+                for entry in messages
+            ]
+        else:
+            with self.session_scope() as session:
+                stored = self._add_messages_in_session(
+                    session, messages, character or self.character.name
                 )
-                session.add(character_model)
-                session.commit()
-                
-                return SiaMessageSchema.from_orm(message_model)
-                
-            except Exception as e:
-                log_message(self.logger, "error", self, f"Error in add_message: {e}")
-                session.rollback()
-                # Return existing message if we can find it
-                existing_message = session.query(SiaMessageModel).filter_by(id=str(message_id)).first()
-                if existing_message:
-                    return SiaMessageSchema.from_orm(existing_message)
-                raise e
-    
-    def get_conversation_ids(self):
-        session = self.Session()
-        conversation_ids = (
-            session.query(SiaMessageModel.conversation_id)
-            .filter(SiaMessageModel.id != SiaMessageModel.conversation_id)
-            .distinct()
-            .all()
+
+        self.message_cache.invalidate([message.id for message in stored])
+        self._embed_messages(stored)
+        return stored
+
+    def _embed_messages(self, messages: List[SiaMessageSchema]):
+        """Queue stored messages for the vector memory, if enabled (see
+        SiaEmbeddingQueue). Failures are logged, not raised: the messages are
+        stored and can be embedded later with backfill_vectors()."""
+        if self.embedding_queue is not None:
+            self.embedding_queue.add(messages)
+
+    def get_relevant_messages(
+        self,
+        query: str,
+        k: int = 5,
+        author: str = None,
+        platform: str = None,
+        exclude_ids: List[str] = (),
+    ) -> List[SiaMessageSchema]:
+        """The `k` stored messages semantically closest to `query`, best
+        first, optionally only those of an author / on a platform. Empty if
+        vector memory is not enabled."""
+        if self.vector_memory is None:
+            return []
+        self._read_your_writes()
+        matches = self.vector_memory.search(
+            query, k=k, author=author, platform=platform, exclude_ids=exclude_ids
+        )
+        return self.get_messages_by_ids([message_id for message_id, _ in matches])
+
+    def backfill_vectors(self, chunk_size: int = 500, **filters) -> int:
+        """Embed stored messages that have no vector yet, e.g. those stored
+        before vector memory was enabled. Accepts the `get_messages` filters.
+        Returns the number of vectors added."""
+        if self.vector_memory is None:
+            return 0
+        added = 0
+        chunk = []
+        for message in self.iter_messages(chunk_size=chunk_size, **filters):
+            chunk.append(message)
+            if len(chunk) == chunk_size:
+                added += self.vector_memory.add_messages(chunk)
+                chunk = []
+        if chunk:
+            added += self.vector_memory.add_messages(chunk)
+        return added
+
+    def _add_messages_in_session(self, session, messages: List[Dict], character: str) -> List[SiaMessageSchema]:
+        """The statements of `add_messages`, run in the given session."""
+        dialect_name = session.get_bind().dialect.name
+
+        message_rows = {}
+        links = {}
+        for entry in messages:
+            message = entry["message"]
+            message_id = str(entry["message_id"])
+            links.setdefault(entry.get("character") or character, {})[message_id] = None
+            if message_id in message_rows:
+                continue
+            message_rows[message_id] = {
+                "id": message_id,
+                "platform": message.platform,
+                "author": message.author,
+                "content": message.content,
+                "conversation_id": message.conversation_id or message_id,
+                "response_to": message.response_to,
+                "flagged": message.flagged,
+                "message_metadata": message.message_metadata,
+                "original_data": entry.get("original_data"),
+                "message_type": entry.get("message_type"),
+                "wen_posted": entry.get("wen_posted") or datetime.now(timezone.utc),
+            }
+        ids = list(message_rows)
+
+        session.execute(
+            self._insert(SiaMessageModel, dialect_name)
+            .on_conflict_do_nothing(index_elements=["id"]),
+            list(message_rows.values()),
+        )
+
+        # message ids newly linked to each character, i.e. new to its conversations
+        linked = {}
+        for character_name, message_ids in links.items():
+            message_ids = list(message_ids)
+            for i in range(0, len(message_ids), 500):
+                linked.setdefault(character_name, []).extend(
+                    self._insert_links(
+                        session, dialect_name, character_name, message_ids[i:i + 500]
+                    )
+                )
+
+        stored = {}
+        for i in range(0, len(ids), 500):
+            for message in (
+                session.query(SiaMessageModel)
+                .filter(SiaMessageModel.id.in_(ids[i:i + 500]))
+            ):
+                stored[message.id] = SiaMessageSchema.from_orm(message)
+
+        for character_name, message_ids in linked.items():
+            self._update_conversations_in_session(
+                session, character_name, [stored[id] for id in message_ids]
+            )
+
+        return [stored[str(entry["message_id"])] for entry in messages]
+
+    def _insert_links(self, session, dialect_name: str, character_name: str, message_ids: List[str]) -> List[str]:
+        """Link stored messages to a character, skipping existing links.
+        Returns the ids of the messages that were newly linked."""
+        statement = (
+            self._insert(MessageCharacterModel, dialect_name)
+            .from_select(
+                ["message_id", "character_name", "created_at"],
+                select(
+                    SiaMessageModel.id,
+                    literal(character_name),
+                    SiaMessageModel.wen_posted,
+                ).where(SiaMessageModel.id.in_(message_ids)),
+            )
+            # no conflict target: also works on databases that still have
+            #   the message_id primary key (before migration e5a7c9d1f3b4)
+            .on_conflict_do_nothing()
+        )
+
+        if session.get_bind().dialect.insert_returning:
+            return list(
+                session.execute(statement.returning(MessageCharacterModel.message_id)).scalars()
+            )
+
+        already_linked = set(
+            session.execute(
+                select(MessageCharacterModel.message_id).where(
+                    MessageCharacterModel.character_name == character_name,
+                    MessageCharacterModel.message_id.in_(message_ids),
+                )
+            ).scalars()
         )
-        session.close()
+        session.execute(statement)
+        return [id for id in message_ids if id not in already_linked]
+
+    def archive_messages(self, older_than_days: float, batch_size: int = 5000) -> int:
+        """Move messages posted more than `older_than_days` ago out of the
+        `message` table into compressed archive segments, `batch_size`
+        messages per segment and transaction. Returns the number of messages
+        archived.
+
+        Archived messages stay readable by id and with
+        `get_messages(include_archive=True)`; they drop out of content search
+        and the other hot-table queries.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+        self._read_your_writes()
+
+        archived = 0
+        while True:
+            file_name = None
+            try:
+                with self.session_scope() as session:
+                    messages = [
+                        SiaMessageSchema.from_orm(message)
+                        for message in session.query(SiaMessageModel)
+                        .options(*self._undefer_payloads(), *self._load_characters("selectin"))
+                        .filter(SiaMessageModel.wen_posted < cutoff)
+                        .order_by(SiaMessageModel.wen_posted, SiaMessageModel.id)
+                        .limit(batch_size)
+                    ]
+                    if not messages:
+                        break
+                    file_name = self.archive.write_segment(session, messages)
+
+                    ids = [message.id for message in messages]
+                    for i in range(0, len(ids), 500):
+                        self._keep_turn_contents(session, ids[i:i + 500])
+                        session.query(MessageCharacterModel).filter(
+                            MessageCharacterModel.message_id.in_(ids[i:i + 500])
+                        ).delete(synchronize_session=False)
+                        session.query(SiaMessageModel).filter(
+                            SiaMessageModel.id.in_(ids[i:i + 500])
+                        ).delete(synchronize_session=False)
+            except Exception:
+                if file_name:
+                    self.archive.discard(file_name)
+                raise
+
+            self.message_cache.invalidate(ids)
+            archived += len(messages)
+            log_message(self.logger, "info", self, f"Archived {len(messages)} messages to {file_name}")
+            if len(messages) < batch_size:
+                break
+        return archived
+
+    def buffer_message(
+        self,
+        message_id: str,
+        message: SiaMessageGeneratedSchema,
+        message_type: str = None,
+        original_data: dict = None,
+        character: str = None,
+    ) -> SiaMessageSchema:
+        """Queue a message for write-behind storage and return it right away.
+
+        The message is written by the write buffer in a batch with others.
+        Until then `get_messages(id=...)` serves it from the buffer and other
+        reads store pending messages before querying.
+        """
+        message_id = str(message_id)
+        existing = self.write_buffer.get(message_id)
+        if existing:
+            return existing
+
+        entry = {
+            "message_id": message_id,
+            "message": message,
+            "message_type": message_type,
+            "original_data": original_data,
+            "character": character or self.character.name,
+            "wen_posted": datetime.now(timezone.utc),
+        }
+        schema = SiaMessageSchema(
+            id=message_id,
+            platform=message.platform,
+            author=message.author,
+            content=message.content,
+            conversation_id=message.conversation_id or message_id,
+            response_to=message.response_to,
+            flagged=message.flagged,
+            message_metadata=message.message_metadata,
+            message_type=message_type,
+            wen_posted=entry["wen_posted"],
+            original_data=original_data,
+            characters=[
+                MessageCharacterSchema(
+                    message_id=message_id,
+                    character_name=entry["character"],
+                    created_at=entry["wen_posted"],
+                )
+            ],
+        )
+        self.write_buffer.add(entry, schema)
+        return schema
+
+    def flush_messages(self):
+        """Write all messages waiting in the write buffer."""
+        self.write_buffer.flush()
+
+    def close(self) -> List[Dict]:
+        """Flush pending writes and stop background workers. Call on shutdown.
+        Returns the buffered message entries that could not be written (see
+        SiaMessageWriteBuffer.close)."""
+        self.opinion_worker.close()
+        unwritten = self.write_buffer.close()
+        if self.vector_memory is not None:
+            self.embedding_queue.close()
+            self.vector_memory.close()
+        if self.replica_engine is not None:
+            self.replica_engine.dispose()
+        return unwritten
+
+    def get_responded_to_ids(self, message_ids: List[str], author: str) -> set:
+        """Ids among `message_ids` that `author` has already responded to."""
+        responded = set()
+        self._read_your_writes()
+        with self.read_session_scope() as session:
+            for i in range(0, len(message_ids), 500):
+                responded.update(
+                    row[0]
+                    for row in session.query(SiaMessageModel.response_to)
+                    .filter(
+                        SiaMessageModel.response_to.in_(message_ids[i:i + 500]),
+                        SiaMessageModel.author == author,
+                    )
+                    .distinct()
+                )
+        return responded
+
+    def get_conversation_ids(self):
+        self._read_your_writes()
+        with self.read_session_scope() as session:
+            conversation_ids = (
+                session.query(SiaMessageModel.conversation_id)
+                .filter(SiaMessageModel.id != SiaMessageModel.conversation_id)
+                .distinct()
+                .all()
+            )
         return [conversation_id[0] for conversation_id in conversation_ids]
 
-    def clear_messages(self):
-        session = self.Session()
-        try:
-            # Find all message IDs associated with this character
-            message_ids = (
-                session.query(SiaMessageModel.id)
+    def get_conversation_summary(self, conversation_id: str, character: str = None) -> Optional[SiaConversationSchema]:
+        """Get the conversation index row: root message, message counts, last
+        activity and the latest message ids. A single-row read.
+
+        Conversations stored before the index existed are indexed on first
+        access.
+        """
+        character_name = character or self.character.name
+        conversation_id = str(conversation_id)
+
+        self._read_your_writes()
+        with self.read_session_scope() as session:
+            conversation = session.get(SiaConversationModel, (character_name, conversation_id))
+            if conversation:
+                return SiaConversationSchema.from_orm(conversation)
+            from_replica = session.get_bind() is self.replica_engine
+
+        if from_replica:
+            # the replica may lag behind: only a miss on the primary is rebuilt
+            with self.session_scope() as session:
+                conversation = session.get(SiaConversationModel, (character_name, conversation_id))
+                if conversation:
+                    return SiaConversationSchema.from_orm(conversation)
+
+        if self.rebuild_conversations(character=character_name, conversation_ids=[conversation_id]):
+            return self.get_conversation_summary(conversation_id, character_name)
+        return None
+
+    def get_conversation_messages(
+        self,
+        conversation_id: str,
+        limit: int = CONVERSATION_RECENT_MESSAGES,
+        include_root: bool = True,
+        character: str = None,
+    ) -> List[SiaMessageSchema]:
+        """The latest `limit` (at most CONVERSATION_RECENT_MESSAGES) unflagged
+        messages of a conversation in chronological order, preceded by its
+        root message if that is not among them."""
+        conversation = self.get_conversation_summary(conversation_id, character)
+        if not conversation:
+            return []
+
+        ids = conversation.recent_message_ids[-limit:] if limit else conversation.recent_message_ids
+        if include_root and conversation.root_message_id and conversation.root_message_id not in ids:
+            ids = [conversation.root_message_id] + ids
+        return [message for message in self.get_messages_by_ids(ids) if not message.flagged]
+
+    def rebuild_conversations(self, character: str = None, conversation_ids: List[str] = None) -> int:
+        """Recompute conversation index rows from the stored messages, for the
+        given conversations or all conversations of the character. Returns
+        the number of conversations indexed."""
+        character_name = character or self.character.name
+
+        self._read_your_writes()
+        with self.session_scope() as session:
+            if conversation_ids is None:
+                conversation_ids = [
+                    row[0]
+                    for row in session.query(SiaMessageModel.conversation_id)
+                    .join(MessageCharacterModel)
+                    .filter(
+                        MessageCharacterModel.character_name == character_name,
+                        SiaMessageModel.conversation_id.isnot(None),
+                    )
+                    .distinct()
+                ]
+
+            rebuilt = 0
+            for i in range(0, len(conversation_ids), 500):
+                chunk = [str(id) for id in conversation_ids[i:i + 500]]
+                session.query(SiaConversationModel).filter(
+                    SiaConversationModel.character_name == character_name,
+                    SiaConversationModel.conversation_id.in_(chunk),
+                ).delete(synchronize_session=False)
+                for conversation in self._build_conversations(session, character_name, chunk):
+                    session.add(SiaConversationModel(**conversation))
+                    rebuilt += 1
+        return rebuilt
+
+    def _own_username(self, platform: str) -> Optional[str]:
+        if platform == "twitter":
+            return self.character.twitter_username
+        return self.character.platform_settings.get(platform, {}).get("username")
+
+    def _add_to_conversation(self, conversation: Dict, messages) -> Dict:
+        """Fold messages (anything with the message columns as attributes)
+        into a conversation index row given as a dict of column values.
+        Flagged messages are not counted."""
+        recent = [tuple(item) for item in conversation["recent_messages"] or []]
+        for message in messages:
+            conversation["platform"] = conversation["platform"] or message.platform
+            if message.id == conversation["conversation_id"]:
+                conversation["root_message_id"] = message.id
+            if message.flagged:
+                continue
+
+            # SQLite returns naive datetimes, all stored times are UTC
+            wen_posted = message.wen_posted
+            if wen_posted.tzinfo is None:
+                wen_posted = wen_posted.replace(tzinfo=timezone.utc)
+            last_activity_at = conversation["last_activity_at"]
+            if last_activity_at and last_activity_at.tzinfo is None:
+                last_activity_at = last_activity_at.replace(tzinfo=timezone.utc)
+
+            conversation["message_count"] += 1
+            if message.author == self._own_username(message.platform):
+                conversation["own_message_count"] += 1
+            if not last_activity_at or wen_posted > last_activity_at:
+                conversation["last_activity_at"] = wen_posted
+            recent.append((wen_posted.astimezone(timezone.utc).isoformat(), message.id))
+
+        conversation["recent_messages"] = [
+            list(item) for item in sorted(recent)[-CONVERSATION_RECENT_MESSAGES:]
+        ]
+        return conversation
+
+    def _build_conversations(self, session, character_name: str, conversation_ids: List[str]) -> List[Dict]:
+        """Conversation index rows computed from all stored messages of the
+        given conversations."""
+        messages = {}
+        for i in range(0, len(conversation_ids), 500):
+            for row in (
+                session.query(
+                    SiaMessageModel.id,
+                    SiaMessageModel.conversation_id,
+                    SiaMessageModel.platform,
+                    SiaMessageModel.author,
+                    SiaMessageModel.flagged,
+                    SiaMessageModel.wen_posted,
+                )
                 .join(MessageCharacterModel)
-                .filter(MessageCharacterModel.character_name == self.character.name)
-                .all()
+                .filter(
+                    MessageCharacterModel.character_name == character_name,
+                    SiaMessageModel.conversation_id.in_(conversation_ids[i:i + 500]),
+                )
+            ):
+                messages.setdefault(row.conversation_id, []).append(row)
+
+        return [
+            self._add_to_conversation(
+                {
+                    "character_name": character_name,
+                    "conversation_id": conversation_id,
+                    "platform": None,
+                    "root_message_id": None,
+                    "message_count": 0,
+                    "own_message_count": 0,
+                    "last_activity_at": None,
+                    "recent_messages": [],
+                },
+                rows,
             )
-            
-            # Delete the messages
-            if message_ids:
-                message_ids = [id[0] for id in message_ids]
-                session.query(SiaMessageModel)\
-                    .filter(SiaMessageModel.id.in_(message_ids))\
-                    .delete(synchronize_session=False)
-                
-            session.commit()
-        except Exception as e:
-            session.rollback()
-            raise e
+            for conversation_id, rows in messages.items()
+        ]
+
+    def _update_conversations_in_session(self, session, character_name: str, messages: List[SiaMessageSchema]):
+        """Update the conversation index for messages newly linked to a
+        character, in the session that stores them."""
+        by_conversation = {}
+        for message in messages:
+            if message.conversation_id:
+                by_conversation.setdefault(message.conversation_id, []).append(message)
+        if not by_conversation:
+            return
+
+        def rows_for_update(conversation_ids):
+            return {
+                conversation.conversation_id: conversation
+                for conversation in session.query(SiaConversationModel)
+                .filter(
+                    SiaConversationModel.character_name == character_name,
+                    SiaConversationModel.conversation_id.in_(conversation_ids),
+                )
+                .with_for_update()
+            }
+
+        existing = rows_for_update(list(by_conversation))
+        missing = [id for id in by_conversation if id not in existing]
+        if missing:
+            # Conversations without a row (new ones, or ones stored before the
+            #   index existed) are built from all their stored messages, which
+            #   include the new ones
+            built = self._build_conversations(session, character_name, missing)
+            dialect = session.get_bind().dialect
+            insert = self._insert(SiaConversationModel, dialect.name)
+            if built and insert is not None and dialect.insert_returning:
+                inserted = session.execute(
+                    insert.on_conflict_do_nothing()
+                    .returning(SiaConversationModel.conversation_id),
+                    built,
+                ).scalars().all()
+            elif built:
+                session.add_all([SiaConversationModel(**conversation) for conversation in built])
+                inserted = [conversation["conversation_id"] for conversation in built]
+            else:
+                inserted = []
+            for conversation_id in inserted:
+                by_conversation.pop(conversation_id)
+            # rows inserted meanwhile by a concurrent writer get the new messages added
+            existing.update(rows_for_update([id for id in missing if id in by_conversation]))
+
+        for conversation_id, new_messages in by_conversation.items():
+            conversation = existing.get(conversation_id)
+            if conversation is None:
+                continue
+            values = self._add_to_conversation(
+                {
+                    column.name: getattr(conversation, column.name)
+                    for column in SiaConversationModel.__table__.columns
+                },
+                new_messages,
+            )
+            for column, value in values.items():
+                setattr(conversation, column, value)
+
+    def clear_messages(self, chunk_size: int = 500, progress: Callable[[str, int], None] = None) -> Dict[str, int]:
+        """Delete the messages and conversations of this character, see
+        `purge_character`. Its social memories are kept."""
+        return self.purge_character(chunk_size=chunk_size, progress=progress, social_memory=False)
+
+    def purge_character(
+        self,
+        character_name: str = None,
+        chunk_size: int = 500,
+        progress: Callable[[str, int], None] = None,
+        social_memory: bool = True,
+    ) -> Dict[str, int]:
+        """Delete everything stored for a character (default: this one).
+
+        Its message links are deleted, and with them the messages and their
+        vectors unless another character is linked to them too. Then its
+        conversations and, with `social_memory`, its social memories with
+        their turns and pending opinion refreshes. Archived messages are not
+        touched.
+
+        Rows are deleted `chunk_size` at a time, one transaction per chunk,
+        so concurrent writers wait for one chunk at most. The ids of each
+        chunk of messages are read first and bound as an IN list, because
+        the links referencing the messages must be deleted before them;
+        `chunk_size` must therefore stay within the database's limit of bound
+        parameters (500 as elsewhere in this file, below SQLite's legacy 999).
+        The other tables are chunked with LIMIT subqueries on the database
+        side. Before the messages, their content is copied into the social
+        memory turns referring to them. `progress(table, deleted)` is
+        called after every chunk with the rows of the table being purged
+        deleted so far. Returns the number of rows deleted per table.
+        """
+        character_name = character_name or self.character.name
+        self._read_your_writes()
+        totals = Counter()
+
+        def purge(table: str, delete_chunk):
+            """Run `delete_chunk` until it deletes no more rows of `table`."""
+            while True:
+                with self.session_scope() as session:
+                    deleted = delete_chunk(session)
+                totals.update(deleted)
+                if not deleted[table]:
+                    break
+                if progress:
+                    progress(table, totals[table])
+            log_message(self.logger, "info", self, f"Purged {totals[table]} {table} rows of {character_name}")
+
+        def delete_messages(session):
+            # the links are deleted first (message_character references
+            #   message), so the chunk's ids are read before
+            message_ids = session.execute(
+                select(MessageCharacterModel.message_id)
+                .where(MessageCharacterModel.character_name == character_name)
+                .order_by(MessageCharacterModel.message_id)
+                .limit(chunk_size)
+            ).scalars().all()
+            if not message_ids:
+                return {"message_character": 0}
+
+            deleted = {
+                "message_character": session.execute(
+                    delete(MessageCharacterModel).where(
+                        MessageCharacterModel.character_name == character_name,
+                        MessageCharacterModel.message_id.in_(message_ids),
+                    )
+                ).rowcount,
+            }
+            # messages still linked to another character are kept
+            unlinked = ~exists().where(MessageCharacterModel.message_id == SiaMessageModel.id)
+            unlinked_ids = select(SiaMessageModel.id).where(SiaMessageModel.id.in_(message_ids), unlinked)
+            self._keep_turn_contents(session, unlinked_ids)
+            deleted["message_vector"] = session.execute(
+                delete(SiaMessageVectorModel).where(SiaMessageVectorModel.message_id.in_(unlinked_ids))
+            ).rowcount
+            deleted["message"] = session.execute(
+                delete(SiaMessageModel).where(SiaMessageModel.id.in_(message_ids), unlinked)
+            ).rowcount
+            self.message_cache.invalidate(message_ids)
+            return deleted
+
+        def delete_conversations(session):
+            chunk = (
+                select(SiaConversationModel.conversation_id)
+                .where(SiaConversationModel.character_name == character_name)
+                .order_by(SiaConversationModel.conversation_id)
+                .limit(chunk_size)
+            )
+            return {
+                "conversation": session.execute(
+                    delete(SiaConversationModel).where(
+                        SiaConversationModel.character_name == character_name,
+                        SiaConversationModel.conversation_id.in_(chunk),
+                    )
+                ).rowcount,
+            }
+
+        def delete_opinion_refreshes(session):
+            chunk = (
+                select(SiaOpinionRefreshModel.platform, SiaOpinionRefreshModel.user_id)
+                .where(SiaOpinionRefreshModel.character_name == character_name)
+                .order_by(SiaOpinionRefreshModel.platform, SiaOpinionRefreshModel.user_id)
+                .limit(chunk_size)
+            )
+            return {
+                "opinion_refresh": session.execute(
+                    delete(SiaOpinionRefreshModel).where(
+                        SiaOpinionRefreshModel.character_name == character_name,
+                        tuple_(SiaOpinionRefreshModel.platform, SiaOpinionRefreshModel.user_id).in_(chunk),
+                    )
+                ).rowcount,
+            }
+
+        def delete_social_memories(session):
+            chunk = (
+                select(SiaSocialMemoryModel.id)
+                .where(SiaSocialMemoryModel.character_name == character_name)
+                .order_by(SiaSocialMemoryModel.id)
+                .limit(chunk_size)
+            )
+            return {
+                "social_memory_turn": session.execute(
+                    delete(SiaSocialMemoryTurnModel).where(
+                        SiaSocialMemoryTurnModel.social_memory_id.in_(chunk)
+                    )
+                ).rowcount,
+                "social_memory": session.execute(
+                    delete(SiaSocialMemoryModel).where(SiaSocialMemoryModel.id.in_(chunk))
+                ).rowcount,
+            }
+
+        try:
+            purge("message_character", delete_messages)
+            purge("conversation", delete_conversations)
+            if social_memory:
+                # refreshes first, or the worker could recreate a social memory
+                purge("opinion_refresh", delete_opinion_refreshes)
+                purge("social_memory", delete_social_memories)
         finally:
-            session.close()
-        
+            self.message_cache.clear()
+            self.social_memory_cache.clear()
+
+        return dict(totals)
+
     def reset_database(self):
         Base.metadata.drop_all(self.engine)
         Base.metadata.create_all(self.engine)
+        self.search_enabled = ensure_search_index(self.engine)
+        if self.vector_memory is not None:
+            self.embedding_queue.clear()
+            self.vector_memory.reset()
+        self.message_cache.clear()
+        self.social_memory_cache.clear()
+        self.settings.invalidate()
 
     @classmethod
     def printable_message(
@@ -258,40 +1539,11 @@ class SiaMemory:
 
         return output_str
 
-    def get_character_settings(self):
-        session = self.Session()
-        try:
-            character_settings = (
-                session.query(SiaCharacterSettingsModel)
-                .filter_by(character_name_id=self.character.name_id)
-                .first()
-            )
-            if not character_settings:
-                character_settings = SiaCharacterSettingsModel(
-                    character_name_id=self.character.name_id, character_settings={}
-                )
-                session.add(character_settings)
-                session.commit()
-
-            # Convert the SQLAlchemy model to a Pydantic schema before closing
-            # the session
-            character_settings_schema = SiaCharacterSettingsSchema.from_orm(
-                character_settings
-            )
-            return character_settings_schema
-
-        finally:
-            session.close()
+    def get_character_settings(self) -> SiaCharacterSettingsSchema:
+        return self.settings.get_character_settings()
 
     def update_character_settings(self, character_settings: SiaCharacterSettingsSchema):
-        session = self.Session()
-        # Convert the Pydantic schema to a dictionary
-        character_settings_dict = character_settings.dict(exclude_unset=True)
-        session.query(SiaCharacterSettingsModel).filter_by(
-            character_name_id=self.character.name_id
-        ).update(character_settings_dict)
-        session.commit()
-        session.close()
+        self.settings.update_character_settings(character_settings.character_settings)
 
     def update_social_memory(
         self,
@@ -301,135 +1553,262 @@ class SiaMemory:
         content: str,
         role: str = "user"
     ) -> SiaSocialMemorySchema:
+        return self.update_social_memory_turns(
+            user_id, platform, [{"message_id": message_id, "content": content, "role": role}]
+        )
+
+    def update_social_memory_turns(self, user_id: str, platform: str, turns: List[Dict]) -> SiaSocialMemorySchema:
+        """Append conversation turns ({"message_id", "content", "role"} dicts,
+        in order) to a user's social memory in one read-modify-write, e.g. a
+        message and the character's reply to it. Same result as calling
+        `update_social_memory` for each turn."""
+        # a new memory is seeded from the stored history, buffered messages included
+        self._read_your_writes()
         with self.session_scope() as session:
-            try:
-                # Don't create social memory for the bot itself
-                if user_id == self.character.platform_settings.get(platform, {}).get("username", self.character.name):
-                    log_message(self.logger, "info", self, f"Skipping social memory creation for bot's own message")
-                    return None
-                
-                log_message(self.logger, "info", self, f"Updating social memory for user {user_id} on {platform}")
+            return self._update_social_memory_in_session(session, user_id, platform, turns)
+
+    def _update_social_memory_in_session(
+        self,
+        session,
+        user_id: str,
+        platform: str,
+        turns: List[Dict],
+    ) -> SiaSocialMemorySchema:
+        """The read-modify-write of `update_social_memory_turns`, run in the
+        given session."""
+        try:
+            # Don't create social memory for the bot itself
+            if user_id == self.character.platform_settings.get(platform, {}).get("username", self.character.name):
+                log_message(self.logger, "info", self, f"Skipping social memory creation for bot's own message")
+                return None
+            
+            log_message(self.logger, "info", self, f"Updating social memory for user {user_id} on {platform}")
+            refresh_requested = False
+            
+            # Locked until commit on Postgres, so concurrent updates of the
+            #   same user don't overwrite each other's turns
+            memory = session.query(SiaSocialMemoryModel).filter_by(
+                character_name=self.character.name,
+                user_id=user_id,
+                platform=platform
+            ).with_for_update().first()
+
+            if not memory:
+                log_message(self.logger, "info", self, f"Creating new social memory for user {user_id}")
                 
-                memory = session.query(SiaSocialMemoryModel).filter_by(
+                memory = SiaSocialMemoryModel(
                     character_name=self.character.name,
                     user_id=user_id,
-                    platform=platform
-                ).first()
+                    platform=platform,
+                    interaction_count=0,
+                    unprocessed_turns=0,
+                    opinion=None,
+                    last_processed_message_id=turns[0]["message_id"]  # Always use current message_id for new entries
+                )
+                session.add(memory)
+                session.flush()
 
-                if not memory:
-                    log_message(self.logger, "info", self, f"Creating new social memory for user {user_id}")
-                    
-                    # Get historical messages for initial opinion
-                    historical_messages = self.get_messages(
-                        author=user_id,
-                        platform=platform,
-                        sort_by="wen_posted",
-                        sort_order="asc"
-                    )
-                    
-                    # Initialize history with current message if no historical messages
-                    if not historical_messages:
-                        history = [{
-                            "message_id": message_id,
-                            "role": role,
-                            "content": content
-                        }]
-                        last_message_id = message_id  # Set this for new entries
-                    else:
-                        # Get historical messages for initial opinion
-                        historical_messages = self.get_messages(
-                            author=user_id,
-                            platform=platform,
-                            sort_by="wen_posted",
-                            sort_order="asc"
-                        )
-                        log_message(self.logger, "info", self, f"Found {len(historical_messages)} historical messages")
-                        
-                        # Convert messages to conversation history format
-                        history = []
-                        last_message_id = None
-                        for msg in historical_messages:
-                            history.append({
-                                "message_id": msg.id,
-                                "role": "user",
-                                "content": msg.content
-                            })
-                            last_message_id = msg.id
-                            # Add Sia's responses
-                            responses = self.get_messages(
-                                response_to=msg.id,
-                                author=self.character.platform_settings.get(platform, {}).get("username", self.character.name)
-                            )
-                            for resp in responses:
-                                history.append({
-                                    "message_id": resp.id,
-                                    "role": "assistant",
-                                    "content": resp.content
-                                })
-                                last_message_id = resp.id
-                        
-                        log_message(self.logger, "info", self, f"Processed {len(history)} total interactions")
-                        
-                        # Generate initial opinion if we have historical messages
-                        initial_opinion = None
-                        if history:
-                            log_message(self.logger, "info", self, "Generating initial opinion based on historical messages")
-                            initial_opinion = self._generate_opinion(history)
-                            log_message(self.logger, "info", self, f"Generated initial opinion: {initial_opinion}")
-                    
-                    memory = SiaSocialMemoryModel(
-                        character_name=self.character.name,
-                        user_id=user_id,
-                        platform=platform,
-                        conversation_history=history[-20:],  # Keep last 20 messages
-                        interaction_count=len(history),
-                        opinion=initial_opinion,
-                        last_processed_message_id=message_id  # Always use current message_id for new entries
-                    )
-                    session.add(memory)
-                    log_message(self.logger, "info", self, "Created new social memory entry")
-                
-                # Update conversation history
-                history = memory.conversation_history or []
-                history.append({
-                    "message_id": message_id,
-                    "role": role,
-                    "content": content
-                })
-                memory.conversation_history = history[-20:]  # Keep last 20 messages
-                memory.interaction_count += 1
-                memory.last_interaction = datetime.now(timezone.utc)
-                
-                # Calculate unprocessed messages before using it
-                if memory.last_processed_message_id:
-                    # Get index of last processed message
-                    last_processed_idx = next(
-                        (i for i, msg in enumerate(history) if msg["message_id"] == memory.last_processed_message_id),
-                        -1
-                    )
-                    unprocessed_messages = history[last_processed_idx + 1:] if last_processed_idx >= 0 else history
-                else:
-                    unprocessed_messages = history
-                
-                # Now we can safely use unprocessed_messages
-                if len(unprocessed_messages) >= 10 or memory.last_processed_message_id is None:
-                    memory.last_processed_message_id = message_id
-                    
-                    # Update opinion if we have enough unprocessed messages
-                    if len(unprocessed_messages) >= 10:
-                        log_message(self.logger, "info", self, "Generating new opinion based on recent interactions")
-                        opinion = self._generate_opinion(history, memory.opinion)
-                        log_message(self.logger, "info", self, f"Updated opinion: {opinion}")
-                        memory.opinion = opinion
-
-                session.commit()
-                return SiaSocialMemorySchema.from_orm(memory)
-                
-            except Exception as e:
-                log_message(self.logger, "error", self, f"Error updating social memory: {e}")
-                raise e
+                # Seed the history with the stored messages
+                history = self._social_history(session, user_id, platform)
+                if history:
+                    log_message(self.logger, "info", self, f"Processed {len(history)} total interactions")
+                    self._append_social_memory_turns(session, memory, history, stored=True)
+
+                    # Initial opinion from the historical messages
+                    refresh_requested = self._request_opinion_refresh(session, user_id, platform)
+                log_message(self.logger, "info", self, "Created new social memory entry")
+
+            # Turns already in the history (e.g. seeded above) are not repeated
+            known_ids = self._social_memory_turn_ids(
+                session, memory.id, [turn["message_id"] for turn in turns if turn["message_id"]]
+            )
+            turns = [turn for turn in turns if not turn["message_id"] or turn["message_id"] not in known_ids]
+
+            for turn in turns:
+                memory.unprocessed_turns = (memory.unprocessed_turns or 0) + 1
+                # Update opinion if we have enough unprocessed messages
+                if memory.unprocessed_turns >= 10:
+                    log_message(self.logger, "info", self, "Requesting new opinion based on recent interactions")
+                    refresh_requested = self._request_opinion_refresh(session, user_id, platform)
+                    memory.last_processed_message_id = turn["message_id"]
+                    memory.unprocessed_turns = 0
+
+            self._append_social_memory_turns(session, memory, turns)
+            memory.last_interaction = datetime.now(timezone.utc)
+
+            session.commit()
+            if refresh_requested:
+                self.opinion_worker.notify()
+            stored = self._social_memory_schema(session, memory)
+            self.social_memory_cache.put((platform, user_id), stored)
+            return stored
+            
+        except Exception as e:
+            log_message(self.logger, "error", self, f"Error updating social memory: {e}")
+            raise e
+
+    def _append_social_memory_turns(self, session, memory, turns: List[Dict], stored: bool = False):
+        """Append turns ({"message_id", "role", "content"} dicts) to the
+        history of a social memory. The content is only copied for turns
+        whose message is not in the message table; with `stored` all of them
+        are known to be."""
+        if not turns:
+            return
+        message_ids = [turn["message_id"] for turn in turns if turn.get("message_id")]
+        stored_ids = set(message_ids) if stored else set()
+        if not stored:
+            for i in range(0, len(message_ids), 500):
+                stored_ids.update(
+                    session.execute(
+                        select(SiaMessageModel.id).where(SiaMessageModel.id.in_(message_ids[i:i + 500]))
+                    ).scalars()
+                )
+
+        seq = memory.interaction_count or 0
+        rows = []
+        for turn in turns:
+            seq += 1
+            rows.append({
+                "social_memory_id": memory.id,
+                "seq": seq,
+                "message_id": turn.get("message_id"),
+                "role": turn.get("role", "user"),
+                "content": None if turn.get("message_id") in stored_ids else turn["content"],
+            })
+        session.execute(SiaSocialMemoryTurnModel.__table__.insert(), rows)
+        memory.interaction_count = seq
+
+    @staticmethod
+    def _keep_turn_contents(session, message_ids):
+        """Copy the content of messages about to be deleted into the social
+        memory turns that refer to them, which otherwise read it from the
+        message table. `message_ids` is a list or a subquery."""
+        turn = SiaSocialMemoryTurnModel
+        session.execute(
+            update(turn)
+            .where(turn.message_id.in_(message_ids), turn.content.is_(None))
+            .values(
+                content=select(SiaMessageModel.content)
+                .where(SiaMessageModel.id == turn.message_id)
+                .scalar_subquery()
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def _social_memory_turn_ids(session, social_memory_id: str, message_ids: List[str]) -> set:
+        """Which of `message_ids` are already turns of a social memory."""
+        if not message_ids:
+            return set()
+        return set(
+            session.execute(
+                select(SiaSocialMemoryTurnModel.message_id).where(
+                    SiaSocialMemoryTurnModel.social_memory_id == social_memory_id,
+                    SiaSocialMemoryTurnModel.message_id.in_(message_ids),
+                )
+            ).scalars()
+        )
+
+    def _social_memory_turns(self, session, social_memory_id: str, limit: Optional[int] = SOCIAL_MEMORY_HISTORY_TURNS) -> List[Dict]:
+        """The latest `limit` turns of a social memory (all with None), oldest
+        first, as {"message_id", "role", "content"} dicts. Content comes from
+        the message table, else from the archive or the turn itself (copied
+        there when the message is deleted, see _keep_turn_contents); turns
+        without either are skipped."""
+        query = (
+            select(
+                SiaSocialMemoryTurnModel.message_id,
+                SiaSocialMemoryTurnModel.role,
+                func.coalesce(SiaMessageModel.content, SiaSocialMemoryTurnModel.content),
+            )
+            .outerjoin(SiaMessageModel, SiaMessageModel.id == SiaSocialMemoryTurnModel.message_id)
+            .where(SiaSocialMemoryTurnModel.social_memory_id == social_memory_id)
+            .order_by(SiaSocialMemoryTurnModel.seq.desc())
+        )
+        if limit:
+            query = query.limit(limit)
+        rows = list(session.execute(query))[::-1]
+
+        missing = [message_id for message_id, _, content in rows if content is None and message_id]
+        archived = {message.id: message.content for message in self.archive.get_messages_by_ids(missing)} if missing else {}
+        return [
+            {"message_id": message_id, "role": role, "content": content if content is not None else archived[message_id]}
+            for message_id, role, content in rows
+            if content is not None or message_id in archived
+        ]
+
+    def _social_memory_schema(self, session, memory) -> SiaSocialMemorySchema:
+        """A social memory with its latest turns as `conversation_history`."""
+        schema = SiaSocialMemorySchema.from_orm(memory)
+        schema.conversation_history = self._social_memory_turns(session, memory.id)
+        return schema
+
+    def _request_opinion_refresh(self, session, user_id: str, platform: str) -> bool:
+        """Queue a refresh of the user's opinion for the opinion worker. A
+        refresh already pending for the user absorbs the request."""
+        now = datetime.now(timezone.utc)
+        values = {
+            "character_name": self.character.name,
+            "platform": platform,
+            "user_id": user_id,
+            "requested_at": now,
+            "attempts": 0,
+        }
+        insert = self._insert(SiaOpinionRefreshModel, session.get_bind().dialect.name)
+        if insert is not None:
+            session.execute(
+                insert.values(**values).on_conflict_do_update(
+                    index_elements=["character_name", "platform", "user_id"],
+                    set_={"requested_at": now},
+                )
+            )
+        else:
+            refresh = session.get(SiaOpinionRefreshModel, (self.character.name, platform, user_id))
+            if refresh is not None:
+                refresh.requested_at = now
+            else:
+                session.add(SiaOpinionRefreshModel(**values))
+        return True
+
+    def _social_history(self, session, user_id: str, platform: str) -> List[Dict]:
+        """A user's stored messages on a platform, oldest first, each followed
+        by the character's replies to it, in the `conversation_history` format
+        of social memory. One query, whatever the length of the history."""
+        own_username = self.character.platform_settings.get(platform, {}).get("username", self.character.name)
+        reply = aliased(SiaMessageModel)
+        rows = session.execute(
+            select(SiaMessageModel.id, SiaMessageModel.content, reply.id, reply.content)
+            .outerjoin(
+                reply,
+                and_(
+                    reply.response_to == SiaMessageModel.id,
+                    reply.author == own_username,
+                    reply.flagged == False,
+                ),
+            )
+            .where(
+                SiaMessageModel.author == user_id,
+                SiaMessageModel.platform == platform,
+                SiaMessageModel.flagged == False,
+            )
+            .order_by(SiaMessageModel.wen_posted, SiaMessageModel.id, reply.wen_posted, reply.id)
+        )
+
+        history = []
+        last_message_id = None
+        for message_id, content, reply_id, reply_content in rows:
+            # a message with several replies comes once per reply
+            if message_id != last_message_id:
+                history.append({"message_id": message_id, "role": "user", "content": content})
+                last_message_id = message_id
+            if reply_id is not None:
+                history.append({"message_id": reply_id, "role": "assistant", "content": reply_content})
+        return history
 
     def _generate_opinion(self, conversation_history: List[Dict], previous_opinion: Optional[str] = None) -> str:
+        """Ask the LLM for an opinion of a user. Errors are raised: the
+        callers (opinion worker, opinion rebuild) keep the stored opinion and
+        retry or report the user as failed."""
         try:
             log_message(self.logger, "info", self, "Starting opinion generation")
             log_message(self.logger, "info", self, f"Previous opinion: {previous_opinion}")
@@ -479,12 +1858,16 @@ class SiaMemory:
             
         except Exception as e:
             log_message(self.logger, "error", self, f"Error generating opinion: {e}")
-            return previous_opinion or "Unable to form opinion"
+            raise
 
     def get_social_memory(self, user_id: str, platform: str) -> Optional[SiaSocialMemorySchema]:
         """Get social memory for a specific user on a specific platform"""
+        cached = self.social_memory_cache.get((platform, user_id))
+        if cached:
+            return cached
+
         try:
-            with self.session_scope() as session:
+            with self.read_session_scope() as session:
                 memory = session.query(SiaSocialMemoryModel).filter_by(
                     character_name=self.character.name,
                     user_id=user_id,
@@ -493,7 +1876,9 @@ class SiaMemory:
                 
                 if memory:
                     log_message(self.logger, "info", self, f"Found social memory for user {user_id} on {platform}")
-                    return SiaSocialMemorySchema.from_orm(memory)
+                    stored = self._social_memory_schema(session, memory)
+                    self.social_memory_cache.put((platform, user_id), stored)
+                    return stored
                 else:
                     log_message(self.logger, "info", self, f"No social memory found for user {user_id} on {platform}")
                     return None
@@ -1,13 +1,18 @@
 from datetime import datetime, timezone
 from uuid import uuid4
 
-from sqlalchemy import JSON, Boolean, Column, DateTime, String, ForeignKey, Integer
+from sqlalchemy import JSON, Boolean, Column, DateTime, String, ForeignKey, Index, Integer, func, literal_column, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy.orm import backref, deferred, relationship
+
+from .types import CompressedJSON
 
 
 Base = declarative_base()
 
+# Text search configuration of the full-text index on message content
+MESSAGE_SEARCH_CONFIG = "english"
+
 
 class SiaMessageModel(Base):
     __tablename__ = "message"
@@ -20,17 +25,46 @@ class SiaMessageModel(Base):
     response_to = Column(String)
     message_type = Column(String, nullable=True)
     wen_posted = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    original_data = Column(JSON)
+    # Raw platform payloads, not needed to build prompts: compressed, and
+    #   only loaded on request (see SiaMemory.get_messages(load_payloads=True))
+    original_data = deferred(Column(CompressedJSON))
     flagged = Column(Boolean, nullable=True, default=False)
-    message_metadata = Column(JSON)
+    message_metadata = deferred(Column(JSON))
     
-    # Change relationship to load eagerly
+    # Loaded on request only (see SiaMemory.get_messages(load_characters=...)):
+    #   a joined load repeats every message row once per linked character
     characters = relationship(
         "MessageCharacterModel",
         cascade="all, delete-orphan",
-        lazy='joined'  # This makes it load eagerly by default
+        lazy="select"
     )
 
+    # Indexes matching the get_messages filter combinations
+    __table_args__ = (
+        Index("idx_message_author", "author"),
+        Index("idx_message_response_to", "response_to"),
+        Index("idx_message_conversation_wen_posted", "conversation_id", "wen_posted", "id"),
+        Index("idx_message_platform_author_wen_posted", "platform", "author", "wen_posted"),
+        Index(
+            "idx_message_platform_author_type_wen_posted",
+            "platform", "author", "message_type", "wen_posted",
+        ),
+        Index("idx_message_wen_posted_id", "wen_posted", "id"),
+        # Full-text search; SQLite uses an FTS5 table instead (search.py)
+        Index(
+            "idx_message_content_fts",
+            text(f"to_tsvector('{MESSAGE_SEARCH_CONFIG}'::regconfig, content)"),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+# Expression of the Postgres full-text index on message content (see
+#   search.py). Queries must use this exact expression for the index to apply.
+message_tsvector = func.to_tsvector(
+    literal_column(f"'{MESSAGE_SEARCH_CONFIG}'::regconfig"), SiaMessageModel.content
+)
+
 
 class SiaCharacterSettingsModel(Base):
     __tablename__ = "character_settings"
@@ -38,15 +72,77 @@ class SiaCharacterSettingsModel(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
     character_name_id = Column(String)
     character_settings = Column(JSON)
+    # bumped on every write, see SiaSettingsCache
+    version = Column(Integer, nullable=False, default=1)
 
 
 class MessageCharacterModel(Base):
     __tablename__ = "message_character"
 
+    # a message can be linked to several characters sharing the database
     message_id = Column(String, ForeignKey('message.id'), primary_key=True)
-    character_name = Column(String, nullable=False)
+    character_name = Column(String, primary_key=True)
     created_at = Column(DateTime, default=lambda: datetime.now(), nullable=False)
 
+    __table_args__ = (
+        Index("idx_message_character_name_message", "character_name", "message_id"),
+    )
+
+
+class SiaConversationModel(Base):
+    """Per-character summary of a conversation, maintained incrementally as
+    messages are added (see SiaMemory._update_conversations_in_session)."""
+    __tablename__ = "conversation"
+
+    character_name = Column(String, primary_key=True)
+    conversation_id = Column(String, primary_key=True)
+    platform = Column(String)
+    root_message_id = Column(String)  # set once the first message is stored
+    message_count = Column(Integer, nullable=False, default=0)
+    own_message_count = Column(Integer, nullable=False, default=0)  # messages posted by the character
+    last_activity_at = Column(DateTime(timezone=True))
+    recent_messages = Column(JSON, default=list)  # [[wen_posted iso, message_id], ...] oldest first, bounded
+
+
+class SiaMessageVectorModel(Base):
+    """Maps messages to their row in the vector matrix file (see
+    vector_memory.py), with the columns search can be filtered by."""
+    __tablename__ = "message_vector"
+
+    message_id = Column(String, primary_key=True)
+    row_index = Column(Integer, nullable=False, unique=True)
+    platform = Column(String)
+    author = Column(String)
+
+    __table_args__ = (
+        Index("idx_message_vector_author_row", "author", "row_index"),
+        Index("idx_message_vector_platform_row", "platform", "row_index"),
+    )
+
+
+class SiaArchiveSegmentModel(Base):
+    """A compressed JSONL file of archived messages (see archive.py)."""
+    __tablename__ = "message_archive_segment"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid4()))
+    file_name = Column(String, nullable=False)  # relative to the archive directory
+    message_count = Column(Integer, nullable=False)
+    first_wen_posted = Column(DateTime(timezone=True), nullable=False)
+    last_wen_posted = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("idx_message_archive_segment_wen_posted", "first_wen_posted", "last_wen_posted"),
+    )
+
+
+class SiaArchivedMessageModel(Base):
+    """Segment holding each archived message, for lookups by id."""
+    __tablename__ = "archived_message"
+
+    message_id = Column(String, primary_key=True)
+    segment_id = Column(String, ForeignKey("message_archive_segment.id"), nullable=False)
+
 
 class SiaSocialMemoryModel(Base):
     __tablename__ = "social_memory"
@@ -56,7 +152,39 @@ class SiaSocialMemoryModel(Base):
     platform = Column(String, nullable=False)
     user_id = Column(String, nullable=False)  # Platform username
     last_interaction = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    interaction_count = Column(Integer, default=0)
+    interaction_count = Column(Integer, default=0)  # also the seq of the latest turn
     opinion = Column(String)
-    conversation_history = Column(JSON)  # List of {message_id, role, content} objects
-    last_processed_message_id = Column(String)  # Track last message that was included in opinion
\ No newline at end of file
+    opinion_seq = Column(Integer, nullable=True)  # interaction_count the opinion was generated at
+    last_processed_message_id = Column(String)  # Track last message that was included in opinion
+    unprocessed_turns = Column(Integer, nullable=False, default=0)  # turns since the last opinion refresh
+
+
+class SiaSocialMemoryTurnModel(Base):
+    """A turn of the conversation history of a social memory."""
+    __tablename__ = "social_memory_turn"
+
+    social_memory_id = Column(String, ForeignKey("social_memory.id"), primary_key=True)
+    seq = Column(Integer, primary_key=True)  # 1-based, in conversation order
+    message_id = Column(String, nullable=True)  # message.id, when there is one
+    role = Column(String, nullable=False)  # "user" or "assistant"
+    # Only kept for turns whose message is not stored in the message table
+    #   (copied in when the message is deleted)
+    content = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("idx_social_memory_turn_message", "social_memory_id", "message_id"),
+        Index("idx_social_memory_turn_message_id", "message_id"),
+    )
+
+class SiaOpinionRefreshModel(Base):
+    """A pending opinion refresh of a social memory (see opinion_worker.py).
+    One row per user: repeated requests only move `requested_at`."""
+    __tablename__ = "opinion_refresh"
+
+    character_name = Column(String, primary_key=True)
+    platform = Column(String, primary_key=True)
+    user_id = Column(String, primary_key=True)
+    requested_at = Column(DateTime(timezone=True), nullable=False)
+    # set while a worker is refreshing the opinion; stale claims are retried
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,232 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import bindparam, func, select, update
+
+from utils.logging_utils import log_message, setup_logging
+
+from .models_db import SiaMessageModel, SiaSocialMemoryModel, SiaSocialMemoryTurnModel
+
+
+class SiaOpinionRebuild:
+    """Offline regeneration of the opinions of all social memories of a
+    character, e.g. after its prompts changed.
+
+    Social memories are streamed in keyset-paginated batches of `batch_size`.
+    The histories of a batch (the latest `history_turns` turns of each, all
+    with None) are read with one windowed query, the opinions generated by
+    `generate_opinion(history, previous_opinion)` on at most `concurrency`
+    threads, and the results written in one transaction per batch. Users
+    whose generation raises keep their opinion and are counted as failed, so
+    that the next run retries them.
+
+    Users whose history did not change since their opinion was generated are
+    skipped unless `force` is set. With `checkpoint_path`, progress is saved
+    after every batch and an interrupted rebuild resumes where it stopped;
+    the file is removed once the rebuild completes.
+    """
+
+    def __init__(
+        self,
+        memory,
+        generate_opinion: Callable[[List[Dict], Optional[str]], str] = None,
+        concurrency: int = 4,
+        batch_size: int = 100,
+        history_turns: Optional[int] = 100,
+        checkpoint_path: str = None,
+        force: bool = False,
+        keep_previous: bool = False,
+    ):
+        self.memory = memory
+        self.generate_opinion = generate_opinion or memory._generate_opinion
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.history_turns = history_turns
+        self.checkpoint_path = checkpoint_path
+        self.force = force
+        # pass the current opinion to the LLM; off by default, as the point of
+        #   a rebuild is usually to start over
+        self.keep_previous = keep_previous
+
+        self.logger = setup_logging()
+
+    def run(self) -> Dict:
+        """Rebuild the opinions. Returns the statistics of the rebuild:
+        users seen, rebuilt, skipped, failed, elapsed seconds and users per
+        minute (of this run only, when resumed)."""
+        checkpoint = self._load_checkpoint()
+        last_id = checkpoint.get("last_id", "")
+        stats = {"users": 0, "rebuilt": 0, "skipped": 0, "failed": 0}
+        for key in stats:
+            stats[key] += checkpoint.get("stats", {}).get(key, 0)
+        started = time.monotonic()
+        run_users = 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="opinion_rebuild") as executor:
+            while True:
+                batch = self._next_batch(last_id)
+                if not batch:
+                    break
+
+                due = [memory for memory in batch if self.force or self._is_stale(memory)]
+                histories = self._histories([memory["id"] for memory in due])
+                opinions = list(executor.map(
+                    lambda memory: self._generate(memory, histories.get(memory["id"], [])), due
+                ))
+                results = [
+                    {"memory_id": memory["id"], "opinion": opinion, "opinion_seq": memory["interaction_count"]}
+                    for memory, opinion in zip(due, opinions)
+                    if opinion is not None
+                ]
+                self._store(results, due)
+
+                last_id = batch[-1]["id"]
+                run_users += len(batch)
+                stats["users"] += len(batch)
+                stats["rebuilt"] += len(results)
+                stats["skipped"] += len(batch) - len(due)
+                stats["failed"] += len(due) - len(results)
+                self._save_checkpoint({"last_id": last_id, "stats": stats})
+
+                elapsed = time.monotonic() - started
+                log_message(
+                    self.logger, "info", self,
+                    f"Opinion rebuild: {stats['users']} users, {stats['rebuilt']} rebuilt, "
+                    f"{stats['skipped']} skipped, {stats['failed']} failed, "
+                    f"{run_users / elapsed * 60 if elapsed else 0:.1f} users/min"
+                )
+
+        self._remove_checkpoint()
+        elapsed = time.monotonic() - started
+        stats["elapsed"] = elapsed
+        stats["users_per_minute"] = run_users / elapsed * 60 if elapsed else 0.0
+        return stats
+
+    @staticmethod
+    def _is_stale(memory: Dict) -> bool:
+        """Whether turns were added since the opinion was generated."""
+        return memory["opinion"] is None or memory["opinion_seq"] != memory["interaction_count"]
+
+    def _next_batch(self, last_id: str) -> List[Dict]:
+        with self.memory.session_scope() as session:
+            rows = session.execute(
+                select(
+                    SiaSocialMemoryModel.id,
+                    SiaSocialMemoryModel.user_id,
+                    SiaSocialMemoryModel.platform,
+                    SiaSocialMemoryModel.opinion,
+                    SiaSocialMemoryModel.opinion_seq,
+                    SiaSocialMemoryModel.interaction_count,
+                )
+                .where(
+                    SiaSocialMemoryModel.character_name == self.memory.character.name,
+                    SiaSocialMemoryModel.id > last_id,
+                )
+                .order_by(SiaSocialMemoryModel.id)
+                .limit(self.batch_size)
+            )
+            return [dict(row._mapping) for row in rows]
+
+    def _histories(self, memory_ids: List[str]) -> Dict[str, List[Dict]]:
+        """The latest `history_turns` turns of each social memory, oldest
+        first, in one query (see SiaMemory._social_memory_turns)."""
+        if not memory_ids:
+            return {}
+        turn = SiaSocialMemoryTurnModel
+        ranked = (
+            select(
+                turn.social_memory_id,
+                turn.seq,
+                turn.message_id,
+                turn.role,
+                turn.content,
+                func.row_number()
+                .over(partition_by=turn.social_memory_id, order_by=turn.seq.desc())
+                .label("rank"),
+            )
+            .where(turn.social_memory_id.in_(memory_ids))
+            .subquery()
+        )
+        query = (
+            select(
+                ranked.c.social_memory_id,
+                ranked.c.message_id,
+                ranked.c.role,
+                func.coalesce(SiaMessageModel.content, ranked.c.content),
+            )
+            .outerjoin(SiaMessageModel, SiaMessageModel.id == ranked.c.message_id)
+            .order_by(ranked.c.social_memory_id, ranked.c.seq)
+        )
+        if self.history_turns:
+            query = query.where(ranked.c.rank <= self.history_turns)
+
+        with self.memory.session_scope() as session:
+            rows = session.execute(query).all()
+
+        missing = [message_id for _, message_id, _, content in rows if content is None and message_id]
+        archived = (
+            {message.id: message.content for message in self.memory.archive.get_messages_by_ids(missing)}
+            if missing
+            else {}
+        )
+        histories = {}
+        for memory_id, message_id, role, content in rows:
+            content = content if content is not None else archived.get(message_id)
+            if content is not None:
+                histories.setdefault(memory_id, []).append(
+                    {"message_id": message_id, "role": role, "content": content}
+                )
+        return histories
+
+    def _generate(self, memory: Dict, history: List[Dict]) -> Optional[str]:
+        if not history:
+            return None
+        try:
+            return self.generate_opinion(history, memory["opinion"] if self.keep_previous else None)
+        except Exception as e:
+            log_message(self.logger, "error", self, f"Error rebuilding opinion of {memory['user_id']}: {e}")
+            return None
+
+    def _store(self, results: List[Dict], memories: List[Dict]):
+        if results:
+            with self.memory.session_scope() as session:
+                session.execute(
+                    update(SiaSocialMemoryModel.__table__)
+                    .where(SiaSocialMemoryModel.__table__.c.id == bindparam("memory_id"))
+                    .values(opinion=bindparam("opinion"), opinion_seq=bindparam("opinion_seq")),
+                    results,
+                )
+        self.memory.social_memory_cache.invalidate(
+            [(memory["platform"], memory["user_id"]) for memory in memories]
+        )
+
+    def _load_checkpoint(self) -> Dict:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("character") != self.memory.character.name:
+            raise ValueError(
+                f"Checkpoint {self.checkpoint_path} belongs to character {checkpoint.get('character')}"
+            )
+        log_message(self.logger, "info", self, f"Resuming opinion rebuild after {checkpoint['last_id']}")
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint: Dict):
+        if not self.checkpoint_path:
+            return
+        checkpoint = {"character": self.memory.character.name, **checkpoint}
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _remove_checkpoint(self):
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
@@ -0,0 +1,197 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import or_
+
+from utils.logging_utils import log_message, setup_logging
+
+from .models_db import SiaOpinionRefreshModel, SiaSocialMemoryModel
+
+
+class SiaOpinionWorker:
+    """Background refresh of social memory opinions.
+
+    `SiaMemory.update_social_memory` only records that a user's opinion is due
+    for a refresh, in the `opinion_refresh` table. This worker claims those
+    rows and generates the opinions (an LLM call each) off the reply path, at
+    most `max_concurrency` at a time. Requests made while a refresh of the same
+    user is running are coalesced into one more refresh. Pending rows survive
+    restarts; claims older than `claim_timeout` seconds are considered
+    abandoned and retried, up to `max_attempts` times. A refresh whose LLM
+    call fails keeps its claim, and so is retried the same way, and the stored
+    opinion is left as it was.
+    """
+
+    def __init__(
+        self,
+        memory,
+        max_concurrency: int = 2,
+        poll_interval: float = 30.0,
+        claim_timeout: float = 600.0,
+        max_attempts: int = 5,
+    ):
+        self.memory = memory
+        self.max_concurrency = max_concurrency
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.max_attempts = max_attempts
+
+        self._executor = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.logger = setup_logging()
+
+    def start(self):
+        """Start the background thread; pending refreshes are picked up right away."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix="opinion_refresh"
+            )
+            self._thread = threading.Thread(target=self._run, name="opinion_worker", daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        """Wake the worker after a refresh was requested."""
+        self._wake.set()
+
+    def close(self):
+        """Stop claiming refreshes and wait for the running ones."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def run_pending(self) -> int:
+        """Refresh all pending opinions in the calling thread, e.g. from a
+        script. Returns the number of refreshes run."""
+        refreshed = 0
+        while True:
+            claimed = self._claim(self.max_concurrency)
+            if not claimed:
+                return refreshed
+            for refresh in claimed:
+                self._refresh(*refresh)
+            refreshed += len(claimed)
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                free = self.max_concurrency - self._in_flight
+            try:
+                claimed = self._claim(free) if free > 0 else []
+            except Exception as e:
+                log_message(self.logger, "error", self, f"Error claiming opinion refreshes: {e}")
+                claimed = []
+
+            for refresh in claimed:
+                with self._lock:
+                    self._in_flight += 1
+                self._executor.submit(self._run_refresh, *refresh)
+
+            # more may be pending: claim again as soon as a slot is free
+            if len(claimed) < free:
+                self._wake.wait(self.poll_interval)
+            else:
+                self._wake.wait()
+            self._wake.clear()
+
+    def _run_refresh(self, *refresh):
+        try:
+            self._refresh(*refresh)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._wake.set()
+
+    def _key(self, platform: str, user_id: str):
+        return (self.memory.character.name, platform, user_id)
+
+    def _claim(self, limit: int):
+        """Claim up to `limit` pending refreshes, oldest request first.
+        Returns (platform, user_id, requested_at) tuples."""
+        now = datetime.now(timezone.utc)
+        with self.memory.session_scope() as session:
+            query = (
+                session.query(SiaOpinionRefreshModel)
+                .filter(
+                    SiaOpinionRefreshModel.character_name == self.memory.character.name,
+                    or_(
+                        SiaOpinionRefreshModel.claimed_at == None,
+                        SiaOpinionRefreshModel.claimed_at < now - timedelta(seconds=self.claim_timeout),
+                    ),
+                )
+                .order_by(SiaOpinionRefreshModel.requested_at)
+                .limit(limit)
+            )
+            if session.get_bind().dialect.name == "postgresql":
+                # several processes may share the queue
+                query = query.with_for_update(skip_locked=True)
+
+            claimed = []
+            for refresh in query:
+                refresh.claimed_at = now
+                refresh.attempts = (refresh.attempts or 0) + 1
+                claimed.append((refresh.platform, refresh.user_id, refresh.requested_at))
+            return claimed
+
+    def _refresh(self, platform: str, user_id: str, requested_at):
+        """Generate and store the opinion of one user, then drop the request
+        unless it was renewed in the meantime."""
+        try:
+            with self.memory.session_scope() as session:
+                memory = session.query(SiaSocialMemoryModel).filter_by(
+                    character_name=self.memory.character.name, user_id=user_id, platform=platform
+                ).first()
+                previous_opinion = memory.opinion if memory else None
+                opinion_seq = memory.interaction_count if memory else None
+                if memory is None:
+                    history = []
+                elif previous_opinion is None:
+                    # first opinion: from the whole history
+                    history = self.memory._social_memory_turns(session, memory.id, limit=None)
+                else:
+                    history = self.memory._social_memory_turns(session, memory.id)
+
+            # no transaction is held during the LLM call
+            opinion = self.memory._generate_opinion(history, previous_opinion) if history else None
+
+            with self.memory.session_scope() as session:
+                if opinion is not None:
+                    session.query(SiaSocialMemoryModel).filter_by(
+                        character_name=self.memory.character.name, user_id=user_id, platform=platform
+                    ).update({"opinion": opinion, "opinion_seq": opinion_seq}, synchronize_session=False)
+                    log_message(self.logger, "info", self, f"Refreshed opinion of {user_id} on {platform}")
+
+                refresh = session.get(SiaOpinionRefreshModel, self._key(platform, user_id))
+                if refresh is not None:
+                    if refresh.requested_at == requested_at:
+                        session.delete(refresh)
+                    else:
+                        # requested again while refreshing: run once more
+                        refresh.claimed_at = None
+                        refresh.attempts = 0
+                        self._wake.set()
+
+            if opinion is not None:
+                self.memory.social_memory_cache.invalidate([(platform, user_id)])
+
+        except Exception as e:
+            log_message(self.logger, "error", self, f"Error refreshing opinion of {user_id} on {platform}: {e}")
+            with self.memory.session_scope() as session:
+                # otherwise retried once the claim times out
+                refresh = session.get(SiaOpinionRefreshModel, self._key(platform, user_id))
+                if refresh is not None and refresh.attempts >= self.max_attempts:
+                    log_message(self.logger, "error", self, f"Giving up opinion refresh of {user_id} on {platform}")
+                    session.delete(refresh)
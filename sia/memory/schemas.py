@@ -1,9 +1,12 @@
 import textwrap
+from collections import namedtuple
 from datetime import datetime, timezone
-from typing import Optional, List, Dict
+from functools import lru_cache
+from typing import Optional, List, Dict, Tuple
 from uuid import uuid4
 
 from pydantic import BaseModel, Field
+from sqlalchemy import inspect
 
 
 class SiaMessageGeneratedSchema(BaseModel):
@@ -26,19 +29,25 @@ class SiaMessageSchema(SiaMessageGeneratedSchema):
     wen_posted: datetime = Field(default_factory=lambda: datetime.now(tz=timezone.utc))
     original_data: Optional[dict] = None
     
-    characters: list['MessageCharacterSchema'] = Field(default_factory=list)
+    # None when the characters relationship was not loaded
+    characters: Optional[list['MessageCharacterSchema']] = Field(default_factory=list)
 
     @classmethod
     def from_orm(cls, obj):
-        # Get all column values
+        # Get all loaded column values; deferred ones that were not loaded
+        #   (original_data, message_metadata) are left at None
+        unloaded = inspect(obj).unloaded
         values = {
             c.name: getattr(obj, c.name)
             for c in obj.__table__.columns
+            if c.name not in unloaded
         }
         
-        # Handle characters relationship explicitly
+        # Handle characters relationship explicitly, without lazy loading it
         try:
-            if hasattr(obj, 'characters'):
+            if 'characters' in unloaded:
+                values['characters'] = None
+            elif hasattr(obj, 'characters'):
                 values['characters'] = [
                     MessageCharacterSchema(
                         message_id=char.message_id,
@@ -73,6 +82,16 @@ class SiaMessageSchema(SiaMessageGeneratedSchema):
         from_attributes = True
 
 
+@lru_cache(maxsize=None)
+def message_row_type(columns: Tuple[str, ...]) -> type:
+    """Compact record type holding only the given message columns.
+
+    Rows are plain namedtuples (no per-instance __dict__), so they are cheap to
+    build and keep around compared to a full SiaMessageSchema.
+    """
+    return namedtuple("SiaMessageRow", columns)
+
+
 class MessageCharacterSchema(BaseModel):
     message_id: str
     character_name: str
@@ -86,12 +105,31 @@ class SiaCharacterSettingsSchema(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid4()))
     character_name_id: str
     character_settings: dict
+    version: Optional[int] = None
 
     class Config:
         # orm_mode = True
         from_attributes = True
 
 
+class SiaConversationSchema(BaseModel):
+    character_name: str
+    conversation_id: str
+    platform: Optional[str] = None
+    root_message_id: Optional[str] = None
+    message_count: int = 0
+    own_message_count: int = 0
+    last_activity_at: Optional[datetime] = None
+    recent_messages: List[Tuple[str, str]] = []  # (wen_posted iso, message_id), oldest first
+
+    @property
+    def recent_message_ids(self) -> List[str]:
+        return [message_id for _, message_id in self.recent_messages]
+
+    class Config:
+        from_attributes = True
+
+
 class SiaSocialMemorySchema(BaseModel):
     id: str
     character_name: str
@@ -100,8 +138,10 @@ class SiaSocialMemorySchema(BaseModel):
     last_interaction: datetime
     interaction_count: int
     opinion: Optional[str] = None
-    conversation_history: List[Dict] = []
+    opinion_seq: Optional[int] = None
+    conversation_history: List[Dict] = []  # latest turns, see SiaMemory._social_memory_turns()
     last_processed_message_id: Optional[str] = None
+    unprocessed_turns: int = 0
 
     class Config:
         from_attributes = True
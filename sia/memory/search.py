@@ -0,0 +1,97 @@
+import re
+from typing import List
+
+from sqlalchemy import and_, column, func, literal_column, or_, table, text
+from sqlalchemy.exc import OperationalError
+
+from .models_db import MESSAGE_SEARCH_CONFIG, SiaMessageModel, message_tsvector
+
+
+message_fts = table("message_fts", column("rowid"))
+
+# SQLite: FTS5 table over message.content ("external content", so the text
+#   is not stored twice), kept in sync with the message table by triggers
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+        content, content='message', content_rowid='rowid', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_fts_ai AFTER INSERT ON message BEGIN
+        INSERT INTO message_fts(rowid, content) VALUES (new.rowid, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_fts_ad AFTER DELETE ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_fts_au AFTER UPDATE OF content ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+        INSERT INTO message_fts(rowid, content) VALUES (new.rowid, new.content);
+    END
+    """,
+]
+
+
+def ensure_search_index(engine) -> bool:
+    """Set up the SQLite FTS5 index if it is missing, indexing the messages
+    already stored. Returns whether full-text search is available.
+
+    On Postgres the GIN index is part of the schema (models_db / alembic).
+    """
+    if engine.dialect.name == "postgresql":
+        return True
+    if engine.dialect.name != "sqlite":
+        return False
+
+    with engine.begin() as connection:
+        triggers = connection.exec_driver_sql(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'message_fts_%'"
+        ).scalar()
+        if triggers == 3:
+            return True
+        try:
+            for statement in SQLITE_SEARCH_DDL:
+                connection.exec_driver_sql(statement)
+        except OperationalError:
+            # SQLite built without FTS5
+            return False
+        # triggers were missing (new index, or message table recreated)
+        connection.exec_driver_sql("INSERT INTO message_fts(message_fts) VALUES ('rebuild')")
+    return True
+
+
+def search_terms(query: str) -> List[str]:
+    """Words of a free-text query, safe to embed in FTS5 / tsquery syntax."""
+    return re.findall(r"\w+", query.lower())
+
+
+def apply_search(query, dialect_name: str, terms: List[str], match_all: bool = True, indexed: bool = True):
+    """Restrict a SiaMessageModel query to messages matching the search terms
+    and order it by relevance, best first."""
+    if indexed and dialect_name == "sqlite":
+        match = (" AND " if match_all else " OR ").join(f'"{term}"' for term in terms)
+        return (
+            query.join(message_fts, message_fts.c.rowid == literal_column("message.rowid"))
+            .filter(text("message_fts MATCH :search_match").bindparams(search_match=match))
+            .order_by(None)
+            .order_by(func.bm25(literal_column("message_fts")), SiaMessageModel.id)
+        )
+
+    if indexed and dialect_name == "postgresql":
+        tsquery = func.to_tsquery(
+            literal_column(f"'{MESSAGE_SEARCH_CONFIG}'::regconfig"),
+            (" & " if match_all else " | ").join(terms),
+        )
+        return (
+            query.filter(message_tsvector.op("@@")(tsquery))
+            .order_by(None)
+            .order_by(func.ts_rank(message_tsvector, tsquery).desc(), SiaMessageModel.id)
+        )
+
+    # No full-text index: unranked substring match, newest first
+    conditions = [SiaMessageModel.content.ilike(f"%{term}%") for term in terms]
+    return query.filter(and_(*conditions) if match_all else or_(*conditions))
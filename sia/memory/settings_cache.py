@@ -0,0 +1,257 @@
+import copy
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import select, update
+
+from sia.modules.knowledge.models_db import KnowledgeModuleSettingsModel
+from sia.modules.knowledge.schemas import KnowledgeModuleSettingsSchema
+from utils.logging_utils import log_message, setup_logging
+
+from .models_db import SiaCharacterSettingsModel
+from .schemas import SiaCharacterSettingsSchema
+
+
+class SiaSettingsConflict(Exception):
+    """Settings kept changing in another process while being updated."""
+
+
+class SiaSettingsCache:
+    """In-memory copy of a character's settings and knowledge module settings.
+
+    All settings of the character are loaded together and reads are served
+    from memory. Writes go through the setters, which update the database and
+    the cached copy. Every row has a `version` bumped on each write: at most
+    every `check_interval` seconds a read compares the cached versions with
+    the stored ones (one small query) and reloads when another process
+    changed something, and writes are compare-and-set on the version, so a
+    stale copy is never written back over a newer one.
+
+    Reads return copies; change settings through the setters only.
+    """
+
+    def __init__(self, session_scope, character_name_id: str, check_interval: float = 30.0, max_retries: int = 5):
+        self.session_scope = session_scope
+        self.character_name_id = character_name_id
+        self.check_interval = check_interval
+        self.max_retries = max_retries
+
+        self._character_settings = None  # SiaCharacterSettingsSchema
+        self._modules = {}  # module_name -> KnowledgeModuleSettingsSchema
+        self._checked_at = None
+        self._lock = threading.RLock()
+
+        self.logger = setup_logging()
+
+    def get_character_settings(self) -> SiaCharacterSettingsSchema:
+        with self._lock:
+            self._ensure_fresh()
+            return self._character_settings.model_copy(deep=True)
+
+    def update_character_settings(self, character_settings: Dict) -> SiaCharacterSettingsSchema:
+        """Replace the character settings."""
+        return self.modify_character_settings(lambda _: character_settings)
+
+    def modify_character_settings(self, change: Callable[[Dict], Optional[Dict]]) -> SiaCharacterSettingsSchema:
+        """Read-modify-write of the character settings: `change` gets a copy
+        of the current settings and returns the new ones (or edits it in
+        place and returns None). Retried on the fresh settings if another
+        process wrote them in the meantime."""
+        with self._lock:
+            for _ in range(self.max_retries):
+                self._ensure_fresh()
+                current = self._character_settings
+                settings = copy.deepcopy(current.character_settings)
+                settings = self._apply(change, settings)
+                if self._compare_and_set(
+                    SiaCharacterSettingsModel, current.id, current.version,
+                    {"character_settings": settings},
+                ):
+                    self._character_settings = current.model_copy(
+                        update={"character_settings": settings, "version": current.version + 1}
+                    )
+                    return self._character_settings.model_copy(deep=True)
+                self._retry()
+            raise SiaSettingsConflict(f"Character settings of {self.character_name_id} kept changing")
+
+    def get_module_settings(self, module_name: str) -> Optional[KnowledgeModuleSettingsSchema]:
+        """Settings of a knowledge module, or None if none are stored."""
+        with self._lock:
+            self._ensure_fresh()
+            settings = self._modules.get(module_name)
+            return settings.model_copy(deep=True) if settings else None
+
+    def get_modules_settings(self) -> Dict[str, Dict]:
+        """The `module_settings` of all stored knowledge modules by module name."""
+        with self._lock:
+            self._ensure_fresh()
+            return {
+                module_name: copy.deepcopy(settings.module_settings)
+                for module_name, settings in self._modules.items()
+            }
+
+    def update_module_settings(self, module_name: str, module_settings: Dict) -> KnowledgeModuleSettingsSchema:
+        """Replace the settings of a knowledge module, creating them if needed."""
+        return self.modify_module_settings(module_name, lambda _: module_settings)
+
+    def modify_module_settings(
+        self, module_name: str, change: Callable[[Dict], Optional[Dict]]
+    ) -> KnowledgeModuleSettingsSchema:
+        """Read-modify-write of a knowledge module's settings, as
+        `modify_character_settings`. `change` gets an empty dict if the
+        module has no settings yet."""
+        with self._lock:
+            for _ in range(self.max_retries):
+                self._ensure_fresh()
+                current = self._modules.get(module_name)
+                settings = copy.deepcopy(current.module_settings) if current else {}
+                settings = self._apply(change, settings)
+
+                if current is None:
+                    stored = self._insert_module(module_name, settings)
+                    if stored:
+                        self._modules[module_name] = stored
+                        return stored.model_copy(deep=True)
+                elif self._compare_and_set(
+                    KnowledgeModuleSettingsModel, current.id, current.version,
+                    {"module_settings": settings},
+                ):
+                    self._modules[module_name] = current.model_copy(
+                        update={"module_settings": settings, "version": current.version + 1}
+                    )
+                    return self._modules[module_name].model_copy(deep=True)
+                self._retry()
+            raise SiaSettingsConflict(f"Settings of module {module_name} kept changing")
+
+    def invalidate(self):
+        """Reload everything on the next read."""
+        with self._lock:
+            self._checked_at = None
+            self._character_settings = None
+
+    def _retry(self):
+        """Back off a little before retrying on freshly loaded settings."""
+        self._checked_at = None
+        time.sleep(random.uniform(0, 0.05))
+
+    @staticmethod
+    def _apply(change, settings: Dict) -> Dict:
+        changed = change(settings)
+        return settings if changed is None else changed
+
+    def _ensure_fresh(self):
+        if self._character_settings is None:
+            self._load()
+        elif self._checked_at is None or time.monotonic() - self._checked_at > self.check_interval:
+            if self._stored_versions() != self._cached_versions():
+                log_message(self.logger, "info", self, "Settings changed in the database, reloading")
+                self._load()
+            self._checked_at = time.monotonic()
+
+    def _cached_versions(self) -> Dict:
+        versions = {(None, self._character_settings.id): self._character_settings.version}
+        versions.update({
+            (module_name, settings.id): settings.version
+            for module_name, settings in self._modules.items()
+        })
+        return versions
+
+    def _stored_versions(self) -> Dict:
+        """Versions of the stored rows, picked as `_load` picks them."""
+        with self.session_scope() as session:
+            versions = {
+                (None, id): version
+                for id, version in session.execute(
+                    select(SiaCharacterSettingsModel.id, SiaCharacterSettingsModel.version)
+                    .where(SiaCharacterSettingsModel.character_name_id == self.character_name_id)
+                    .limit(1)
+                )
+            }
+            modules = {}
+            for module_name, id, version in session.execute(
+                select(
+                    KnowledgeModuleSettingsModel.module_name,
+                    KnowledgeModuleSettingsModel.id,
+                    KnowledgeModuleSettingsModel.version,
+                )
+                .where(KnowledgeModuleSettingsModel.character_name_id == self.character_name_id)
+                .order_by(KnowledgeModuleSettingsModel.created_at)
+            ):
+                modules.setdefault(module_name, (id, version))
+        versions.update({(module_name, id): version for module_name, (id, version) in modules.items()})
+        return versions
+
+    def _load(self):
+        with self.session_scope() as session:
+            character_settings = (
+                session.query(SiaCharacterSettingsModel)
+                .filter_by(character_name_id=self.character_name_id)
+                .first()
+            )
+            if not character_settings:
+                character_settings = SiaCharacterSettingsModel(
+                    character_name_id=self.character_name_id, character_settings={}, version=1
+                )
+                session.add(character_settings)
+                session.flush()
+            self._character_settings = SiaCharacterSettingsSchema.from_orm(character_settings)
+
+            # All modules of the character in one query; the first row of a
+            #   module wins, as it did for the per-module queries
+            modules = {}
+            for settings in (
+                session.query(KnowledgeModuleSettingsModel)
+                .filter(KnowledgeModuleSettingsModel.character_name_id == self.character_name_id)
+                .order_by(KnowledgeModuleSettingsModel.created_at)
+            ):
+                modules.setdefault(settings.module_name, KnowledgeModuleSettingsSchema(
+                    id=settings.id,
+                    character_name_id=settings.character_name_id,
+                    module_name=settings.module_name,
+                    module_settings=settings.module_settings or {},
+                    created_at=settings.created_at,
+                    version=settings.version,
+                ))
+            self._modules = modules
+        self._checked_at = time.monotonic()
+
+    def _compare_and_set(self, model, id: str, version: int, values: Dict) -> bool:
+        """Write `values` to row `id` if it is still at `version`."""
+        with self.session_scope() as session:
+            result = session.execute(
+                update(model)
+                .where(model.id == id, model.version == version)
+                .values(**values, version=version + 1)
+                .execution_options(synchronize_session=False)
+            )
+            return result.rowcount == 1
+
+    def _insert_module(self, module_name: str, module_settings: Dict) -> Optional[KnowledgeModuleSettingsSchema]:
+        """Store the first settings of a module, unless another process did."""
+        with self.session_scope() as session:
+            exists = session.execute(
+                select(KnowledgeModuleSettingsModel.id).where(
+                    KnowledgeModuleSettingsModel.character_name_id == self.character_name_id,
+                    KnowledgeModuleSettingsModel.module_name == module_name,
+                )
+            ).first()
+            if exists:
+                return None
+            settings = KnowledgeModuleSettingsModel(
+                character_name_id=self.character_name_id,
+                module_name=module_name,
+                module_settings=module_settings,
+                version=1,
+            )
+            session.add(settings)
+            session.flush()
+            return KnowledgeModuleSettingsSchema(
+                id=settings.id,
+                character_name_id=settings.character_name_id,
+                module_name=settings.module_name,
+                module_settings=settings.module_settings,
+                created_at=settings.created_at,
+                version=1,
+            )
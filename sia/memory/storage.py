@@ -0,0 +1,88 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+
+STORAGE_PROFILES = ("default", "production")
+
+# Applied on every new SQLite connection with the "production" profile.
+#   WAL lets readers work alongside the single writer, busy_timeout makes
+#   writers from the Telegram and Twitter threads wait for the lock instead
+#   of failing with "database is locked".
+SQLITE_PRODUCTION_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 30000,
+    "mmap_size": 268435456,  # 256 MB
+    "cache_size": -65536,  # 64 MB
+    "temp_store": "MEMORY",
+}
+
+POSTGRES_PRODUCTION_POOL = {
+    "pool_size": 10,
+    "max_overflow": 20,
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,
+}
+
+
+def engine_options(db_path: str, profile: str = "default") -> dict:
+    """create_engine keyword arguments for a storage profile."""
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile: {profile}")
+    if profile == "default":
+        return {}
+
+    backend = make_url(db_path).get_backend_name()
+    if backend == "sqlite":
+        return {"connect_args": {"timeout": SQLITE_PRODUCTION_PRAGMAS["busy_timeout"] / 1000}}
+    if backend == "postgresql":
+        return dict(POSTGRES_PRODUCTION_POOL)
+    return {}
+
+
+def apply_storage_profile(engine, profile: str = "default"):
+    """Register the per-connection settings of a profile on a (sync) engine.
+
+    For an asyncio engine pass its `sync_engine`.
+    """
+    if profile != "production" or engine.dialect.name != "sqlite":
+        return engine
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in SQLITE_PRODUCTION_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+    return engine
+
+
+def create_memory_engine(db_path: str, profile: str = "default"):
+    """Create the memory database engine configured for a storage profile."""
+    engine = create_engine(db_path, **engine_options(db_path, profile))
+    return apply_storage_profile(engine, profile)
+
+
+def track_committed_writes(engine, on_write):
+    """Call `on_write()` whenever a transaction that inserted, updated or
+    deleted rows commits on `engine`, in the committing thread.
+
+    For an asyncio engine pass its `sync_engine`.
+    """
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def note_write(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+            conn.info["wrote"] = True
+
+    @event.listens_for(engine, "commit")
+    def committed(conn):
+        if conn.info.pop("wrote", False):
+            on_write()
+
+    @event.listens_for(engine, "rollback")
+    def rolled_back(conn):
+        conn.info.pop("wrote", None)
+
+    return engine
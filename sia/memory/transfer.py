@@ -0,0 +1,292 @@
+import gzip
+import json
+import os
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import Date, DateTime, Integer, exists, func, inspect, select, text
+
+from sia.modules.knowledge.GoogleNews.models_db import GoogleNewsSearchModel, GoogleNewsSearchResultModel
+from sia.modules.knowledge.models_db import KnowledgeModuleSettingsModel
+from utils.logging_utils import log_message, setup_logging
+
+from .models_db import (
+    MessageCharacterModel,
+    SiaCharacterSettingsModel,
+    SiaConversationModel,
+    SiaMessageModel,
+    SiaSocialMemoryModel,
+    SiaSocialMemoryTurnModel,
+)
+
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+# fast compression: level 9 costs more time than the database reads, for
+#   files only a little smaller
+GZIP_LEVEL = 1
+
+# Exported tables, parents before children so that imports satisfy foreign
+#   keys. Vectors (rebuilt with backfill_vectors), archive segments (files)
+#   and queued opinion refreshes are not part of it.
+TRANSFER_MODELS = (
+    SiaMessageModel,
+    MessageCharacterModel,
+    SiaConversationModel,
+    SiaSocialMemoryModel,
+    SiaSocialMemoryTurnModel,
+    SiaCharacterSettingsModel,
+    KnowledgeModuleSettingsModel,
+    GoogleNewsSearchModel,
+    GoogleNewsSearchResultModel,
+)
+TRANSFER_TABLES = tuple(model.__tablename__ for model in TRANSFER_MODELS)
+
+
+class SiaMemoryTransfer:
+    """Streaming export and import of a memory database, for backups and
+    moves between databases (e.g. SQLite to Postgres).
+
+    An export is a directory holding a manifest and, per table, JSONL files
+    of at most `rows_per_file` rows each (gzip-compressed with `compress`).
+    Rows are streamed from a server-side cursor when writing and from the
+    files when reading, and imported with batched
+    INSERT ... ON CONFLICT DO NOTHING statements of `chunk_size` rows, one
+    transaction per chunk, so memory use does not depend on the table size
+    and an interrupted import can simply be run again.
+
+    Only the columns that exist in both databases are transferred: an export
+    can be imported into a database with a newer schema, new columns get
+    their defaults.
+    """
+
+    def __init__(self, memory, chunk_size: int = 5000, rows_per_file: int = 500000, compress: bool = True):
+        self.memory = memory
+        self.chunk_size = chunk_size
+        self.rows_per_file = rows_per_file
+        self.compress = compress
+
+        self.logger = setup_logging()
+
+    def export_to(
+        self,
+        directory: str,
+        tables: List[str] = None,
+        character_only: bool = False,
+        progress: Callable[[str, int], None] = None,
+    ) -> Dict[str, int]:
+        """Export `tables` (default: all of TRANSFER_TABLES that exist) to
+        `directory`. With `character_only`, only the rows of the memory's
+        character are exported; the news tables are shared and exported in
+        full. `progress(table, rows)` is called after every chunk. Returns
+        the rows exported per table."""
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, MANIFEST)):
+            raise ValueError(f"{directory} already holds an export")
+
+        manifest = {
+            "format": FORMAT_VERSION,
+            "exported_at": datetime.now(timezone.utc).isoformat(),
+            "schema_revision": self._schema_revision(),
+            "character": self.memory.character.name if character_only else None,
+            "tables": {},
+        }
+        for model in self._models(tables):
+            if not self._has_table(model):
+                continue
+            table = model.__table__
+            columns = self._existing_columns(model)
+            query = select(*[table.c[name] for name in columns])
+            if character_only:
+                query = query.where(*self._character_filter(model))
+
+            files, rows = [], 0
+            out = None
+            with self.memory.engine.connect() as connection:
+                result = connection.execution_options(stream_results=True, yield_per=self.chunk_size).execute(query)
+                for chunk in result.partitions():
+                    for row in chunk:
+                        if rows % self.rows_per_file == 0:
+                            if out:
+                                out.close()
+                            files.append(self._file_name(table.name, len(files)))
+                            out = self._open(os.path.join(directory, files[-1]), "wt")
+                        out.write(json.dumps(dict(zip(columns, row)), default=_to_json))
+                        out.write("\n")
+                        rows += 1
+                    if progress:
+                        progress(table.name, rows)
+            if out:
+                out.close()
+
+            manifest["tables"][table.name] = {"columns": columns, "rows": rows, "files": files}
+            log_message(self.logger, "info", self, f"Exported {rows} rows of {table.name}")
+
+        # written last: a directory without manifest is an incomplete export
+        with open(os.path.join(directory, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return {name: table["rows"] for name, table in manifest["tables"].items()}
+
+    def import_from(
+        self,
+        directory: str,
+        tables: List[str] = None,
+        progress: Callable[[str, int], None] = None,
+    ) -> Dict[str, int]:
+        """Import an export from `directory` into the memory's database,
+        skipping rows whose key is already stored. `progress(table, rows)` is
+        called after every chunk. Returns the rows read per table."""
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported export format: {manifest.get('format')}")
+        revision = self._schema_revision()
+        if manifest.get("schema_revision") and revision and manifest["schema_revision"] != revision:
+            log_message(
+                self.logger, "warning", self,
+                f"Export is from schema revision {manifest['schema_revision']}, database is at {revision}",
+            )
+
+        dialect_name = self.memory.engine.dialect.name
+        imported = {}
+        for model in self._models(tables):
+            exported = manifest["tables"].get(model.__tablename__)
+            if exported is None:
+                continue
+            table = model.__table__
+            table.create(self.memory.engine, checkfirst=True)
+            columns = [name for name in exported["columns"] if name in self._existing_columns(model)]
+            convert = _from_json_converters(table, columns)
+
+            insert = self.memory._insert(table, dialect_name)
+            if insert is None:
+                raise ValueError(f"Imports need INSERT ... ON CONFLICT, which {dialect_name} lacks")
+            insert = insert.on_conflict_do_nothing()
+
+            rows = 0
+            for chunk in self._read_chunks(directory, exported["files"]):
+                values = [
+                    {name: convert[name](row.get(name)) for name in columns}
+                    for row in chunk
+                ]
+                with self.memory.engine.begin() as connection:
+                    connection.execute(insert, values)
+                rows += len(values)
+                if progress:
+                    progress(table.name, rows)
+
+            self._reset_sequences(model)
+            imported[table.name] = rows
+            log_message(self.logger, "info", self, f"Imported {rows} rows of {table.name}")
+
+        self.memory.message_cache.clear()
+        self.memory.social_memory_cache.clear()
+        self.memory.settings.invalidate()
+        return imported
+
+    def _models(self, tables: Optional[List[str]]):
+        unknown = set(tables or ()) - set(TRANSFER_TABLES)
+        if unknown:
+            raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+        return [model for model in TRANSFER_MODELS if tables is None or model.__tablename__ in tables]
+
+    def _has_table(self, model) -> bool:
+        return inspect(self.memory.engine).has_table(model.__tablename__)
+
+    def _existing_columns(self, model) -> List[str]:
+        """The model's columns that exist in the database, in model order."""
+        stored = {column["name"] for column in inspect(self.memory.engine).get_columns(model.__tablename__)}
+        return [column.name for column in model.__table__.columns if column.name in stored]
+
+    def _character_filter(self, model) -> list:
+        name = self.memory.character.name
+        name_id = self.memory.character.name_id
+        if model is SiaMessageModel:
+            return [
+                exists().where(
+                    MessageCharacterModel.message_id == SiaMessageModel.id,
+                    MessageCharacterModel.character_name == name,
+                )
+            ]
+        if model is SiaSocialMemoryTurnModel:
+            return [
+                SiaSocialMemoryTurnModel.social_memory_id.in_(
+                    select(SiaSocialMemoryModel.id).where(SiaSocialMemoryModel.character_name == name)
+                )
+            ]
+        if model in (MessageCharacterModel, SiaConversationModel, SiaSocialMemoryModel):
+            return [model.character_name == name]
+        if model in (SiaCharacterSettingsModel, KnowledgeModuleSettingsModel):
+            return [model.character_name_id == name_id]
+        return []
+
+    def _schema_revision(self) -> Optional[str]:
+        """The Alembic revision of the database, if it is managed by Alembic."""
+        if not inspect(self.memory.engine).has_table("alembic_version"):
+            return None
+        with self.memory.engine.connect() as connection:
+            return connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+    def _reset_sequences(self, model):
+        """Move Postgres sequences of integer keys past the imported ids."""
+        if self.memory.engine.dialect.name != "postgresql":
+            return
+        for column in model.__table__.primary_key.columns:
+            if isinstance(column.type, Integer) and column.autoincrement in (True, "auto"):
+                with self.memory.engine.begin() as connection:
+                    max_id = connection.execute(select(func.max(column))).scalar()
+                    if max_id is not None:
+                        connection.execute(
+                            text("SELECT setval(pg_get_serial_sequence(:table, :column), :value)"),
+                            {"table": model.__tablename__, "column": column.name, "value": max_id},
+                        )
+
+    def _file_name(self, table_name: str, part: int) -> str:
+        return f"{table_name}-{part:05d}.jsonl{'.gz' if self.compress else ''}"
+
+    @staticmethod
+    def _open(path: str, mode: str):
+        if path.endswith(".gz"):
+            return gzip.open(path, mode, compresslevel=GZIP_LEVEL, encoding="utf-8")
+        return open(path, mode, encoding="utf-8")
+
+    def _read_chunks(self, directory: str, files: List[str]) -> Iterator[List[Dict]]:
+        chunk = []
+        for file_name in files:
+            with self._open(os.path.join(directory, file_name), "rt") as f:
+                for line in f:
+                    chunk.append(json.loads(line))
+                    if len(chunk) == self.chunk_size:
+                        yield chunk
+                        chunk = []
+        if chunk:
+            yield chunk
+
+
+def _to_json(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    raise TypeError(f"Type {value.__class__.__name__} not serializable")
+
+
+def _from_json_converters(table, columns: List[str]) -> Dict[str, Callable]:
+    """Per column, a function turning a JSON value back into what the column
+    type expects (dates were written as ISO strings). SQLite stores
+    timestamps without their time zone: naive ones of time zone aware
+    columns are UTC (see SiaMessageArchive.write_segment), not the local time
+    a Postgres timestamptz column would take them for."""
+    def to_utc(value: datetime) -> datetime:
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+    def converter(column_type):
+        if isinstance(column_type, DateTime) and column_type.timezone:
+            return lambda value: to_utc(datetime.fromisoformat(value)) if isinstance(value, str) else value
+        if isinstance(column_type, DateTime):
+            return lambda value: datetime.fromisoformat(value) if isinstance(value, str) else value
+        if isinstance(column_type, Date):
+            return lambda value: date.fromisoformat(value) if isinstance(value, str) else value
+        return lambda value: value
+
+    return {name: converter(table.c[name].type) for name in columns}
@@ -0,0 +1,89 @@
+import json
+import zlib
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+# Optional faster codecs, used when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# One byte header telling how a value was encoded
+RAW = b"j"  # uncompressed JSON, for small values
+ZLIB = b"z"
+ZSTD = b"s"
+
+
+def dumps_json(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def loads_json(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_json(value, min_size: int = 256, level: int = 6) -> bytes:
+    """JSON-encode and compress a value (zstd if available, else zlib).
+    Values shorter than `min_size` bytes are stored uncompressed."""
+    data = dumps_json(value)
+    if len(data) < min_size:
+        return RAW + data
+    if zstandard is not None:
+        return ZSTD + zstandard.ZstdCompressor(level=level).compress(data)
+    return ZLIB + zlib.compress(data, level)
+
+
+def decode_json(data):
+    """Inverse of `encode_json`. Also accepts plain JSON text, as stored by
+    the JSON column type before compression was enabled."""
+    if isinstance(data, str):
+        return json.loads(data)
+    data = bytes(data)
+    header, body = data[:1], data[1:]
+    if header == RAW:
+        return loads_json(body)
+    if header == ZLIB:
+        return loads_json(zlib.decompress(body))
+    if header == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read this value")
+        return loads_json(zstandard.ZstdDecompressor().decompress(body))
+    return json.loads(data.decode("utf-8"))
+
+
+class CompressedJSON(TypeDecorator):
+    """JSON stored compressed in a binary column.
+
+    For large, rarely read payloads such as raw platform API responses: they
+    take a fraction of the space of JSON text, at the cost of not being
+    queryable in SQL.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, min_size: int = 256, level: int = 6, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+        self.level = level
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return encode_json(value, min_size=self.min_size, level=self.level)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decode_json(value)
@@ -0,0 +1,364 @@
+import hashlib
+import os
+import re
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_openai import OpenAIEmbeddings
+from sqlalchemy import func, select
+
+from utils.logging_utils import log_message, setup_logging
+
+from .models_db import SiaMessageVectorModel
+from .schemas import SiaMessageSchema
+
+
+class SiaEmbedder:
+    """Turns texts into vectors of `dim` float32 values.
+
+    Vectors are L2-normalized by SiaVectorMemory, so the dot product used for
+    search is the cosine similarity.
+    """
+
+    dim: int
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class HashingEmbedder(SiaEmbedder):
+    """Deterministic local embedder: a signed bag of hashed words.
+
+    Captures word overlap only, not meaning, but needs no model or API and
+    gives the same vectors on every run, so it suits tests and offline use.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+                vectors[i, h % self.dim] += 1.0 if h >> 63 else -1.0
+        return vectors
+
+
+class LangchainEmbedder(SiaEmbedder):
+    """Adapter for langchain Embeddings, e.g. OpenAIEmbeddings(model="text-embedding-3-small")
+    with dim=1536."""
+
+    def __init__(self, embeddings, dim: int):
+        self.embeddings = embeddings
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+
+
+# Vector sizes of the OpenAI embedding models, see create_embedder()
+OPENAI_EMBEDDING_DIMS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+DEFAULT_EMBEDDER = "openai:text-embedding-3-small"
+
+
+def create_embedder(spec: str = DEFAULT_EMBEDDER) -> SiaEmbedder:
+    """Build an embedder from a setting such as VECTOR_MEMORY_EMBEDDER:
+    "openai:<model>" (dimension of an unknown model as "openai:<model>:<dim>")
+    or "hashing" / "hashing:<dim>" for tests and offline use."""
+    kind, _, rest = spec.partition(":")
+    if kind == "hashing":
+        return HashingEmbedder(int(rest)) if rest else HashingEmbedder()
+    if kind == "openai" and rest:
+        model, _, dim = rest.partition(":")
+        if not dim and model not in OPENAI_EMBEDDING_DIMS:
+            raise ValueError(f"Unknown dimension of embedding model {model}, use openai:{model}:<dim>")
+        return LangchainEmbedder(OpenAIEmbeddings(model=model), int(dim) if dim else OPENAI_EMBEDDING_DIMS[model])
+    raise ValueError(f"Unknown embedder: {spec}")
+
+
+class SiaVectorMemory:
+    """Message embeddings in a memory-mapped float32 matrix on disk, one row
+    per message, with exact top-k search by cosine similarity.
+
+    The `message_vector` table maps matrix rows to message ids and holds the
+    author / platform used for filtering. Search streams the matrix (or the
+    rows matching the filters) in chunks of `chunk_size` rows, so memory use
+    is bounded regardless of how many messages are stored. The matrix file
+    must only be written by one process, and only with the embedder it was
+    built with (default: DEFAULT_EMBEDDER).
+    """
+
+    def __init__(
+        self,
+        session_scope: Callable,
+        path: str,
+        embedder: SiaEmbedder = None,
+        chunk_size: int = 65536,
+    ):
+        self.session_scope = session_scope
+        self.path = path
+        self.embedder = embedder or create_embedder()
+        self.dim = self.embedder.dim
+        self.chunk_size = chunk_size
+
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        size = os.path.getsize(path)
+        if size % (self.dim * 4):
+            raise ValueError(f"{path} does not hold {self.dim}-dimensional vectors")
+        self._capacity = size // (self.dim * 4)
+        self._matrix = self._open(self._capacity)
+
+        with self.session_scope() as session:
+            last_row = session.execute(select(func.max(SiaMessageVectorModel.row_index))).scalar()
+        self._count = 0 if last_row is None else last_row + 1
+
+    def __len__(self):
+        return self._count
+
+    def _open(self, capacity: int) -> Optional[np.memmap]:
+        if not capacity:
+            return None
+        return np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _reserve(self, rows: int):
+        """Grow the matrix file to hold at least `rows` rows."""
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, self._capacity * 2, 1024)
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self.path, "r+b") as f:
+            f.truncate(capacity * self.dim * 4)
+        self._capacity = capacity
+        self._matrix = self._open(capacity)
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add_messages(self, messages: Iterable[SiaMessageSchema]) -> int:
+        """Embed and store messages that have no vector yet. Flagged messages
+        are skipped. Returns the number of vectors added.
+
+        The embedder (possibly an API call) runs without the lock or a
+        session; the lock is only held to write the matrix and the rows."""
+        messages = {message.id: message for message in messages if not message.flagged}
+        with self.session_scope() as session:
+            self._drop_embedded(session, messages)
+        if not messages:
+            return 0
+        vectors = dict(zip(
+            messages,
+            self._normalize(self.embedder.embed([message.content for message in messages.values()])),
+        ))
+
+        with self._lock, self.session_scope() as session:
+            # embedded by another thread meanwhile
+            self._drop_embedded(session, messages)
+            if not messages:
+                return 0
+
+            new = list(messages.values())
+            first_row = self._count
+            self._reserve(first_row + len(new))
+            self._matrix[first_row:first_row + len(new)] = np.stack([vectors[message.id] for message in new])
+            self._matrix.flush()
+
+            session.add_all([
+                SiaMessageVectorModel(
+                    message_id=message.id,
+                    row_index=first_row + i,
+                    platform=message.platform,
+                    author=message.author,
+                )
+                for i, message in enumerate(new)
+            ])
+            # rows of a failed transaction are left unused, never overwritten
+            self._count = first_row + len(new)
+
+        return len(new)
+
+    @staticmethod
+    def _drop_embedded(session, messages: Dict[str, SiaMessageSchema]):
+        """Remove the messages that already have a vector from `messages`."""
+        ids = list(messages)
+        for i in range(0, len(ids), 500):
+            for message_id in session.execute(
+                select(SiaMessageVectorModel.message_id)
+                .where(SiaMessageVectorModel.message_id.in_(ids[i:i + 500]))
+            ).scalars():
+                messages.pop(message_id)
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        author: str = None,
+        platform: str = None,
+        exclude_ids: Iterable[str] = (),
+    ) -> List[Tuple[str, float]]:
+        """(message_id, similarity) of the `k` messages most similar to
+        `query`, best first, optionally restricted to an author / platform."""
+        if not self._count or k <= 0:
+            return []
+        query_vector = self._normalize(self.embedder.embed([query]))[0]
+        exclude_ids = set(exclude_ids)
+        # extra candidates for excluded and deleted messages
+        candidates = k + len(exclude_ids) + 16
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        # add_messages() may remap the matrix to grow it, and reset() truncates it
+        with self._lock:
+            for rows, vectors in self._chunks(author, platform):
+                scores = vectors @ query_vector
+                best_rows = np.concatenate([best_rows, rows])
+                best_scores = np.concatenate([best_scores, scores])
+                if len(best_scores) > candidates:
+                    top = np.argpartition(-best_scores, candidates)[:candidates]
+                    best_rows, best_scores = best_rows[top], best_scores[top]
+
+        order = np.argsort(-best_scores, kind="stable")
+        best_rows, best_scores = best_rows[order], best_scores[order]
+
+        with self.session_scope() as session:
+            message_ids = dict(
+                session.execute(
+                    select(SiaMessageVectorModel.row_index, SiaMessageVectorModel.message_id)
+                    .where(SiaMessageVectorModel.row_index.in_(best_rows.tolist()))
+                ).all()
+            )
+
+        results = []
+        for row, score in zip(best_rows.tolist(), best_scores.tolist()):
+            message_id = message_ids.get(row)
+            if message_id is None or message_id in exclude_ids:
+                continue
+            results.append((message_id, score))
+            if len(results) == k:
+                break
+        return results
+
+    def _chunks(self, author: str = None, platform: str = None):
+        """Yield (row numbers, vectors) in chunks of at most `chunk_size` rows.
+        Called with the lock held."""
+        count = self._count
+        if not count:
+            return
+        if author is None and platform is None:
+            for start in range(0, count, self.chunk_size):
+                end = min(start + self.chunk_size, count)
+                yield np.arange(start, end), np.asarray(self._matrix[start:end])
+            return
+
+        query = select(SiaMessageVectorModel.row_index).where(SiaMessageVectorModel.row_index < count)
+        if author is not None:
+            query = query.where(SiaMessageVectorModel.author == author)
+        if platform is not None:
+            query = query.where(SiaMessageVectorModel.platform == platform)
+
+        with self.session_scope() as session:
+            result = session.execute(
+                query.order_by(SiaMessageVectorModel.row_index).execution_options(yield_per=self.chunk_size)
+            )
+            for partition in result.partitions():
+                rows = np.fromiter((row for row, in partition), dtype=np.int64)
+                yield rows, np.asarray(self._matrix[rows])
+
+    def reset(self):
+        """Delete all vectors and truncate the matrix file."""
+        with self._lock, self.session_scope() as session:
+            session.query(SiaMessageVectorModel).delete(synchronize_session=False)
+            self._matrix = None
+            with open(self.path, "r+b") as f:
+                f.truncate(0)
+            self._capacity = 0
+            self._count = 0
+
+    def close(self):
+        if self._matrix is not None:
+            self._matrix.flush()
+
+
+class SiaEmbeddingQueue:
+    """Embeds newly stored messages in a background thread, so that storing a
+    message does not wait for the embedder (an API call with the default
+    one).
+
+    Messages are embedded in batches of at most `batch_size`. The queue is
+    kept in memory: messages still queued when the process dies, or whose
+    embedding failed, have no vector and are picked up by
+    SiaMemory.backfill_vectors().
+    """
+
+    def __init__(self, vector_memory: SiaVectorMemory, batch_size: int = 100):
+        self.vector_memory = vector_memory
+        self.batch_size = batch_size
+
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.logger = setup_logging()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def add(self, messages: Iterable[SiaMessageSchema]):
+        with self._lock:
+            self._queue.extend(messages)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embedding_queue", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def flush(self):
+        """Embed all queued messages in the calling thread."""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if not batch:
+                    return
+                try:
+                    self.vector_memory.add_messages(batch)
+                except Exception as e:
+                    log_message(self.logger, "error", self, f"Error embedding {len(batch)} messages: {e}")
+
+    def clear(self):
+        """Drop the queued messages, e.g. when the vectors are reset."""
+        with self._lock:
+            self._queue.clear()
+
+    def close(self):
+        """Stop the background thread and embed what is still queued."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            self.flush()
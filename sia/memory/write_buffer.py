@@ -0,0 +1,130 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from utils.logging_utils import log_message, setup_logging
+
+from .schemas import SiaMessageSchema
+
+
+class SiaMessageWriteBuffer:
+    """In-process write-behind buffer for messages.
+
+    Messages are kept in memory and written in batches by a background thread
+    once `max_size` messages are pending or `max_delay` seconds have passed.
+    Buffered messages stay readable through `get` until they are stored, and
+    `close` writes whatever is still pending.
+
+    Messages of a failed batch are retried one by one on the following
+    flushes, so that a message that cannot be stored does not hold back the
+    others. After `max_attempts` failed writes a message is set aside: it is
+    no longer retried or served by `get`, and is returned by `failed` and
+    `close`.
+    """
+
+    def __init__(
+        self,
+        flush_func: Callable[[List[Dict]], List[SiaMessageSchema]],
+        max_size: int = 100,
+        max_delay: float = 5.0,
+        max_attempts: int = 5,
+    ):
+        self.flush_func = flush_func
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+
+        self._pending = OrderedDict()  # message_id -> (entry, schema)
+        self._attempts = {}  # message_id -> failed writes of the pending version
+        self._failed = []  # entries given up on
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.logger = setup_logging()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, entry: Dict, schema: SiaMessageSchema):
+        with self._lock:
+            self._pending[schema.id] = (entry, schema)
+            self._attempts.pop(schema.id, None)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="message_write_buffer", daemon=True
+                )
+                self._thread.start()
+            if len(self._pending) >= self.max_size:
+                self._wake.set()
+
+    def get(self, message_id: str) -> Optional[SiaMessageSchema]:
+        with self._lock:
+            pending = self._pending.get(message_id)
+        return pending[1] if pending else None
+
+    def failed(self) -> List[Dict]:
+        """Entries that could not be written within `max_attempts` attempts."""
+        with self._lock:
+            return list(self._failed)
+
+    def flush(self):
+        """Write all pending messages: those not tried yet in one batch, those
+        of failed batches one by one. Failed messages stay pending until
+        their `max_attempts`-th attempt."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending.items())
+                retries = [item for item in batch if item[0] in self._attempts]
+                fresh = [item for item in batch if item[0] not in self._attempts]
+            for group in ([fresh] if fresh else []) + [[item] for item in retries]:
+                self._write(group)
+
+    def _write(self, batch: List):
+        try:
+            self.flush_func([entry for _, (entry, _) in batch])
+        except Exception as e:
+            log_message(self.logger, "error", self, f"Error flushing {len(batch)} buffered messages: {e}")
+            with self._lock:
+                for message_id, pending in batch:
+                    if self._pending.get(message_id) is not pending:
+                        continue
+                    self._attempts[message_id] = self._attempts.get(message_id, 0) + 1
+                    if self._attempts[message_id] >= self.max_attempts:
+                        log_message(self.logger, "error", self, f"Giving up writing buffered message {message_id}")
+                        del self._pending[message_id]
+                        del self._attempts[message_id]
+                        self._failed.append(pending[0])
+            return
+
+        with self._lock:
+            for message_id, pending in batch:
+                # only drop what was written, not a newer version of it
+                if self._pending.get(message_id) is pending:
+                    del self._pending[message_id]
+                    self._attempts.pop(message_id, None)
+
+    def close(self) -> List[Dict]:
+        """Stop the background thread and write all pending messages. Returns
+        the entries that could not be written, given up on earlier or failing
+        now, so that the caller can keep them."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+        with self._lock:
+            unwritten = self._failed + [entry for entry, _ in self._pending.values()]
+        if unwritten:
+            log_message(self.logger, "error", self, f"{len(unwritten)} buffered messages could not be written")
+        return unwritten
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.max_delay)
+            self._wake.clear()
+            self.flush()
@@ -68,21 +68,8 @@ class GoogleNewsModule:
         raise TypeError(f"Type {o.__class__.__name__} not serializable")
 
     def get_settings(self):
-        session = self.sia.memory.Session()
-        try:
-            settings_model = (
-                session.query(KnowledgeModuleSettingsModel)
-                .filter(KnowledgeModuleSettingsModel.module_name == self.module_name)
-                .first()
-            )
-        finally:
-            session.close()
-        if settings_model:
-            settings_schema = KnowledgeModuleSettingsSchema(
-                character_name_id=settings_model.character_name_id,
-                module_name=settings_model.module_name,
-                module_settings=settings_model.module_settings,
-            )
+        settings_schema = self.sia.memory.settings.get_module_settings(self.module_name)
+        if settings_schema:
             log_message(
                 self.logger,
                 "info",
@@ -121,33 +108,12 @@ class GoogleNewsModule:
             return settings_schema
 
     def update_settings(self, settings: KnowledgeModuleSettingsSchema):
-        session = self.sia.memory.Session()
-        try:
-            settings_model = (
-                session.query(KnowledgeModuleSettingsModel)
-                .filter(KnowledgeModuleSettingsModel.module_name == self.module_name)
-                .first()
-            )
-            if settings_model:
-                # Convert datetime objects to strings in module_settings
-                settings_dict = settings.dict()
-                settings_dict["module_settings"] = {
-                    key: (value.isoformat() if isinstance(value, datetime) else value)
-                    for key, value in settings_dict["module_settings"].items()
-                }
-                for key, value in settings_dict.items():
-                    setattr(settings_model, key, value)
-            else:
-                settings_dict = settings.dict()
-                settings_dict["module_settings"] = {
-                    key: (value.isoformat() if isinstance(value, datetime) else value)
-                    for key, value in settings_dict["module_settings"].items()
-                }
-                settings_model = KnowledgeModuleSettingsModel(**settings_dict)
-                session.add(settings_model)
-            session.commit()
-        finally:
-            session.close()
+        # Convert datetime objects to strings in module_settings
+        module_settings = {
+            key: (value.isoformat() if isinstance(value, datetime) else value)
+            for key, value in settings.module_settings.items()
+        }
+        self.sia.memory.settings.update_module_settings(self.module_name, module_settings)
 
     def search(
         self, parameters: GoogleNewsSearchParametersSchema
@@ -4,14 +4,12 @@ from datetime import datetime, timedelta, timezone
 
 from langchain.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
-from sqlalchemy.orm.attributes import flag_modified
 
 from sia.modules.knowledge.GoogleNews.models_db import (
     GoogleNewsSearchModel,
     GoogleNewsSearchResultModel,
 )
 from sia.modules.knowledge.GoogleNews.schemas import GoogleNewsSearchResultSchema
-from sia.modules.knowledge.models_db import KnowledgeModuleSettingsModel
 from utils.logging_utils import enable_logging, setup_logging
 
 
@@ -25,8 +23,8 @@ class LatestNewsPlugin:
         enable_logging(logging_enabled)
 
     def get_latest_news_from_db(self):
-        # Use a context manager to ensure the session is closed properly
-        with self.module.sia.memory.Session() as session:
+        # Read-only: served by the read replica if there is one
+        with self.module.sia.memory.read_session_scope() as session:
             # Use timezone-aware datetime if your database uses TIMESTAMP WITH
             # TIME ZONE
             twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
@@ -110,48 +108,26 @@ class LatestNewsPlugin:
         return prompt_part
 
     def update_settings(self, next_use_after: datetime):
-        session = self.module.sia.memory.Session()
-        try:
-            settings_model = (
-                session.query(KnowledgeModuleSettingsModel)
-                .filter(
-                    KnowledgeModuleSettingsModel.module_name == self.module.module_name
-                )
-                .first()
+        def set_next_use_after(module_settings):
+            # Update the next_use_after field
+            if (
+                "plugins" in module_settings
+                and self.plugin_name in module_settings["plugins"]
+            ):
+                module_settings["plugins"][self.plugin_name][
+                    "next_use_after"
+                ] = next_use_after.isoformat()
+
+            print(
+                f"\n\nmodule_settings: {
+                    json.dumps(
+                        module_settings,
+                        indent=4)}\n\n"
             )
 
-            if settings_model:
-                # Deserialize module_settings to update next_use_after
-                module_settings = settings_model.module_settings
-
-                # Update the next_use_after field
-                if (
-                    "plugins" in module_settings
-                    and self.plugin_name in module_settings["plugins"]
-                ):
-                    module_settings["plugins"][self.plugin_name][
-                        "next_use_after"
-                    ] = next_use_after.isoformat()
-
-                print(
-                    f"\n\nmodule_settings: {
-                        json.dumps(
-                            module_settings,
-                            indent=4)}\n\n"
-                )
-
-                # Serialize the updated module_settings back to JSON
-                settings_model.module_settings = module_settings
-
-                # # Merge the updated model to ensure it's attached to the session
-                # session.merge(settings_model)
-
-                flag_modified(settings_model, "module_settings")
-
-                # Flush the session to ensure changes are detected
-                session.flush()
-                # Commit the session to persist changes
-                session.commit()
-
-        finally:
-            session.close()
+        # Applied to the stored settings only, and again if another process
+        #   changed them meanwhile
+        if self.module.sia.memory.settings.get_module_settings(self.module.module_name):
+            self.module.sia.memory.settings.modify_module_settings(
+                self.module.module_name, set_next_use_after
+            )
@@ -1,7 +1,7 @@
 from datetime import datetime
 from uuid import uuid4
 
-from sqlalchemy import JSON, Column, DateTime, String
+from sqlalchemy import JSON, Column, DateTime, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -15,3 +15,5 @@ class KnowledgeModuleSettingsModel(Base):
     module_name = Column(String)
     module_settings = Column(JSON)
     created_at = Column(DateTime, default=lambda: datetime.now())
+    # bumped on every write, see sia.memory.settings_cache.SiaSettingsCache
+    version = Column(Integer, nullable=False, default=1)
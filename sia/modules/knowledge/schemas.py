@@ -10,3 +10,4 @@ class KnowledgeModuleSettingsSchema(BaseModel):
     module_name: Optional[str]
     module_settings: Optional[Dict] = {}
     created_at: Optional[datetime] = datetime.now()
+    version: Optional[int] = None
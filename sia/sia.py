@@ -15,9 +15,10 @@ from plugins.imgflip_meme_generator import ImgflipMemeGenerator
 from sia.character import SiaCharacter
 from sia.clients.telegram.telegram_client_aiogram import SiaTelegram
 from sia.clients.twitter.twitter_official_api_client import SiaTwitterOfficial
+from sia.memory.async_memory import AsyncSiaMemory
 from sia.memory.memory import SiaMemory
 from sia.memory.schemas import SiaMessageGeneratedSchema, SiaMessageSchema
-from sia.modules.knowledge.models_db import KnowledgeModuleSettingsModel
+from sia.memory.vector_memory import create_embedder
 from sia.schemas.schemas import ResponseFilteringResultLLMSchema
 from utils.etc_utils import generate_image_dalle, save_image_from_url
 from utils.logging_utils import enable_logging, log_message, setup_logging
@@ -31,6 +32,11 @@ class Sia:
         self,
         character_json_filepath: str,
         memory_db_path: str = None,
+        memory_storage_profile: str = "default",
+        memory_replica_db_path: str = None,
+        vector_memory_path: str = None,
+        vector_memory_embedder: str = None,
+        archive_after_days: float = None,
         clients=None,
         twitter_creds=None,
         telegram_creds=None,
@@ -41,7 +47,19 @@ class Sia:
     ):
         self.testing = testing
         self.character = SiaCharacter(json_file=character_json_filepath, sia=self)
-        self.memory = SiaMemory(character=self.character, db_path=memory_db_path)
+        self.memory = SiaMemory(
+            character=self.character,
+            db_path=memory_db_path,
+            storage_profile=memory_storage_profile,
+            replica_db_path=memory_replica_db_path,
+            vector_memory_path=vector_memory_path,
+            # e.g. "openai:text-embedding-3-small", see create_embedder()
+            embedder=create_embedder(vector_memory_embedder) if vector_memory_embedder else None,
+        )
+        # messages older than this are moved to the archive once a day, see run()
+        self.archive_after_days = archive_after_days
+        # asyncio view of the same memory for the async clients
+        self.async_memory = AsyncSiaMemory(memory=self.memory)
         self.clients = clients
         self.twitter = (
             SiaTwitterOfficial(sia=self, **twitter_creds, testing=self.testing)
@@ -88,29 +106,16 @@ class Sia:
             thread.join()
 
     def get_modules_settings(self):
-        session = self.memory.Session()
+        stored_settings = self.memory.settings.get_modules_settings()
 
-        try:
-            modules_settings = {}
-            for module in self.knowledge_modules:
-                module_settings = (
-                    session.query(KnowledgeModuleSettingsModel)
-                    .filter(
-                        KnowledgeModuleSettingsModel.character_name_id
-                        == self.character.name_id,
-                        KnowledgeModuleSettingsModel.module_name == module.module_name,
-                    )
-                    .all()
-                )
-                log_message(
-                    self.logger, "info", self, f"Module settings: {module_settings}"
-                )
-                modules_settings[module.module_name] = module_settings[
-                    0
-                ].module_settings
-            return modules_settings
-        finally:
-            session.close()
+        modules_settings = {}
+        for module in self.knowledge_modules:
+            module_settings = stored_settings[module.module_name]
+            log_message(
+                self.logger, "info", self, f"Module settings: {module_settings}"
+            )
+            modules_settings[module.module_name] = module_settings
+        return modules_settings
 
     def get_plugin(self, time_of_day="afternoon"):
         modules_settings = self.get_modules_settings()
@@ -241,7 +246,9 @@ class Sia:
             ),
             "previous_posts": [
                 f"[{post.wen_posted}] {post.content}"
-                for post in self.memory.get_messages()[-10:]
+                for post in self.memory.get_message_rows(
+                    columns=("wen_posted", "content"), limit=10
+                )
             ],
             "platform": platform,
             "length_range": random.choice(
@@ -363,13 +370,10 @@ class Sia:
             return None
 
         if not conversation:
-            conversation = self.twitter.get_conversation(
+            # root message and the latest messages, from the conversation index
+            conversation = self.memory.get_conversation_messages(
                 conversation_id=message.conversation_id
             )
-            conversation_first_message = self.memory.get_messages(
-                id=message.conversation_id, platform=platform
-            )
-            conversation = conversation_first_message + conversation[-20:]
             conversation_str = "\n".join(
                 [
                     f"[{msg.wen_posted}] {msg.author}: {msg.content}"
@@ -485,6 +489,20 @@ class Sia:
                 {chr(10).join([f"{msg['role']}: {msg['content']}" for msg in social_memory.conversation_history[-5:]])}
             """
 
+        # Older messages from the author related to this one, if vector memory is enabled
+        relevant_messages = self.memory.get_relevant_messages(
+            message.content,
+            k=5,
+            author=message.author,
+            platform=platform,
+            exclude_ids=[message.id] + [msg.id for msg in conversation or []],
+        )
+        if relevant_messages:
+            social_memory_str += f"""
+                Earlier messages from {message.author} related to this one:
+                {chr(10).join([f"[{msg.wen_posted}] {msg.content}" for msg in relevant_messages])}
+            """
+
         prompt_template = ChatPromptTemplate.from_messages(
             [
                 (
@@ -624,20 +642,19 @@ class Sia:
 
         # After generating response, update social memory
         if generated_response_schema:
-            # Update social memory with correct platform from message
-            self.memory.update_social_memory(
-                user_id=message.author,
-                platform=message.platform,  # Use message.platform instead of parameter
-                message_id=message.id,
-                content=message.content,
-                role="user"
-            )
-            self.memory.update_social_memory(
+            # Update social memory with correct platform from message, both
+            #   turns in one transaction
+            self.memory.update_social_memory_turns(
                 user_id=message.author,
                 platform=message.platform,  # Use message.platform instead of parameter
-                message_id=generated_response_schema.id,
-                content=generated_response_schema.content,
-                role="assistant"
+                turns=[
+                    {"message_id": message.id, "content": message.content, "role": "user"},
+                    {
+                        "message_id": generated_response_schema.id,
+                        "content": generated_response_schema.content,
+                        "role": "assistant",
+                    },
+                ],
             )
 
         return generated_response_schema
@@ -682,11 +699,30 @@ class Sia:
                 name="twitter_thread"
             )
             threads.append(twitter_thread)
+
+        # Keep the hot message table bounded
+        if self.archive_after_days:
+            def run_archiving():
+                while True:
+                    try:
+                        self.memory.archive_messages(self.archive_after_days)
+                    except Exception as e:
+                        log_message(self.logger, "error", self, f"Error archiving messages: {e}")
+                    time.sleep(24 * 60 * 60)
+
+            archive_thread = threading.Thread(
+                target=run_archiving,
+                name="archive_thread"
+            )
+            threads.append(archive_thread)
             
         # Start all threads
         for thread in threads:
             thread.daemon = True
             thread.start()
+
+        # Social memory opinions are refreshed in the background
+        self.memory.opinion_worker.start()
             
         try:
             # Keep main thread alive
@@ -694,4 +730,11 @@ class Sia:
                 time.sleep(1)
         except KeyboardInterrupt:
             print("Shutting down...")
+        finally:
+            # Store messages still waiting in the write buffer, finish opinion refreshes
+            for entry in self.memory.close():
+                log_message(
+                    self.logger, "error", self,
+                    f"Message {entry['message_id']} was not stored: {entry['message'].content}",
+                )
     
\ No newline at end of file
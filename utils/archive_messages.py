@@ -0,0 +1,57 @@
+"""
+
+Moves old messages out of the message table into compressed archive segments.
+
+Messages posted more than --older-than-days days ago are written to gzip
+JSONL segment files in --archive-dir and deleted from the message table, in
+batches of --batch-size messages per segment. They stay readable by id and
+through get_messages(include_archive=True). With --dry-run only the number of
+messages that would be archived is printed.
+
+Usage:
+    python -m utils.archive_messages --older-than-days 90 [--archive-dir memory/archive] [--db sqlite:///memory/sia.db] [--dry-run]
+
+"""
+
+import argparse
+import os
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+
+from sia.character import SiaCharacter
+from sia.memory.memory import SiaMemory
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--db", default=os.getenv("DB_PATH"), help="Database URL")
+    parser.add_argument("--older-than-days", type=float, required=True, help="Archive messages older than this")
+    parser.add_argument("--archive-dir", default="memory/archive", help="Directory of the segment files")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Messages per segment")
+    parser.add_argument(
+        "--character",
+        default=f"characters/{os.getenv('CHARACTER_NAME_ID') or 'sia'}.json",
+        help="Character JSON file",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Only count the messages to archive")
+    args = parser.parse_args()
+
+    character = SiaCharacter(json_file=args.character, logging_enabled=False)
+    memory = SiaMemory(args.db, character, archive_dir=args.archive_dir)
+
+    if args.dry_run:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=args.older_than_days)
+        count = memory.count_messages(to_datetime=cutoff, flagged=2)
+        print(f"{count} messages posted before {cutoff:%Y-%m-%d %H:%M} would be archived")
+        return
+
+    archived = memory.archive_messages(args.older_than_days, batch_size=args.batch_size)
+    memory.close()
+    print(f"Archived {archived} messages to {args.archive_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+
+Compares the loading strategies of the message characters relationship.
+
+Stores --messages messages in a fresh SQLite database, each linked to one to
+--characters characters (as when several characters share a database), then
+reads the latest --limit messages with get_messages(load_characters=...) for
+each strategy:
+
+  none      characters not loaded (default)
+  selectin  one extra IN query on message_character
+  joined    LEFT JOIN on message_character, as the relationship used to load
+
+and reports the rows fetched from the database, the time spent loading ORM
+objects, the time spent building SiaMessageSchema objects and the total.
+
+Usage:
+    python -m utils.benchmark_character_loading [--messages 20000] [--characters 3] [--limit 1000] [--repeat 5]
+
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func
+
+from sia.character import SiaCharacter
+from sia.memory.memory import SiaMemory
+from sia.memory.models_db import MessageCharacterModel
+from sia.memory.schemas import SiaMessageGeneratedSchema, SiaMessageSchema
+
+
+STRATEGIES = ("none", "selectin", "joined")
+
+
+def timed(func, repeat: int):
+    """Best wall time of `repeat` runs in milliseconds, and the last result."""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--messages", type=int, default=20000, help="Number of messages in the dataset")
+    parser.add_argument("--characters", type=int, default=3, help="Maximum characters linked to a message")
+    parser.add_argument("--limit", type=int, default=1000, help="Messages per read")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per timing (best is reported)")
+    parser.add_argument("--character", default="characters/sia.json", help="Character JSON file")
+    args = parser.parse_args()
+
+    character = SiaCharacter(json_file=args.character, logging_enabled=False)
+    rng = random.Random(42)
+    start = datetime.now(timezone.utc) - timedelta(days=30)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        memory = SiaMemory(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}", character, message_cache_size=0)
+
+        messages = [
+            {
+                "message_id": f"{i:08d}",
+                "message": SiaMessageGeneratedSchema(
+                    platform="twitter",
+                    author=f"user_{rng.randint(1, 500)}",
+                    content=f"message {i}",
+                ),
+                "wen_posted": start + timedelta(seconds=i * 60),
+            }
+            for i in range(args.messages)
+        ]
+        for n in range(args.characters):
+            # character n is linked to every message for n == 0, then to a random subset
+            linked = [entry for entry in messages if n == 0 or rng.random() < 0.5]
+            for i in range(0, len(linked), 1000):
+                memory.add_messages(linked[i:i + 1000], character=f"character_{n}")
+
+        with memory.session_scope() as session:
+            links = session.query(func.count()).select_from(MessageCharacterModel).scalar()
+
+        results = {}
+        for strategy in STRATEGIES:
+            with memory.session_scope() as session:
+                query = memory._messages_query(session, load_characters=strategy).limit(args.limit)
+                load_ms, models = timed(lambda: query.all(), args.repeat)
+                hydrate_ms, _ = timed(
+                    lambda: [SiaMessageSchema.from_orm(model) for model in models], args.repeat
+                )
+                rows = len(session.connection().execute(query.statement).all())
+                if strategy == "selectin":
+                    rows += sum(len(model.characters) for model in models)
+            total_ms, _ = timed(
+                lambda: memory.get_messages(limit=args.limit, load_characters=strategy), args.repeat
+            )
+            results[strategy] = (rows, load_ms, hydrate_ms, total_ms)
+        memory.close()
+        memory.engine.dispose()
+
+    print(
+        f"{args.messages} messages, {links} character links, "
+        f"reads of the latest {args.limit}, best of {args.repeat}\n"
+    )
+    print(f"{'strategy':<10}{'rows':>8}{'ORM load (ms)':>16}{'schemas (ms)':>15}{'get_messages (ms)':>20}")
+    for strategy, (rows, load_ms, hydrate_ms, total_ms) in results.items():
+        print(f"{strategy:<10}{rows:>8}{load_ms:>16.1f}{hydrate_ms:>15.1f}{total_ms:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+
+Measures the effect of compressed, deferred payload columns on message storage.
+
+Stores the same synthetic dataset (tweets with tweepy-like original_data
+payloads: entities, context annotations, metrics, referenced tweets) in two
+fresh SQLite databases:
+
+  legacy      original_data kept as JSON text and loaded with every message,
+              as before the change
+  compressed  original_data stored as CompressedJSON and deferred
+
+and reports the payload bytes per row, the database file size and the time
+of a typical "latest N messages" read for each.
+
+Usage:
+    python -m utils.benchmark_payload_storage [--messages 20000] [--limit 1000] [--repeat 5]
+
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sia.character import SiaCharacter
+from sia.memory.memory import SiaMemory
+from sia.memory.schemas import SiaMessageGeneratedSchema
+
+
+WORDS = (
+    "bitcoin ai agents memes market crypto web3 onchain vibes gm launch token "
+    "model training inference community builders alpha thread update roadmap"
+).split()
+
+DOMAINS = [
+    {"id": "46", "name": "Business Taxonomy", "description": "Categories within Brand Verticals that narrow down the scope of Brands"},
+    {"id": "47", "name": "Brand", "description": "Brands and Companies"},
+    {"id": "65", "name": "Interests and Hobbies Vertical", "description": "Top level interests and hobbies groupings, like Food or Travel"},
+    {"id": "131", "name": "Unified Twitter Taxonomy", "description": "A taxonomy of user interests."},
+]
+
+
+def tweet_payload(rng: random.Random, tweet_id: int, created_at: datetime) -> dict:
+    """A dict shaped like tweepy's Tweet.data for a reply with expansions."""
+    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40)))
+    mentions = [
+        {"start": 0, "end": 12, "username": f"user_{rng.randint(1, 5000)}", "id": str(rng.randint(10**17, 10**18))}
+        for _ in range(rng.randint(0, 3))
+    ]
+    return {
+        "id": str(tweet_id),
+        "text": text,
+        "author_id": str(rng.randint(10**17, 10**18)),
+        "conversation_id": str(tweet_id - rng.randint(0, 50)),
+        "created_at": created_at.isoformat(),
+        "lang": "en",
+        "possibly_sensitive": False,
+        "reply_settings": "everyone",
+        "edit_history_tweet_ids": [str(tweet_id)],
+        "in_reply_to_user_id": str(rng.randint(10**17, 10**18)),
+        "referenced_tweets": [{"type": "replied_to", "id": str(tweet_id - 1)}],
+        "public_metrics": {
+            "retweet_count": rng.randint(0, 50),
+            "reply_count": rng.randint(0, 20),
+            "like_count": rng.randint(0, 500),
+            "quote_count": rng.randint(0, 5),
+            "bookmark_count": rng.randint(0, 10),
+            "impression_count": rng.randint(0, 100000),
+        },
+        "entities": {
+            "mentions": mentions,
+            "hashtags": [{"start": 5, "end": 12, "tag": rng.choice(WORDS)} for _ in range(rng.randint(0, 3))],
+            "annotations": [
+                {"start": 10, "end": 20, "probability": rng.random(), "type": "Product", "normalized_text": rng.choice(WORDS)}
+                for _ in range(rng.randint(0, 3))
+            ],
+        },
+        "context_annotations": [
+            {
+                "domain": rng.choice(DOMAINS),
+                "entity": {"id": str(rng.randint(10**17, 10**18)), "name": rng.choice(WORDS).title()},
+            }
+            for _ in range(rng.randint(2, 10))
+        ],
+    }
+
+
+def dataset(count: int):
+    rng = random.Random(42)
+    start = datetime.now(timezone.utc) - timedelta(days=30)
+    for i in range(count):
+        created_at = start + timedelta(seconds=i * 60)
+        payload = tweet_payload(rng, 10**18 + i, created_at)
+        yield {
+            "message_id": payload["id"],
+            "message": SiaMessageGeneratedSchema(
+                platform="twitter",
+                author=f"user_{rng.randint(1, 5000)}",
+                content=payload["text"],
+                conversation_id=payload["conversation_id"],
+                response_to=payload["referenced_tweets"][0]["id"],
+            ),
+            "message_type": "reply",
+            "original_data": payload,
+            "wen_posted": created_at,
+        }
+
+
+def timed(func, repeat: int) -> float:
+    """Best wall time of `repeat` runs, in milliseconds."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--messages", type=int, default=20000, help="Number of messages in the dataset")
+    parser.add_argument("--limit", type=int, default=1000, help="Messages per read")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per timing (best is reported)")
+    parser.add_argument("--character", default="characters/sia.json", help="Character JSON file")
+    args = parser.parse_args()
+
+    character = SiaCharacter(json_file=args.character, logging_enabled=False)
+    messages = list(dataset(args.messages))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = {}
+        for variant in ("legacy", "compressed"):
+            db_file = os.path.join(tmp_dir, f"{variant}.db")
+            memory = SiaMemory(f"sqlite:///{db_file}", character, message_cache_size=0)
+            for i in range(0, len(messages), 1000):
+                memory.add_messages(messages[i:i + 1000])
+            memory.engine.dispose()
+
+            connection = sqlite3.connect(db_file)
+            if variant == "legacy":
+                # store the payloads the way the JSON column type did
+                connection.executemany(
+                    "UPDATE message SET original_data = ? WHERE id = ?",
+                    [(json.dumps(entry["original_data"]), entry["message_id"]) for entry in messages],
+                )
+                connection.commit()
+            connection.execute("VACUUM")
+            payload_bytes = connection.execute("SELECT avg(length(original_data)) FROM message").fetchone()[0]
+            connection.close()
+
+            # legacy reads always loaded the payloads
+            read = lambda: memory.get_messages(limit=args.limit, load_payloads=variant == "legacy")
+            results[variant] = {
+                "payload_bytes": payload_bytes,
+                "file_mb": os.path.getsize(db_file) / 2**20,
+                "read_ms": timed(read, args.repeat),
+                "read_payloads_ms": timed(
+                    lambda: memory.get_messages(limit=args.limit, load_payloads=True), args.repeat
+                ),
+            }
+            memory.close()
+            memory.engine.dispose()
+
+    legacy, compressed = results["legacy"], results["compressed"]
+    print(f"{args.messages} messages, reads of the latest {args.limit}, best of {args.repeat}\n")
+    print(f"{'':<34}{'legacy':>12}{'compressed':>12}{'change':>10}")
+    for label, key in (
+        ("original_data bytes per row", "payload_bytes"),
+        ("database file (MB)", "file_mb"),
+        ("get_messages (ms)", "read_ms"),
+        ("get_messages, load_payloads (ms)", "read_payloads_ms"),
+    ):
+        change = (compressed[key] - legacy[key]) / legacy[key] * 100
+        print(f"{label:<34}{legacy[key]:>12.1f}{compressed[key]:>12.1f}{change:>9.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+
+Compares concurrent-writer throughput of the memory storage profiles.
+
+For each profile, starts a number of writer threads (like the Telegram and
+Twitter clients in Sia.run) that add messages through one shared SiaMemory,
+while a reader thread keeps querying recent messages. Reports messages
+written per second, read queries per second and failed writes (e.g.
+"database is locked").
+
+By default every profile runs against its own fresh SQLite file in a
+temporary directory. Pass --db to benchmark an existing database (e.g.
+Postgres); its sia_message table is NOT cleaned up afterwards.
+
+Usage:
+    python -m utils.benchmark_storage_profiles [--writers 4] [--messages 200] [--db URL]
+
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sia.character import SiaCharacter
+from sia.memory.memory import SiaMemory
+from sia.memory.schemas import SiaMessageGeneratedSchema
+from sia.memory.storage import STORAGE_PROFILES
+
+
+def run_profile(db_path, profile, character, writers, messages_per_writer):
+    memory = SiaMemory(db_path, character, storage_profile=profile)
+    run_id = uuid.uuid4().hex[:8]
+    write_errors = []
+    read_errors = []
+    reads = [0]
+    done = threading.Event()
+
+    def write(writer):
+        for i in range(messages_per_writer):
+            try:
+                memory.add_message(
+                    message_id=f"bench-{run_id}-{writer}-{i}",
+                    message=SiaMessageGeneratedSchema(
+                        platform="benchmark",
+                        author=f"writer_{writer}",
+                        content=f"message {i} from writer {writer}",
+                        conversation_id=f"bench-{run_id}-{writer}",
+                        wen_posted=datetime.now(timezone.utc),
+                    ),
+                )
+            except Exception as e:
+                write_errors.append(e)
+
+    def read():
+        while not done.is_set():
+            try:
+                memory.get_message_rows(platform="benchmark", limit=20)
+                reads[0] += 1
+            except Exception as e:
+                read_errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+    reader = threading.Thread(target=read)
+
+    started = time.perf_counter()
+    reader.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    reader.join()
+
+    memory.close()
+    memory.engine.dispose()
+
+    errors = write_errors + read_errors
+    written = writers * messages_per_writer - len(write_errors)
+    return {
+        "elapsed": elapsed,
+        "writes_per_sec": written / elapsed,
+        "reads_per_sec": reads[0] / elapsed,
+        "errors": len(errors),
+        "first_error": str(errors[0]).splitlines()[0] if errors else "",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--db", default=None, help="Database URL (default: fresh SQLite file per profile)")
+    parser.add_argument("--writers", type=int, default=4, help="Number of concurrent writer threads")
+    parser.add_argument("--messages", type=int, default=200, help="Messages per writer")
+    parser.add_argument("--character", default="characters/sia.json", help="Character JSON file")
+    args = parser.parse_args()
+
+    character = SiaCharacter(json_file=args.character, logging_enabled=False)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for profile in STORAGE_PROFILES:
+            db_path = args.db or f"sqlite:///{os.path.join(tmp_dir, f'{profile}.db')}"
+            result = run_profile(db_path, profile, character, args.writers, args.messages)
+            print(
+                f"{profile:<12} "
+                f"{result['writes_per_sec']:>9.1f} writes/s  "
+                f"{result['reads_per_sec']:>9.1f} reads/s  "
+                f"{result['errors']:>5} errors  "
+                f"({result['elapsed']:.2f}s)"
+            )
+            if result["first_error"]:
+                print(f"             first error: {result['first_error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+
+Checks that concurrent clients can ingest the same messages without errors.
+
+Starts a Telegram and a Twitter thread that store the same --messages messages
+(same ids, e.g. a tweet shared to a Telegram group) through one shared
+SiaMemory with add_message, each in its own random order, twice: first both
+linking the messages to the same character, then each to a character of its
+own. Reports failed writes, the SQL statements each add_message call ran, and
+whether the stored messages, character links and conversation counters match
+what was ingested. Exits with status 1 if any check fails.
+
+By default it runs against a fresh SQLite file (production storage profile)
+in a temporary directory. Pass --db to use another database, e.g. Postgres;
+the check messages are NOT cleaned up afterwards.
+
+Usage:
+    python -m utils.check_concurrent_ingest [--messages 500] [--conversations 20] [--db URL]
+
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import uuid
+from collections import Counter
+
+from sqlalchemy import event, func
+
+from sia.character import SiaCharacter
+from sia.memory.memory import SiaMemory
+from sia.memory.models_db import MessageCharacterModel, SiaConversationModel, SiaMessageModel
+from sia.memory.schemas import SiaMessageGeneratedSchema
+
+
+CLIENTS = ("telegram", "twitter")
+
+
+def ingest(memory, messages, characters, seed):
+    """Store `messages` from one thread per client, client i linking them to
+    characters[i]. Returns the errors and the statements run per call."""
+    errors = []
+    statements = {}  # thread name -> statements of its current call
+    calls = Counter()  # statements per call -> calls
+
+    def count_statement(*args):
+        name = threading.current_thread().name
+        if name in statements:
+            statements[name] += 1
+
+    def run(client, character_name):
+        entries = list(messages)
+        random.Random(f"{seed}-{client}").shuffle(entries)
+        for entry in entries:
+            statements[client] = 0
+            try:
+                memory.add_message(**entry, character=character_name)
+            except Exception as e:
+                errors.append(f"{client}: {e}")
+            calls[statements[client]] += 1
+
+    event.listen(memory.engine, "before_cursor_execute", count_statement)
+    threads = [
+        threading.Thread(target=run, args=(client, character_name), name=client)
+        for client, character_name in zip(CLIENTS, characters)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    event.remove(memory.engine, "before_cursor_execute", count_statement)
+    return errors, calls
+
+
+def stored_counts(memory, message_ids, characters):
+    with memory.session_scope() as session:
+        stored = session.query(func.count()).filter(SiaMessageModel.id.in_(message_ids)).scalar()
+        links = (
+            session.query(MessageCharacterModel.character_name, func.count())
+            .filter(MessageCharacterModel.message_id.in_(message_ids))
+            .group_by(MessageCharacterModel.character_name)
+            .all()
+        )
+        conversations = (
+            session.query(SiaConversationModel.character_name, func.sum(SiaConversationModel.message_count))
+            .filter(SiaConversationModel.character_name.in_(characters))
+            .group_by(SiaConversationModel.character_name)
+            .all()
+        )
+    return stored, dict(links), {name: int(count) for name, count in conversations}
+
+
+def run_check(memory, run_id, args, characters, seed):
+    messages = [
+        {
+            "message_id": f"{run_id}-{i}",
+            "message": SiaMessageGeneratedSchema(
+                platform="twitter",
+                author=f"user_{i % 50}",
+                content=f"message {i}",
+                conversation_id=f"{run_id}-conversation-{i % args.conversations}",
+            ),
+        }
+        for i in range(args.messages)
+    ]
+    errors, calls = ingest(memory, messages, characters, seed)
+    stored, links, conversations = stored_counts(
+        memory, [entry["message_id"] for entry in messages], characters
+    )
+
+    expected = {name: args.messages for name in characters}
+    checks = {
+        "no failed writes": not errors,
+        "messages stored once": stored == args.messages,
+        "one link per message and character": links == expected,
+        "conversation counters": conversations == expected,
+    }
+    statements = ", ".join(
+        f"{count} statements x {n} calls" for count, n in sorted(calls.items())
+    )
+    print(f"characters {' / '.join(sorted(set(characters)))}: {statements}")
+    for error in errors[:5]:
+        print(f"  error: {error}")
+    for name, ok in checks.items():
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}")
+    return all(checks.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--messages", type=int, default=500, help="Messages ingested by each thread")
+    parser.add_argument("--conversations", type=int, default=20, help="Conversations the messages belong to")
+    parser.add_argument("--db", help="Database URL (default: fresh SQLite file)")
+    parser.add_argument("--character", default="characters/sia.json", help="Character JSON file")
+    args = parser.parse_args()
+
+    character = SiaCharacter(json_file=args.character, logging_enabled=False)
+    run_id = uuid.uuid4().hex[:8]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = args.db or f"sqlite:///{os.path.join(tmp_dir, 'ingest.db')}"
+        memory = SiaMemory(db_path, character, storage_profile="production", message_cache_size=0)
+        ok = run_check(memory, f"{run_id}-shared", args, [f"{run_id}-character"] * 2, run_id)
+        ok = run_check(
+            memory, f"{run_id}-own", args, [f"{run_id}-{client}" for client in CLIENTS], run_id
+        ) and ok
+        memory.close()
+        memory.engine.dispose()
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
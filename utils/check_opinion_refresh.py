@@ -0,0 +1,110 @@
+"""
+
+Checks that the opinion worker retries refreshes when the LLM fails.
+
+Stores a message of each of --users users in a fresh SQLite file and gives
+them a social memory, which queues an opinion refresh for each, and runs the
+queue with an LLM that always fails and a claim timeout of 0, so that failed
+refreshes are retried right away. Reports whether every refresh was tried
+--max-attempts times and then dropped, and whether no opinion was stored.
+Then queues the refreshes again (ten more turns each) with an LLM that
+answers and reports whether the opinions are stored and the queue emptied.
+Exits with status 1 if any check fails. No LLM is called.
+
+Usage:
+    python -m utils.check_opinion_refresh [--users 3] [--max-attempts 3]
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+from sqlalchemy import func
+
+from sia.character import SiaCharacter
+from sia.memory.memory import SiaMemory
+from sia.memory.models_db import SiaOpinionRefreshModel, SiaSocialMemoryModel
+from sia.memory.opinion_worker import SiaOpinionWorker
+from sia.memory.schemas import SiaMessageGeneratedSchema
+
+
+class FakeLLM:
+    """Stands in for ChatAnthropic in SiaMemory._generate_opinion."""
+
+    calls = 0
+    fail = True
+
+    def __init__(self, **kwargs):
+        pass
+
+    def __call__(self, prompt):
+        FakeLLM.calls += 1
+        if FakeLLM.fail:
+            raise ConnectionError("LLM unavailable")
+        return SimpleNamespace(content="A friendly user.")
+
+
+def stored(memory):
+    with memory.session_scope() as session:
+        opinions = [
+            (row.opinion, row.opinion_seq, row.interaction_count)
+            for row in session.query(SiaSocialMemoryModel).filter_by(character_name=memory.character.name)
+        ]
+        pending = session.query(func.count()).select_from(SiaOpinionRefreshModel).scalar()
+    return opinions, pending
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--users", type=int, default=3, help="Users with a social memory")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per refresh")
+    parser.add_argument("--character", default="characters/sia.json", help="Character JSON file")
+    args = parser.parse_args()
+
+    character = SiaCharacter(json_file=args.character, logging_enabled=False)
+
+    with tempfile.TemporaryDirectory() as tmp_dir, mock.patch("sia.memory.memory.ChatAnthropic", FakeLLM):
+        memory = SiaMemory(f"sqlite:///{os.path.join(tmp_dir, 'opinions.db')}", character)
+        worker = SiaOpinionWorker(memory, claim_timeout=0, max_attempts=args.max_attempts)
+        users = [f"user_{i}" for i in range(args.users)]
+
+        for user in users:
+            memory.add_message(
+                f"{user}-1", SiaMessageGeneratedSchema(platform="twitter", author=user, content="hello")
+            )
+            memory.update_social_memory(user, "twitter", f"{user}-1", "hello")
+        worker.run_pending()
+        failed_calls = FakeLLM.calls
+        failed_opinions, failed_pending = stored(memory)
+
+        FakeLLM.fail = False
+        for user in users:
+            turns = [{"message_id": f"{user}-{i}", "content": "hello again", "role": "user"} for i in range(2, 12)]
+            memory.update_social_memory_turns(user, "twitter", turns)
+        worker.run_pending()
+        opinions, pending = stored(memory)
+
+        memory.close()
+        memory.engine.dispose()
+
+    checks = {
+        "failed refreshes retried up to max attempts": failed_calls == args.users * args.max_attempts,
+        "no opinion stored while the LLM fails": all(opinion[:2] == (None, None) for opinion in failed_opinions),
+        "refreshes dropped after max attempts": failed_pending == 0,
+        "opinions stored once the LLM answers": all(
+            opinion == "A friendly user." and seq == count for opinion, seq, count in opinions
+        ),
+        "queue emptied": pending == 0,
+    }
+    print(f"LLM calls: {failed_calls} failing, {FakeLLM.calls - failed_calls} answering")
+    for name, ok in checks.items():
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+
+Checks that purging a character works with foreign keys enforced.
+
+Stores --messages messages in a fresh SQLite file with
+PRAGMA foreign_keys=ON (as Postgres always enforces them), every third of
+them linked to a second character as well, and gives each author a social
+memory. Then purges the first character with a small --chunk-size and
+reports whether the purge raised, whether the messages only it was linked
+to are gone, and whether the shared messages and the other character's
+links are kept. Exits with status 1 if any check fails.
+
+Usage:
+    python -m utils.check_purge_character [--messages 500] [--chunk-size 64]
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+from sqlalchemy import event, func
+
+from sia.character import SiaCharacter
+from sia.memory.memory import SiaMemory
+from sia.memory.models_db import MessageCharacterModel, SiaMessageModel, SiaSocialMemoryModel
+from sia.memory.schemas import SiaMessageGeneratedSchema
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--messages", type=int, default=500, help="Messages stored for the purged character")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Rows deleted per transaction")
+    parser.add_argument("--character", default="characters/sia.json", help="Character JSON file")
+    args = parser.parse_args()
+
+    character = SiaCharacter(json_file=args.character, logging_enabled=False)
+    other = "check-other-character"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        memory = SiaMemory(f"sqlite:///{os.path.join(tmp_dir, 'purge.db')}", character, message_cache_size=0)
+
+        @event.listens_for(memory.engine, "connect")
+        def enforce_foreign_keys(dbapi_connection, connection_record):
+            dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+        memory.engine.dispose()
+
+        shared = 0
+        for i in range(args.messages):
+            message = SiaMessageGeneratedSchema(
+                platform="twitter", author=f"user_{i % 10}", content=f"message {i}", conversation_id=f"c{i % 7}"
+            )
+            memory.add_message(f"m{i}", message)
+            if i % 3 == 0:
+                memory.add_message(f"m{i}", message, character=other)
+                shared += 1
+        for i in range(10):
+            memory.update_social_memory(f"user_{i}", "twitter", f"m{i}", f"message {i}")
+
+        error = None
+        try:
+            deleted = memory.purge_character(chunk_size=args.chunk_size)
+        except Exception as e:
+            error = e
+            deleted = {}
+
+        with memory.session_scope() as session:
+            messages = session.query(func.count()).select_from(SiaMessageModel).scalar()
+            links = dict(
+                session.query(MessageCharacterModel.character_name, func.count())
+                .group_by(MessageCharacterModel.character_name)
+                .all()
+            )
+            social_memories = (
+                session.query(func.count())
+                .select_from(SiaSocialMemoryModel)
+                .filter(SiaSocialMemoryModel.character_name == character.name)
+                .scalar()
+            )
+        memory.close()
+        memory.engine.dispose()
+
+    checks = {
+        "purge did not raise": error is None,
+        "unshared messages deleted": messages == shared,
+        "character links deleted": character.name not in links,
+        "other character's links kept": links.get(other) == shared,
+        "social memories deleted": social_memories == 0,
+    }
+    if error is not None:
+        print(f"  error: {error}")
+    print(f"deleted: {deleted}")
+    for name, ok in checks.items():
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
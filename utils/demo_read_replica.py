@@ -0,0 +1,116 @@
+"""
+
+Shows how SiaMemory routes reads between the primary and a read replica.
+
+Sets up two SQLite files in a temporary directory: a primary and a replica
+that is a copy of it refreshed only on demand, standing in for a replica
+lagging behind. A SiaMemory is configured with both and runs a scripted
+sequence of writes and reads from two threads: a "writer" thread that
+stores a message and reads it back, and a "reader" thread that never
+writes. For each read it prints the database that served it and whether the
+message was found, so that one can see that:
+
+  - reads go to the replica by default,
+  - after a write, reads from every thread go to the primary during the
+    --sticky-seconds window, so that a thread also sees writes made on its
+    behalf by another one (e.g. the write buffer's flush),
+  - after the window, reads go back to the replica.
+
+Usage:
+    python -m utils.demo_read_replica [--sticky-seconds 1.0]
+
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+
+from sia.character import SiaCharacter
+from sia.memory.memory import SiaMemory
+from sia.memory.schemas import SiaMessageGeneratedSchema
+
+
+def replicate(primary_file: str, replica_file: str):
+    """Bring the replica up to date with the primary."""
+    with sqlite3.connect(primary_file) as primary, sqlite3.connect(replica_file) as replica:
+        primary.backup(replica)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--sticky-seconds", type=float, default=1.0, help="Primary reads after a write (replica_sticky_seconds)"
+    )
+    parser.add_argument("--character", default="characters/sia.json", help="Character JSON file")
+    args = parser.parse_args()
+
+    character = SiaCharacter(json_file=args.character, logging_enabled=False)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        primary_file = os.path.join(tmp_dir, "primary.db")
+        replica_file = os.path.join(tmp_dir, "replica.db")
+        memory = SiaMemory(
+            f"sqlite:///{primary_file}",
+            character,
+            replica_db_path=f"sqlite:///{replica_file}",
+            replica_sticky_seconds=args.sticky_seconds,
+            message_cache_size=0,
+        )
+        replicate(primary_file, replica_file)
+
+        served_by = threading.local()
+        for engine, name in ((memory.engine, "primary"), (memory.replica_engine, "replica")):
+            event.listen(
+                engine,
+                "before_cursor_execute",
+                # the first database a read queries
+                lambda *_, name=name: getattr(served_by, "name", None) or setattr(served_by, "name", name),
+            )
+
+        def read(label: str):
+            served_by.name = None
+            found = memory.get_messages(id="demo-1")
+            print(
+                f"  [{threading.current_thread().name.split('_')[0]:<6}] {label:<42} "
+                f"served by {served_by.name}, message {'found' if found else 'NOT found'}"
+            )
+
+        def write():
+            memory.add_message(
+                "demo-1",
+                SiaMessageGeneratedSchema(platform="telegram", author="alice", content="hello"),
+            )
+            print(f"  [{threading.current_thread().name.split('_')[0]:<6}] stored message demo-1 on the primary")
+            read("read right after the write")
+
+        # one long-lived thread each, as the clients' threads in Sia.run
+        writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="writer")
+        reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reader")
+
+        print("Replica in sync, nothing stored yet:")
+        reader.submit(read, "read").result()
+
+        print("\nWriter stores a message, the replica has not caught up:")
+        writer.submit(write).result()
+        reader.submit(read, "read by a thread that did not write").result()
+
+        print(f"\nReplica catches up, {args.sticky_seconds}s later:")
+        replicate(primary_file, replica_file)
+        time.sleep(args.sticky_seconds)
+        writer.submit(read, "read after the sticky window").result()
+        reader.submit(read, "read").result()
+
+        writer.shutdown()
+        reader.shutdown()
+        memory.close()
+        memory.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+
+Checks that the production message queries are served by indexes.
+
+Builds the same queries SiaMemory runs in the posting / replying / engaging
+loops, runs EXPLAIN on them against the database from DB_PATH (or --db)
+and reports the plan of each one. Supports SQLite (EXPLAIN QUERY PLAN) and
+Postgres (EXPLAIN, with sequential scans disabled so that the planner shows
+whether an index is usable at all, even on a small database).
+
+Usage:
+    python -m utils.explain_message_queries [--db sqlite:///memory/sia.db]
+
+Exits with a non-zero status if any query falls back to a full table scan.
+
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from sia.memory.memory import SiaMemory
+from sia.memory.models_db import Base, SiaMessageModel
+from sia.memory.search import apply_search, ensure_search_index
+
+load_dotenv()
+
+
+def production_queries(session, character_name, username):
+    """(name, statement) pairs mirroring the queries of the client loops."""
+    build = SiaMemory._messages_query
+    now = datetime.now(timezone.utc)
+
+    return [
+        (
+            "id lookup",
+            build(session, id="1", flagged=2),
+        ),
+        (
+            "latest post",
+            build(
+                session, platform="twitter", character=character_name,
+                author=username, is_post=True,
+                sort_by="wen_posted", sort_order="desc",
+            ).limit(1),
+        ),
+        (
+            "responses sent this hour",
+            build(
+                session, columns=("id",), platform="twitter",
+                character=character_name, response_to="NOT NULL",
+                author=username, from_datetime=now - timedelta(hours=1),
+            ).order_by(None).with_entities(func.count(SiaMessageModel.id)),
+        ),
+        (
+            "last retrieved reply id",
+            build(
+                session, columns=("id",), platform="twitter",
+                not_author=username, character=character_name,
+            ).order_by(None).with_entities(func.max(SiaMessageModel.id)),
+        ),
+        (
+            "conversation context",
+            build(
+                session, conversation_id="1", flagged=False,
+                sort_by="wen_posted", sort_order="desc",
+            ).limit(20),
+        ),
+        (
+            "already responded to",
+            build(
+                session, columns=("id",), response_to="1",
+                author=username, flagged=2,
+            ).limit(1),
+        ),
+        (
+            "previous messages",
+            build(
+                session, columns=("id", "author", "wen_posted", "content"),
+                platform="twitter", author=username, flagged=2,
+                sort_by="wen_posted", sort_order="desc",
+            ).limit(20),
+        ),
+        (
+            "previous posts",
+            build(session, columns=("wen_posted", "content")).limit(10),
+        ),
+        (
+            "content search",
+            apply_search(
+                build(session, columns=("id",), character=character_name),
+                session.get_bind().dialect.name,
+                ["bitcoin", "mining"],
+            ).limit(10),
+        ),
+    ]
+
+
+def explain(connection, statement):
+    """Return the plan lines of `statement` and whether it avoids full scans."""
+    dialect = connection.dialect
+    sql = str(
+        statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+    )
+
+    if dialect.name == "sqlite":
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        plan = [row[-1] for row in rows]
+        # "SCAN anon_1" lines scan subquery results, not tables
+        full_scans = [
+            line for line in plan
+            if line.startswith("SCAN")
+            and line.split()[1] in Base.metadata.tables
+            and "INDEX" not in line
+        ]
+    elif dialect.name == "postgresql":
+        connection.exec_driver_sql("SET enable_seqscan = off")
+        rows = connection.exec_driver_sql(f"EXPLAIN {sql}").fetchall()
+        plan = [row[0] for row in rows]
+        full_scans = [line for line in plan if "Seq Scan" in line]
+    else:
+        raise ValueError(f"Unsupported dialect: {dialect.name}")
+
+    return plan, not full_scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--db", default=os.getenv("DB_PATH"), help="Database URL")
+    parser.add_argument("--character", default="Sia", help="Character name")
+    parser.add_argument("--username", default="sia_really", help="Character's username on the platform")
+    args = parser.parse_args()
+
+    engine = create_engine(args.db)
+    ensure_search_index(engine)
+    session = sessionmaker(bind=engine)()
+
+    all_indexed = True
+    try:
+        with engine.connect() as connection:
+            for name, query in production_queries(session, args.character, args.username):
+                plan, indexed = explain(connection, query.statement)
+                all_indexed = all_indexed and indexed
+                print(f"{'OK  ' if indexed else 'SCAN'} {name}")
+                for line in plan:
+                    print(f"       {line}")
+    finally:
+        session.close()
+
+    sys.exit(0 if all_indexed else 1)
+
+
+if __name__ == "__main__":
+    main()
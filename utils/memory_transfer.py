@@ -0,0 +1,81 @@
+"""
+
+Exports a memory database to JSONL files, or imports such an export.
+
+export writes the messages, character links, conversations, social memories
+and their turns, character and knowledge module settings and the news
+tables of --db to gzip JSONL files in DIRECTORY (see
+sia/memory/transfer.py); with --character-only just the rows of the
+character. import loads such a directory into --db, skipping rows that are
+already stored, so it can be re-run after an interruption. Both stream the
+rows, in --chunk-size rows per statement. Vectors are not exported: run
+backfill_vectors() after an import to rebuild them.
+
+To move from SQLite to Postgres, export from the SQLite database, create the
+Postgres schema with `alembic upgrade head`, then import into it.
+
+Usage:
+    python -m utils.memory_transfer export DIRECTORY [--db sqlite:///memory/sia.db] [--character-only] [--tables message ...]
+    python -m utils.memory_transfer import DIRECTORY [--db postgresql://...] [--tables message ...]
+
+"""
+
+import argparse
+import os
+import time
+
+from dotenv import load_dotenv
+
+from sia.character import SiaCharacter
+from sia.memory.memory import SiaMemory
+from sia.memory.transfer import TRANSFER_TABLES, SiaMemoryTransfer
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("directory", help="Export directory")
+    parser.add_argument("--db", default=os.getenv("DB_PATH"), help="Database URL")
+    parser.add_argument(
+        "--character",
+        default=f"characters/{os.getenv('CHARACTER_NAME_ID') or 'sia'}.json",
+        help="Character JSON file",
+    )
+    parser.add_argument("--tables", nargs="+", choices=TRANSFER_TABLES, help="Only these tables")
+    parser.add_argument("--character-only", action="store_true", help="Export only the character's rows")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per statement")
+    parser.add_argument("--rows-per-file", type=int, default=500000, help="Rows per exported file")
+    parser.add_argument("--no-compress", action="store_true", help="Write plain .jsonl files")
+    args = parser.parse_args()
+
+    character = SiaCharacter(json_file=args.character, logging_enabled=False)
+    memory = SiaMemory(args.db, character)
+    transfer = SiaMemoryTransfer(
+        memory,
+        chunk_size=args.chunk_size,
+        rows_per_file=args.rows_per_file,
+        compress=not args.no_compress,
+    )
+
+    started = time.monotonic()
+    progress = lambda table, rows: print(f"  {table}: {rows} rows", end="\r")  # noqa: E731
+    if args.command == "export":
+        counts = transfer.export_to(
+            args.directory, tables=args.tables, character_only=args.character_only, progress=progress
+        )
+    else:
+        counts = transfer.import_from(args.directory, tables=args.tables, progress=progress)
+    memory.close()
+
+    elapsed = time.monotonic() - started
+    total = sum(counts.values())
+    print(" " * 60, end="\r")
+    for table, rows in counts.items():
+        print(f"{table}: {rows} rows")
+    print(f"{args.command}ed {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+
+Deletes everything stored for a character from the memory database.
+
+Deletes the character's message links, its messages and their vectors
+(unless another character is linked to them too), its conversations and,
+unless --keep-social-memory is given, its social memories and pending opinion
+refreshes, in chunks of --chunk-size rows so that running clients are not
+blocked. Archived messages are not touched. Without --yes only the number of
+messages linked to the character is printed.
+
+Usage:
+    python -m utils.purge_character [--name NAME] [--db sqlite:///memory/sia.db] [--chunk-size 500] [--keep-social-memory] [--yes]
+
+"""
+
+import argparse
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import func
+
+from sia.character import SiaCharacter
+from sia.memory.memory import SiaMemory
+from sia.memory.models_db import MessageCharacterModel
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--db", default=os.getenv("DB_PATH"), help="Database URL")
+    parser.add_argument(
+        "--character",
+        default=f"characters/{os.getenv('CHARACTER_NAME_ID') or 'sia'}.json",
+        help="Character JSON file",
+    )
+    parser.add_argument("--name", help="Name of the character to purge (default: the --character one)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Rows deleted per transaction")
+    parser.add_argument("--keep-social-memory", action="store_true", help="Only delete messages and conversations")
+    parser.add_argument("--yes", action="store_true", help="Really delete")
+    args = parser.parse_args()
+
+    character = SiaCharacter(json_file=args.character, logging_enabled=False)
+    memory = SiaMemory(args.db, character)
+    name = args.name or character.name
+
+    if not args.yes:
+        with memory.session_scope() as session:
+            count = (
+                session.query(func.count())
+                .select_from(MessageCharacterModel)
+                .filter(MessageCharacterModel.character_name == name)
+                .scalar()
+            )
+        print(f"{count} messages are linked to {name}; run with --yes to purge them")
+        return
+
+    deleted = memory.purge_character(
+        name,
+        chunk_size=args.chunk_size,
+        progress=lambda table, count: print(f"  {table}: {count} rows deleted so far"),
+        social_memory=not args.keep_social_memory,
+    )
+    memory.close()
+    for table, count in deleted.items():
+        print(f"{table}: {count} rows deleted")
+
+
+if __name__ == "__main__":
+    main()
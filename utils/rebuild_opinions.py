@@ -0,0 +1,92 @@
+"""
+
+Regenerates the social memory opinions of a character for all its users.
+
+Streams the character's social memories in batches, generates each user's
+opinion from the latest --history-turns turns of their history with at most
+--concurrency LLM calls at a time, and stores the results batch by batch.
+Users whose history did not change since their opinion was generated are
+skipped unless --force is given. Progress is checkpointed to --checkpoint: an
+interrupted rebuild resumes from there when run again. With --fake-llm no LLM
+is called; opinions are made up locally, after --fake-delay seconds each, to
+try the job and measure its overhead.
+
+Usage:
+    python -m utils.rebuild_opinions [--db sqlite:///memory/sia.db] [--concurrency 4] [--force] [--fake-llm]
+
+"""
+
+import argparse
+import os
+import time
+
+from dotenv import load_dotenv
+
+from sia.character import SiaCharacter
+from sia.memory.memory import SiaMemory
+from sia.memory.opinion_rebuild import SiaOpinionRebuild
+
+load_dotenv()
+
+
+class FakeOpinionLLM:
+    """Stands in for SiaMemory._generate_opinion without calling an LLM."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def __call__(self, history, previous_opinion=None):
+        time.sleep(self.delay)
+        user_turns = [turn for turn in history if turn["role"] == "user"]
+        return (
+            f"Fake opinion from {len(history)} turns, {len(user_turns)} by the user; "
+            f"last said: {user_turns[-1]['content'][:80] if user_turns else '-'}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--db", default=os.getenv("DB_PATH"), help="Database URL")
+    parser.add_argument(
+        "--character",
+        default=f"characters/{os.getenv('CHARACTER_NAME_ID') or 'sia'}.json",
+        help="Character JSON file",
+    )
+    parser.add_argument("--concurrency", type=int, default=4, help="LLM calls in parallel")
+    parser.add_argument("--batch-size", type=int, default=100, help="Users per batch and checkpoint")
+    parser.add_argument(
+        "--history-turns", type=int, default=100, help="Latest turns an opinion is based on (0 for all)"
+    )
+    parser.add_argument("--checkpoint", default="memory/opinion_rebuild.json", help="Checkpoint file")
+    parser.add_argument("--force", action="store_true", help="Also rebuild opinions of unchanged histories")
+    parser.add_argument(
+        "--keep-previous", action="store_true", help="Give the current opinion to the LLM as a starting point"
+    )
+    parser.add_argument("--fake-llm", action="store_true", help="Don't call the LLM, make opinions up")
+    parser.add_argument("--fake-delay", type=float, default=0.0, help="Seconds per fake LLM call")
+    args = parser.parse_args()
+
+    character = SiaCharacter(json_file=args.character, logging_enabled=False)
+    memory = SiaMemory(args.db, character)
+
+    rebuild = SiaOpinionRebuild(
+        memory,
+        generate_opinion=FakeOpinionLLM(args.fake_delay) if args.fake_llm else None,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        history_turns=args.history_turns or None,
+        checkpoint_path=args.checkpoint,
+        force=args.force,
+        keep_previous=args.keep_previous,
+    )
+    stats = rebuild.run()
+    memory.close()
+
+    print(
+        f"{stats['users']} users: {stats['rebuilt']} opinions rebuilt, {stats['skipped']} unchanged, "
+        f"{stats['failed']} failed in {stats['elapsed']:.1f}s ({stats['users_per_minute']:.0f} users/min)"
+    )
+
+
+if __name__ == "__main__":
+    main()